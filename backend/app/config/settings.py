@@ -1,9 +1,24 @@
 import os
 from pathlib import Path
 
+from typing import Optional
+
 from dotenv import load_dotenv
 
-from app.utils.openai import OpenAIChatService
+from app.constants import ICONS, ICONS_DIRECTORY, POSSIBLE_ACTIONS, PROMPTS_MAP
+from app.services.ppt.cache import PresentationCache
+from app.services.ppt.images import ImageAssetCache
+from app.services.ppt.layout import LayoutPostProcessor
+from app.services.ppt.storage import PresentationStorage, create_storage_backend
+from app.services.ppt.versions import VersionStore
+from app.utils.llm_cache import LLMResponseCache
+from app.utils.metrics import MetricsRegistry
+from app.utils.model_router import ModelRouter
+from app.utils.openai import AsyncOpenAIChatService, OpenAIChatService
+from app.utils.prompt import PromptTemplate
+from app.utils.resilience import ResilientCaller
+from app.utils.single_flight import SingleFlight
+from app.utils.workers import WorkerPool
 
 current_path = Path.cwd()
 
@@ -18,6 +33,51 @@ class Settings:
 
     LOCAL_PPT_FILENAME = os.getenv("LOCAL_PPT_FILENAME")
     CURRENT_PPT = str(current_path / os.getenv("LOCAL_PPT_FILENAME"))
+    CURRENT_PPT_CHECKSUM: Optional[str] = None
+
+    PPT_STORE_DIRECTORY = str(
+        current_path / os.getenv("PPT_STORE_DIRECTORY", "presentations"))
+    PPT_STORE_BACKEND = os.getenv("PPT_STORE_BACKEND", "local")
+    PPT_OBJECT_STORE_DIRECTORY = str(
+        current_path / os.getenv("PPT_OBJECT_STORE_DIRECTORY", "object_store"))
+    PPT_STORAGE = PresentationStorage(create_storage_backend(
+        PPT_STORE_BACKEND, PPT_STORE_DIRECTORY, PPT_OBJECT_STORE_DIRECTORY))
+
+    PPT_VERSIONING = os.getenv("PPT_VERSIONING", "false").lower() == "true"
+    PPT_VERSIONS_DIRECTORY = str(
+        current_path / os.getenv("PPT_VERSIONS_DIRECTORY", "versions"))
+    PPT_VERSIONS_MAX = int(os.getenv("PPT_VERSIONS_MAX", 50))
+    PPT_VERSIONS = VersionStore(PPT_VERSIONS_DIRECTORY, PPT_STORAGE, PPT_VERSIONS_MAX)
+
+    SLIDES_TTL_SECONDS = float(os.getenv("SLIDES_TTL_SECONDS", 3600))
+    SLIDES_GC_INTERVAL_SECONDS = float(os.getenv("SLIDES_GC_INTERVAL_SECONDS", 300))
+
+    PPT_CACHE_MAX_ENTRIES = int(os.getenv("PPT_CACHE_MAX_ENTRIES", 8))
+    PPT_CACHE_MAX_BYTES = int(os.getenv("PPT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+    PPT_CACHE = PresentationCache(PPT_CACHE_MAX_ENTRIES, PPT_CACHE_MAX_BYTES)
+    PPT_LAZY_CONTEXT = os.getenv("PPT_LAZY_CONTEXT", "false").lower() == "true"
+
+    IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", 32))
+    IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    IMAGE_ASSETS = ImageAssetCache(str(current_path / ICONS_DIRECTORY), ICONS,
+                                   IMAGE_CACHE_MAX_ENTRIES, IMAGE_CACHE_MAX_BYTES)
+
+    BULK_SHAPE_WRITER = os.getenv("BULK_SHAPE_WRITER", "true").lower() == "true"
+
+    SLIDE_DOWNLOAD_GZIP = os.getenv("SLIDE_DOWNLOAD_GZIP", "false").lower() == "true"
+
+    OTEL_TRACING = os.getenv("OTEL_TRACING", "false").lower() == "true"
+    METRICS = MetricsRegistry(tracing=OTEL_TRACING)
+
+    LAYOUT_SNAP = os.getenv("LAYOUT_SNAP", "true").lower() == "true"
+    LAYOUT_GRID_MM = float(os.getenv("LAYOUT_GRID_MM", 1))
+    LAYOUT_POST_PROCESSOR = LayoutPostProcessor(LAYOUT_GRID_MM, LAYOUT_SNAP, METRICS)
+
+    WORKER_POOL_KIND = os.getenv("WORKER_POOL_KIND", "thread")
+    WORKER_POOL_SIZE = int(os.getenv("WORKER_POOL_SIZE", os.cpu_count() or 1))
+    WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", 2 * WORKER_POOL_SIZE))
+    WORKER_POOL = WorkerPool(WORKER_POOL_KIND, WORKER_POOL_SIZE, WORKER_QUEUE_SIZE,
+                             METRICS)
 
     GPT_SERVICE = OpenAIChatService(
         f"{AOAI_ENDPOINT}?api-version={AOAI_API_VERSION}",
@@ -26,3 +86,69 @@ class Settings:
         AOAI_MODEL,
     )
     GPT_CLIENT = GPT_SERVICE._get_azure_client()
+
+    GPT_MAX_CONNECTIONS = int(os.getenv("GPT_MAX_CONNECTIONS", 20))
+    GPT_TIMEOUT = float(os.getenv("GPT_TIMEOUT", 60))
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 2000))
+    PROMPT_TEMPLATE = PromptTemplate(PROMPTS_MAP, ICONS, POSSIBLE_ACTIONS,
+                                     PROMPT_TOKEN_BUDGET)
+
+    LLM_STREAM_ACTIONS = os.getenv("LLM_STREAM_ACTIONS", "false").lower() == "true"
+
+    PROCESS_COALESCING = os.getenv("PROCESS_COALESCING", "true").lower() == "true"
+    PROCESS_SINGLE_FLIGHT = SingleFlight("process", METRICS)
+
+    BATCH_MAX_TARGETS = int(os.getenv("BATCH_MAX_TARGETS", 50))
+    BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", 4))
+
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 256))
+    LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 3600))
+    LLM_CACHE_SQLITE_PATH = os.getenv("LLM_CACHE_SQLITE_PATH") or None
+    LLM_CACHE = LLMResponseCache(LLM_CACHE_MAX_ENTRIES,
+                                 LLM_CACHE_TTL_SECONDS,
+                                 LLM_CACHE_SQLITE_PATH)
+
+    LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", 30))
+    LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", 3))
+    LLM_RETRY_BACKOFF_SECONDS = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", 0.2))
+    LLM_RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", 0.2))
+    LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() == "true"
+    LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", 0.95))
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+    LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30))
+    LLM_RESILIENCE = ResilientCaller(
+        "llm",
+        LLM_ATTEMPT_TIMEOUT,
+        max_attempts=LLM_MAX_ATTEMPTS,
+        backoff_seconds=LLM_RETRY_BACKOFF_SECONDS,
+        budget_ratio=LLM_RETRY_BUDGET_RATIO,
+        hedge=LLM_HEDGE,
+        hedge_quantile=LLM_HEDGE_QUANTILE,
+        breaker_failures=LLM_BREAKER_FAILURES,
+        breaker_reset_seconds=LLM_BREAKER_RESET_SECONDS,
+        metrics=METRICS,
+    )
+
+    GPT_FAST_MODEL = os.getenv("GPT_FAST_MODEL") or None
+    ROUTER_MAX_SHAPES = int(os.getenv("ROUTER_MAX_SHAPES", 10))
+    ROUTER_MAX_TEXT_CHARS = int(os.getenv("ROUTER_MAX_TEXT_CHARS", 1000))
+    ROUTER_MAX_INSTRUCTION_WORDS = int(os.getenv("ROUTER_MAX_INSTRUCTION_WORDS", 20))
+    MODEL_ROUTER = ModelRouter(GPT_FAST_MODEL,
+                               ROUTER_MAX_SHAPES,
+                               ROUTER_MAX_TEXT_CHARS,
+                               ROUTER_MAX_INSTRUCTION_WORDS,
+                               METRICS)
+
+    GPT_ASYNC_SERVICE = AsyncOpenAIChatService(
+        f"{AOAI_ENDPOINT}?api-version={AOAI_API_VERSION}",
+        AOAI_KEY,
+        AOAI_API_VERSION,
+        AOAI_MODEL,
+        GPT_MAX_CONNECTIONS,
+        GPT_TIMEOUT,
+        LLM_CACHE,
+        METRICS,
+        MODEL_ROUTER,
+        LLM_RESILIENCE,
+    )
+    GPT_ASYNC_CLIENT = GPT_ASYNC_SERVICE._get_azure_client()
@@ -9,6 +9,15 @@ ICONS = [
     {"name": "target.png", "description": "Arrow hitting target"},
 ]
 
+# Directory (relative to the working directory) holding the icon images
+ICONS_DIRECTORY = "resources/icons"
+
+# Directory (relative to the working directory) holding the updated slide files
+SLIDES_DIRECTORY = "slides_ppt"
+
+PPTX_MEDIA_TYPE = ("application/vnd.openxmlformats-officedocument"
+                   ".presentationml.presentation")
+
 POSSIBLE_ACTIONS = [
     {
         "name": "create_textbox",
@@ -30,39 +39,41 @@ POSSIBLE_ACTIONS = [
 PROMPTS_MAP = {
     "actions": {
         "system": {
-            "placeholders_list": [],
+            "placeholders_list": [
+                "icon_names",
+                "possible_actions"
+            ],
             "prompt": actions.actions_system_prompt,
         },
         "user": {
             "placeholders_list": [
-                "user_instruction",
-                "context_data",
-                "covered_areas",
-                "selected_shape_name",
                 "slide_width",
                 "slide_height",
-                "icon_names",
-                "possible_actions"
+                "context_data",
+                "covered_areas",
+                "free_areas",
+                "user_instruction"
             ],
             "prompt": actions.actions_user_prompt,
         }
     },
     "actions_update": {
         "system": {
-            "placeholders_list": [],
+            "placeholders_list": [
+                "icon_names",
+                "possible_actions"
+            ],
             "prompt": actions_update.actions_update_system_prompt,
         },
         "user": {
             "placeholders_list": [
-                "user_instruction",
-                "context_data",
-                "shape_data",
-                "covered_areas",
-                "selected_shape_name",
                 "slide_width",
                 "slide_height",
-                "icon_names",
-                "possible_actions"
+                "context_data",
+                "covered_areas",
+                "free_areas",
+                "shape_data",
+                "user_instruction"
             ],
             "prompt": actions_update.actions_update_user_prompt,
         }
@@ -1,9 +1,61 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
 
+from app.config.settings import Settings
+from app.constants import SLIDES_DIRECTORY
 from app.routes.ppt import router as ppt_router
+from app.schemas.actions import ActionsList
+from app.services.ppt.storage import collect_expired_files
+from app.utils.metrics import MetricsMiddleware
+from app.utils.structured_output import compile_structured_output
+
+SWEPT_FILES = Settings.METRICS.counter(
+    "swept_files", "Expired slide files and compacted versions, blobs and "
+    "checkouts removed by the background sweep.", ("kind",))
+
+
+async def collect_expired_slides():
+    """
+    Periodically removes saved slide files older than `SLIDES_TTL_SECONDS` and,
+    with `PPT_VERSIONING`, compacts the version history.
+    """
+    while True:
+        await asyncio.sleep(Settings.SLIDES_GC_INTERVAL_SECONDS)
+        try:
+            removed = await run_in_threadpool(
+                collect_expired_files, SLIDES_DIRECTORY, Settings.SLIDES_TTL_SECONDS)
+            SWEPT_FILES.inc(removed, kind="slides")
+        except Exception as e:
+            print(f"Error collecting expired slide files: {str(e)}")
+        if not Settings.PPT_VERSIONING:
+            continue
+        try:
+            compacted = await run_in_threadpool(Settings.PPT_VERSIONS.compact)
+            for kind, count in compacted.items():
+                SWEPT_FILES.inc(count, kind=kind.replace("_removed", ""))
+        except Exception as e:
+            print(f"Error compacting version history: {str(e)}")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    compile_structured_output(ActionsList)
+    await run_in_threadpool(Settings.IMAGE_ASSETS.preload_icons)
+    slides_collector = asyncio.create_task(collect_expired_slides())
+    yield
+    slides_collector.cancel()
+    with suppress(asyncio.CancelledError):
+        await slides_collector
+    Settings.WORKER_POOL.shutdown()
+    await Settings.GPT_ASYNC_SERVICE.close()
+    Settings.LLM_CACHE.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS Configuration
 app.add_middleware(
@@ -14,6 +66,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware, metrics=Settings.METRICS)
+
 # Include Routes
 app.include_router(ppt_router, tags=["PowerPoint Operations"])
 
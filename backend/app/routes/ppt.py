@@ -1,11 +1,29 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from contextlib import aclosing
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
 from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 from app.config.settings import Settings
-from app.constants import ICONS, POSSIBLE_ACTIONS, PROMPTS_MAP
-from app.schemas.actions import ActionsList
-from app.services.ppt.actions import PPTActionsService, PPTActionHandler
-from app.services.ppt.context import PresentationContext
-from app.utils.prompt import PromptTemplate
+from app.constants import PPTX_MEDIA_TYPE, SLIDES_DIRECTORY
+from app.schemas.actions import ActionsList, ShapeParameters
+from app.services.ppt.actions import PPTActionsService
+from app.services.ppt.versions import VersionConflictError
+from app.utils.cancellation import cancel_on_disconnect
+from app.utils.llm_cache import normalise_prompt
+from app.utils.metrics import PROMETHEUS_CONTENT_TYPE
+from app.utils.model_router import FAST_TIER
+from app.utils.resilience import CircuitOpenError
+from app.utils.responses import FastJSONResponse, SlideFileResponse, gzip_file_chunks
+from app.utils.workers import WorkerSession
 
 router = APIRouter()
 
@@ -23,8 +41,10 @@ async def upload_presentation(
             The SHA-256 checksum of the file content sent along with the file. This is used to validate the file's integrity.
 
         \n**Returns**
-        \n\tDict[str, str]:
-            A dictionary containing a success message and the filename where the presentation was saved.
+        \n\tDict[str, Any]:
+            A dictionary containing a success message, the filename where the
+            presentation was saved, its `document_id` (the checksum) and size, and
+            whether an identical deck was already stored (`deduplicated`).
 
         \n**Raises**
         \n\tHTTPException (400):
@@ -34,7 +54,8 @@ async def upload_presentation(
             Raised for any unexpected errors during the processing or saving of the presentation.
     """
     try:
-        return PPTActionsService.save_ppt(presentation, checksum)
+        return await run_in_threadpool(PPTActionsService.save_ppt,
+                                       presentation, checksum)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -44,7 +65,31 @@ async def upload_presentation(
         )
 
 
-@router.post("/process")
+@router.post("/upload/{checksum}")
+async def reuse_presentation(checksum: str):
+    """
+        Selects an already uploaded presentation by its checksum, without sending the
+        file again.
+        \n**Parameters**
+        \n\tchecksum (str):
+            The SHA-256 checksum of the presentation content.
+
+        \n**Returns**
+        \n\tDict[str, Any]:
+            The same response as `/upload` for a deduplicated presentation.
+
+        \n**Raises**
+        \n\tHTTPException (400):
+            Raised if the checksum is not a SHA-256 hex digest.
+
+        \n\tHTTPException (404):
+            Raised if no presentation with this checksum is stored; upload it with
+            `/upload`.
+    """
+    return PPTActionsService.use_stored_ppt(checksum)
+
+
+@router.post("/process", response_class=FastJSONResponse)
 async def process_user_prompt(request: Request):
     """
         Processes a user's prompt for modifying a PowerPoint presentation based on contextual data and AI-generated suggestions.
@@ -52,92 +97,458 @@ async def process_user_prompt(request: Request):
         \n**Parameters**
             \n\trequest (Request):
                 The HTTP request object containing JSON payload with the following expected structure:
+                - documentId (optional, str): The `document_id` returned by
+                  `/upload`; defaults to the last uploaded presentation.
                 - slidesInfo (list): Information about slides, including index.
                 - shapesInfo (optional, list): Information about shapes on the slide, including names.
                 - attached_file (optional): Additional file attached by the user.
 
         \n**Returns**
             \n\tDict[str, Any]:
-                A dictionary containing updated PowerPoint presentation details and the input data used for processing.
+                A dictionary containing a handle to the updated slide (`file_id`,
+                `download_url`, `file_path`), the estimated prompt token counts
+                (`prompt_report`), the number of actions corrected by the layout
+                post-processor (`layout_report`), the model tier that answered and
+                why (`route_report`), with `PPT_VERSIONING` the new version of the
+                deck (`version_report`) and the input data used for processing. The
+                slide itself is fetched from `download_url`.
 
         \n**Raises**
+            \n\tHTTPException (404):
+                Raised if `documentId` does not refer to a stored presentation.
+
+            \n\tHTTPException (409):
+                Raised, with `PPT_VERSIONING`, if a concurrent edit of the deck
+                changed the same slides first.
+
+            \n\tHTTPException (429):
+                Raised if the presentation worker pool is saturated.
+
             \n\tHTTPException (500):
                 Raised if any unexpected error occurs during the processing.
 
+            \n\tHTTPException (502):
+                Raised if the GPT service gave no valid response.
+
+            \n\tHTTPException (503):
+                Raised, with `Retry-After`, while the circuit breaker of the GPT
+                deployment is open.
+
         \n**Function Workflow**\n
             1. Parse Request Data:
                Extract and validate the JSON data from the incoming request.
+               With `PROCESS_COALESCING`, a request identical to one in flight (same
+               deck, slide, shape, prompt up to runs of spaces, attached file and
+               LLM cache use) awaits its result and shares its slide file instead of
+               running steps 2 to 5 again.
 
             2. Retrieve Slide Context:
-               - Create a `PresentationContext` object using the current PowerPoint file.
+               - Resolve `documentId` to a local copy of the stored presentation, with
+                 `PPT_VERSIONING` of its head version.
+               - On the worker pool, extract the slide context from the cached, parsed
+                 PowerPoint file, or read only the requested slide in lazy mode.
                - Retrieve the context for a specific slide and optionally a shape if provided.
 
             3. Prepare AI Prompt:
                - Select a prompt template based on whether shapes information is provided.
-               - Generate user and system prompts using `PromptTemplate.generate_prompts`.
+               - Generate user and system prompts using the template precompiled at
+                 import (`Settings.PROMPT_TEMPLATE`), serialising the slide context as
+                 compact JSON within `PROMPT_TOKEN_BUDGET`. Static content forms a
+                 byte-identical prefix.
 
             4. Invoke GPT Service:
                - Use the GPT service to process the prompts and generate a response conforming to `ActionsList` schema.
+               - With `GPT_FAST_MODEL`, short instructions on simple slides go to that
+                 model; its response is escalated to `GPT_MODEL` if it is invalid or
+                 fails the layout checks (`route_report`).
+               - With `LLM_STREAM_ACTIONS` and a thread worker pool, a response of
+                 `GPT_MODEL` is streamed and each action is corrected and applied
+                 (step 5) as soon as it has been generated.
+               - Identical prompts are answered from the LLM response cache unless the
+                 request sends `Cache-Control: no-cache`.
+               - The call is non-blocking. Processing is cancelled once every client
+                 awaiting it has disconnected.
+               - Each attempt has the `LLM_ATTEMPT_TIMEOUT` deadline; failed attempts
+                 are retried within a shared retry budget, slow ones optionally hedged
+                 (`LLM_HEDGE`), and a deployment that keeps failing is skipped by its
+                 circuit breaker.
 
             5. Handle PowerPoint Actions:
-               - Instantiate a `PPTActionHandler` to process the GPT-generated actions.
-               - Execute the actions and save the updated presentation.
+               - Align the proposed shapes to the `LAYOUT_GRID_MM` grid, clamp them to
+                 the slide and, with `LAYOUT_SNAP`, move overlapping shapes into free
+                 space.
+               - On the worker pool, check out a private copy of the slide of the
+                 cached presentation.
+               - Execute the GPT-generated actions and save the updated slide.
+               - With `PPT_VERSIONING`, store the edited slide XML and added media as
+                 the next version of the deck, see `/documents/{document_id}/versions`.
 
             6. Return Response:
-               - Return a dictionary containing the updated presentation details and the input data.
+               - Return a handle to the saved slide and the input data.
     """
     try:
-        data = await request.json()
+        data = await _parse_request(request)
+        document = await _resolve_document(data)
 
-        # PPT CONTEXT
-        presentation_context = PresentationContext(Settings.CURRENT_PPT)
-        slide_context = presentation_context.get_slide_context(
-            data["slidesInfo"][0]["index"],
-            data["shapesInfo"][0]["name"] if "shapesInfo" in data
-                                             and len(data["shapesInfo"]) else None
-        )
-
-        # PROMPT PREPARATION
-        if "shapesInfo" in data and len(data["shapesInfo"]):
-            selected_prompt_key = "actions_update"
+        # Concurrent identical requests, e.g. double clicks, share one computation
+        if Settings.PROCESS_COALESCING:
+            processed = await cancel_on_disconnect(
+                request,
+                Settings.PROCESS_SINGLE_FLIGHT.run(
+                    await _process_key(request, document, data),
+                    lambda: _process_slide(request, document, data))
+            )
         else:
-            selected_prompt_key = "actions"
-        prompt_template = PromptTemplate(
-            PROMPTS_MAP,
-            ICONS,
-            POSSIBLE_ACTIONS
-        )
-        user_prompt, system_prompt = prompt_template.generate_prompts(
-            prompt_key=selected_prompt_key,
-            request_data=data,
-            context_data=slide_context,
-            covered_areas=slide_context["covered_areas"]
-        )
+            processed = await cancel_on_disconnect(
+                request, _process_slide(request, document, data))
 
-        # RUN CHATGPT
-        GPT_response = Settings.GPT_SERVICE.run_chatGPT(
-            gpt_client=Settings.GPT_CLIENT,
-            system_prompt=system_prompt,
-            user_prompt=user_prompt,
-            output_schema=ActionsList
+        return _encode_response({**processed, "input_data": data})
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing user prompt: {str(e)}"
         )
+
+
+async def _process_slide(request: Request,
+                         document: Tuple[str, Optional[str]],
+                         data: Dict[str, Any]) -> Dict[str, Any]:
+    # PPT CONTEXT
+    slide_context = await _extract_slide_context(document, data)
+
+    # PROMPT PREPARATION
+    user_prompt, system_prompt, prompt_report = _generate_prompts(data, slide_context)
+    route_report = _route(data, slide_context)
+
+    if _streams_actions(route_report):
+        # RUN CHATGPT, PERFORMING EACH PPT ACTION AS SOON AS IT IS GENERATED
+        updated_ppt_response, _, layout_report = await _stream_actions(
+            request, document, data, slide_context, system_prompt, user_prompt,
+            route_report)
+    else:
+        # RUN CHATGPT, on the fast deployment for simple requests
+        GPT_response, route_report = await _run_routed_chatGPT(
+            request, slide_context, system_prompt, user_prompt, route_report)
+        # FIX LAYOUT OF GPT PROPOSED ACTIONS
+        GPT_response, layout_report = await _post_process_layout(
+            GPT_response, slide_context)
+
         # PERFORM GPT PROPOSED PPT ACTIONS
-        ppt_action_handler = PPTActionHandler(
-            Settings.CURRENT_PPT,
-            presentation_context.slide_context.presentation,
-            presentation_context.slide_context.get_slide(
-                data["slidesInfo"][0]["index"]),
-            data["slidesInfo"][0]["index"],
-            GPT_response,
-            slide_context["selected_shape"]["actual"]
-            if "actual" in slide_context["selected_shape"] else None,
-            data["attached_file"] if "attached_file" in data else None,
+        updated_ppt_response = await _apply_actions(
+            document, data, slide_context, GPT_response)
+    if not updated_ppt_response:
+        raise HTTPException(status_code=500, detail="Error saving presentation")
+    await _commit_version(updated_ppt_response)
+    updated_ppt_response["download_url"] = str(
+        request.url_for("download_slide", file_id=updated_ppt_response["file_id"]))
+    updated_ppt_response["prompt_report"] = prompt_report
+    updated_ppt_response["layout_report"] = layout_report
+    updated_ppt_response["route_report"] = route_report
+    return updated_ppt_response
+
+
+async def _process_key(request: Request,
+                       document: Tuple[str, Optional[str]],
+                       data: Dict[str, Any]) -> Tuple[Any, ...]:
+    """
+    Identifies requests with the same outcome: deck, slide, shape, prompt up to
+    runs of spaces, attached file content and LLM cache use.
+    """
+    attached_file = data["attached_file"] if "attached_file" in data else None
+    return (
+        document[1] or document[0],
+        _slide_index(data),
+        _shape_name(data),
+        normalise_prompt(str(data.get("prompt", ""))),
+        await run_in_threadpool(_attachment_digest, attached_file)
+        if attached_file else None,
+        _use_llm_cache(request),
+    )
+
+
+def _attachment_digest(attached_file: Any) -> str:
+    try:
+        with open(attached_file, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    except (OSError, TypeError):
+        # Not a readable file: the request fails the same way for every duplicate
+        return repr(attached_file)
+
+
+@router.post("/process/stream")
+async def process_user_prompt_stream(request: Request):
+    """
+        Streaming variant of `/process` reporting progress as newline-delimited JSON.
+
+        \n**Parameters**
+            \n\trequest (Request):
+                The HTTP request object with the same JSON payload as `/process`.
+
+        \n**Returns**
+            \n\tStreamingResponse (application/x-ndjson):
+                One JSON object per line with an `event` name and `elapsed_ms`:
+                - accepted: the request was parsed and processing started.
+                - context_extracted: slide context is ready (`shapes_count`).
+                - prompt_built: prompts are rendered (`prompt_chars`, `prompt_report`
+                  with estimated token counts).
+                - actions_parsed: the GPT response was parsed and its layout corrected
+                  (`actions_count`, `layout_report` with corrected action counts,
+                  `route_report` with the model tier that answered).
+                  With `LLM_STREAM_ACTIONS`, it follows the last `action_applied`.
+                - action_applied: one action was applied (`index`, `action_type`,
+                  `shape_name`), with `LLM_STREAM_ACTIONS` while the rest of the
+                  response is still generated; process worker pools send one
+                  `actions_applied`.
+                - file_ready: the slide was saved (`file_id`, `download_url`,
+                  `file_path`, `size_bytes`, `version_report`); its bytes are
+                  served by `GET /slides/{file_id}` at `download_url`.
+                - done: processing finished (`input_data`).
+                - error: processing failed (`status_code`, `detail`); nothing follows.
+
+        \n**Raises**
+            \n\tHTTPException (400):
+                Raised if the request body is not valid JSON.
+    """
+    try:
+        data = await _parse_request(request)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid request body: {str(e)}")
+
+    return StreamingResponse(_process_events(request, data),
+                             media_type="application/x-ndjson")
+
+
+async def _process_events(request: Request, data: Dict[str, Any]) -> AsyncIterator[str]:
+    started = time.perf_counter()
+
+    def event(name: str, **fields) -> str:
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        return json.dumps({"event": name, "elapsed_ms": elapsed_ms, **fields}) + "\n"
+
+    try:
+        yield event("accepted")
+
+        document = await _resolve_document(data)
+        slide_context = await _extract_slide_context(document, data)
+        yield event("context_extracted", shapes_count=len(slide_context["shapes"]))
+
+        user_prompt, system_prompt, prompt_report = _generate_prompts(
+            data, slide_context)
+        yield event("prompt_built",
+                    prompt_chars=len(user_prompt) + len(system_prompt),
+                    prompt_report=prompt_report)
+
+        events: asyncio.Queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+
+        def on_action_applied(index: int, action: ShapeParameters) -> None:
+            loop.call_soon_threadsafe(events.put_nowait, event(
+                "action_applied",
+                index=index,
+                action_type=action.action_type.value,
+                shape_name=action.shape_name
+            ))
+
+        # Callbacks cannot cross into process workers
+        live_progress = Settings.WORKER_POOL.kind == "thread"
+        route_report = _route(data, slide_context)
+        streamed = _streams_actions(route_report)
+        if streamed:
+            apply_task = asyncio.ensure_future(_stream_actions(
+                request, document, data, slide_context, system_prompt, user_prompt,
+                route_report, on_action_applied))
+        else:
+            GPT_response, route_report = await _run_routed_chatGPT(
+                request, slide_context, system_prompt, user_prompt, route_report)
+            GPT_response, layout_report = await _post_process_layout(
+                GPT_response, slide_context)
+            actions_count = len(GPT_response.actions)
+            yield event("actions_parsed",
+                        actions_count=actions_count,
+                        layout_report=layout_report,
+                        route_report=route_report)
+            apply_task = asyncio.ensure_future(_apply_actions(
+                document, data, slide_context, GPT_response,
+                on_action_applied if live_progress else None))
+
+        try:
+            while not apply_task.done():
+                next_event = asyncio.ensure_future(events.get())
+                await asyncio.wait({apply_task, next_event},
+                                   return_when=asyncio.FIRST_COMPLETED)
+                if next_event.done():
+                    yield next_event.result()
+                else:
+                    next_event.cancel()
+        finally:
+            # Stop generating when the client goes away
+            apply_task.cancel()
+        while not events.empty():
+            yield events.get_nowait()
+
+        if streamed:
+            updated_ppt_response, actions_count, layout_report = apply_task.result()
+            yield event("actions_parsed",
+                        actions_count=actions_count,
+                        layout_report=layout_report,
+                        route_report=route_report)
+        else:
+            updated_ppt_response = apply_task.result()
+        if not live_progress:
+            yield event("actions_applied", actions_count=actions_count)
+        if not updated_ppt_response:
+            raise HTTPException(status_code=500, detail="Error saving presentation")
+        await _commit_version(updated_ppt_response)
+
+        file_path = updated_ppt_response["file_path"]
+        size_bytes = os.path.getsize(file_path)
+        Settings.METRICS.observe_size("slide", size_bytes)
+        yield event("file_ready",
+                    file_id=updated_ppt_response["file_id"],
+                    download_url=str(request.url_for(
+                        "download_slide", file_id=updated_ppt_response["file_id"])),
+                    file_path=file_path,
+                    size_bytes=size_bytes,
+                    version_report=updated_ppt_response.get("version_report"))
+        yield event("done", input_data=data)
+    except HTTPException as e:
+        yield event("error", status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        yield event("error",
+                    status_code=500,
+                    detail=f"Error processing user prompt: {str(e)}")
+
+
+@router.post("/process/batch", response_class=FastJSONResponse)
+async def process_user_prompt_batch(request: Request):
+    """
+        Applies an instruction to several slides and/or shapes in one request.
+
+        \n**Parameters**
+            \n\trequest (Request):
+                The HTTP request object with the `/process` payload plus `targets`, a
+                list of partial payloads merged over it, one per slide, e.g.
+                `{"slidesInfo": [{"index": 2}], "shapesInfo": [{"name": "Title 1"}]}`.
+                A target may also override `prompt`.
+
+        \n**Returns**
+            \n\tDict[str, Any]:
+                A handle to one file holding all updated slides (`file_id`,
+                `download_url`, `file_path`, `slide_indices`), the version of the deck
+                they were saved as (`version_report`), `results` with the status,
+                action count, prompt, layout and route reports or error of each target,
+                in request order, and the input data.
+
+        \n**Raises**
+            \n\tHTTPException (400):
+                Raised if there are no targets or more than `BATCH_MAX_TARGETS`.
+
+            \n\tHTTPException (404):
+                Raised if `documentId` does not refer to a stored presentation.
+
+            \n\tHTTPException (409):
+                Raised, with `PPT_VERSIONING`, if a concurrent edit of the deck
+                changed the same slides first.
+
+            \n\tHTTPException (502):
+                Raised, with the per-target `results`, if no target could be applied.
+
+        \n**Function Workflow**\n
+            1. Extract the context of all targets from a single parse of the deck.
+            2. Build the prompts and call GPT for all targets concurrently, at most
+               `BATCH_LLM_CONCURRENCY` at a time, and post-process each layout.
+            3. Apply all actions to one private copy of the presentation and save the
+               updated slides once.
+    """
+    try:
+        data = await _parse_request(request)
+        targets = data.get("targets")
+        if (not isinstance(targets, list) or not targets
+                or len(targets) > Settings.BATCH_MAX_TARGETS):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Between 1 and {Settings.BATCH_MAX_TARGETS} targets are "
+                       f"required")
+        targets_data = [{**data, **target} if isinstance(target, dict) else None
+                        for target in targets]
+        document = await _resolve_document(data)
+
+        results = [{"status": "failed", "error": "Invalid target"}
+                   for _ in targets_data]
+        positions = []
+        for position, target_data in enumerate(targets_data):
+            try:
+                results[position] = {"slide_index": _slide_index(target_data),
+                                     "shape_name": _shape_name(target_data)}
+                positions.append(position)
+            except (KeyError, IndexError, TypeError):
+                continue
+
+        # PPT CONTEXT, from one parse of the deck
+        slide_contexts = await Settings.WORKER_POOL.run(
+            "context",
+            PPTActionsService.load_slides_context,
+            *document,
+            [(results[position]["slide_index"], results[position]["shape_name"])
+             for position in positions]
         )
-        ppt_action_handler.execute_actions()
-        updated_ppt_response = ppt_action_handler.save_presentation()
+
+        # PROMPTS AND GPT CALLS, concurrently
+        semaphore = asyncio.Semaphore(Settings.BATCH_LLM_CONCURRENCY)
+        outcomes = await cancel_on_disconnect(request, asyncio.gather(*(
+            _process_batch_target(request, targets_data[position], slide_context,
+                                  semaphore)
+            for position, slide_context in zip(positions, slide_contexts)
+        ), return_exceptions=True))
+
+        batch_targets = []
+        for position, slide_context, outcome in zip(positions, slide_contexts,
+                                                    outcomes):
+            if isinstance(outcome, BaseException):
+                detail = outcome.detail if isinstance(outcome, HTTPException) \
+                    else str(outcome)
+                results[position].update(status="failed", error=detail)
+                continue
+            GPT_response, prompt_report, layout_report, route_report = outcome
+            results[position].update(actions_count=len(GPT_response.actions),
+                                     prompt_report=prompt_report,
+                                     layout_report=layout_report,
+                                     route_report=route_report)
+            batch_targets.append((position, (
+                results[position]["slide_index"],
+                GPT_response,
+                slide_context["selected_shape"].get("actual")
+            )))
+
+        # PERFORM ALL GPT PROPOSED PPT ACTIONS, saved once
+        updated_ppt_response = {"errors": {}}
+        if batch_targets:
+            updated_ppt_response = await Settings.WORKER_POOL.run(
+                "actions",
+                PPTActionsService.apply_batch_actions,
+                *document,
+                [target for _, target in batch_targets],
+                data["attached_file"] if "attached_file" in data else None,
+            )
+        errors = updated_ppt_response.pop("errors")
+        for index, (position, _) in enumerate(batch_targets):
+            if index in errors:
+                results[position].update(status="failed", error=errors[index])
+            else:
+                results[position]["status"] = "applied"
+
+        if not updated_ppt_response.get("file_id"):
+            raise HTTPException(status_code=502, detail={
+                "message": "No target could be applied", "results": results})
+        await _commit_version(updated_ppt_response)
+        updated_ppt_response["download_url"] = str(
+            request.url_for("download_slide", file_id=updated_ppt_response["file_id"]))
+        updated_ppt_response["results"] = results
         updated_ppt_response["input_data"] = data
 
-        return updated_ppt_response
+        return _encode_response(updated_ppt_response)
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -145,3 +556,558 @@ async def process_user_prompt(request: Request):
             status_code=500,
             detail=f"Error processing user prompt: {str(e)}"
         )
+
+
+async def _process_batch_target(request: Request,
+                                data: Dict[str, Any],
+                                slide_context: Dict[str, Any],
+                                semaphore: asyncio.Semaphore
+                                ) -> Tuple[ActionsList, Dict[str, Any], Dict[str, Any],
+                                           Dict[str, Any]]:
+    if not slide_context:
+        raise ValueError("Could not extract the slide context")
+
+    user_prompt, system_prompt, prompt_report = _generate_prompts(data, slide_context)
+    async with semaphore:
+        GPT_response, route_report = await _run_routed_chatGPT(
+            request, slide_context, system_prompt, user_prompt,
+            _route(data, slide_context))
+
+    GPT_response, layout_report = await _post_process_layout(
+        GPT_response, slide_context)
+    return GPT_response, prompt_report, layout_report, route_report
+
+
+async def _parse_request(request: Request) -> Dict[str, Any]:
+    with Settings.METRICS.stage("request.parse"):
+        data = await request.json()
+    Settings.METRICS.observe_size("request", len(await request.body()))
+    return data
+
+
+async def _resolve_document(data: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    with Settings.METRICS.stage("document.resolve"):
+        return await run_in_threadpool(PPTActionsService.resolve_document,
+                                       data.get("documentId"))
+
+
+def _encode_response(content: Dict[str, Any]) -> FastJSONResponse:
+    if content.get("file_path"):
+        Settings.METRICS.observe_size("slide", os.path.getsize(content["file_path"]))
+    with Settings.METRICS.stage("response.encode"):
+        response = FastJSONResponse(content)
+    Settings.METRICS.observe_size("response", len(response.body))
+    return response
+
+
+def _use_llm_cache(request: Request) -> bool:
+    cache_control = request.headers.get("cache-control", "").lower()
+    return "no-cache" not in cache_control and "no-store" not in cache_control
+
+
+def _slide_index(data: Dict[str, Any]) -> int:
+    return data["slidesInfo"][0]["index"]
+
+
+def _shape_name(data: Dict[str, Any]) -> Optional[str]:
+    return data["shapesInfo"][0]["name"] if "shapesInfo" in data \
+                                            and len(data["shapesInfo"]) else None
+
+
+async def _extract_slide_context(document: Tuple[str, Optional[str]],
+                                 data: Dict[str, Any]) -> Dict[str, Any]:
+    return await Settings.WORKER_POOL.run(
+        "context",
+        PPTActionsService.load_slide_context,
+        *document,
+        _slide_index(data),
+        _shape_name(data),
+        Settings.PPT_LAZY_CONTEXT
+    )
+
+
+def _generate_prompts(data: Dict[str, Any],
+                      slide_context: Dict[str, Any]
+                      ) -> Tuple[str, str, Dict[str, Any]]:
+    if "shapesInfo" in data and len(data["shapesInfo"]):
+        selected_prompt_key = "actions_update"
+    else:
+        selected_prompt_key = "actions"
+    with Settings.METRICS.stage("prompt.render"):
+        user_prompt, system_prompt, prompt_report = \
+            Settings.PROMPT_TEMPLATE.generate_prompts_with_report(
+                prompt_key=selected_prompt_key,
+                request_data=data,
+                context_data=slide_context,
+                covered_areas=slide_context["covered_areas"]
+            )
+    Settings.METRICS.observe_size(
+        "prompt", len(user_prompt.encode()) + len(system_prompt.encode()))
+    Settings.METRICS.observe_prompt(prompt_report)
+    return user_prompt, system_prompt, prompt_report
+
+
+async def _post_process_layout(GPT_response: Optional[ActionsList],
+                               slide_context: Dict[str, Any]
+                               ) -> Tuple[Optional[ActionsList], Dict[str, Any]]:
+    if GPT_response is None:
+        return None, {}
+
+    with Settings.METRICS.stage("layout"):
+        GPT_response, layout_report = await run_in_threadpool(
+            Settings.LAYOUT_POST_PROCESSOR.process, GPT_response, slide_context)
+    return GPT_response, layout_report
+
+
+def _route(data: Dict[str, Any], slide_context: Dict[str, Any]) -> Dict[str, Any]:
+    return Settings.GPT_ASYNC_SERVICE.route(str(data.get("prompt", "")), slide_context)
+
+
+async def _run_routed_chatGPT(request: Request,
+                              slide_context: Dict[str, Any],
+                              system_prompt: str,
+                              user_prompt: str,
+                              route_report: Dict[str, Any]
+                              ) -> Tuple[ActionsList, Dict[str, Any]]:
+    try:
+        GPT_response, route_report = await Settings.GPT_ASYNC_SERVICE.route_chatGPT(
+            gpt_client=Settings.GPT_ASYNC_CLIENT,
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            output_schema=ActionsList,
+            route_report=route_report,
+            check=lambda response: Settings.LAYOUT_POST_PROCESSOR.check(
+                response, slide_context),
+            use_cache=_use_llm_cache(request)
+        )
+    except CircuitOpenError as e:
+        raise _gpt_unavailable(e)
+    if GPT_response is None:
+        raise HTTPException(status_code=502, detail="No response from GPT service")
+    return GPT_response, route_report
+
+
+def _gpt_unavailable(e: CircuitOpenError) -> HTTPException:
+    return HTTPException(status_code=503,
+                         detail=f"GPT service unavailable: {str(e)}",
+                         headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+
+def _streams_actions(route_report: Dict[str, Any]) -> bool:
+    # Streamed actions are handed to the worker in memory, so need a thread pool;
+    # fast responses are not streamed, so they can be escalated before any is applied
+    return (Settings.LLM_STREAM_ACTIONS and Settings.WORKER_POOL.kind == "thread"
+            and route_report["tier"] != FAST_TIER)
+
+
+async def _stream_actions(
+        request: Request,
+        document: Tuple[str, Optional[str]],
+        data: Dict[str, Any],
+        slide_context: Dict[str, Any],
+        system_prompt: str,
+        user_prompt: str,
+        route_report: Dict[str, Any],
+        on_action_applied: Optional[Callable[[int, ShapeParameters], None]] = None
+) -> Tuple[Dict[str, str], int, Dict[str, Any]]:
+    """
+    Streams the GPT response and applies each action on the worker pool as soon
+    as it has been generated. Returns the saved slide, the number of actions and
+    the layout report. No worker is held while the response is generated, and
+    nothing is saved if generation fails or the request is cancelled.
+    """
+    layout_session = await run_in_threadpool(Settings.LAYOUT_POST_PROCESSOR.session,
+                                             slide_context)
+    async with Settings.WORKER_POOL.session() as workers:
+        ppt_action_handler = None
+        actions_count = 0
+        actions = Settings.GPT_ASYNC_SERVICE.stream_chatGPT(
+            gpt_client=Settings.GPT_ASYNC_CLIENT,
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            output_schema=ActionsList,
+            use_cache=_use_llm_cache(request),
+            route_reason=route_report["reason"]
+        )
+        async with aclosing(actions):
+            while True:
+                try:
+                    action = await anext(actions)
+                except StopAsyncIteration:
+                    break
+                except HTTPException:
+                    raise
+                except CircuitOpenError as e:
+                    raise _gpt_unavailable(e)
+                except Exception as e:
+                    raise HTTPException(status_code=502,
+                                        detail=f"Error from GPT service: {str(e)}")
+
+                if ppt_action_handler is None:
+                    ppt_action_handler = await _open_streamed_actions(
+                        workers, document, data, slide_context)
+                await workers.run("actions.execute",
+                                  PPTActionsService.apply_streamed_action,
+                                  ppt_action_handler,
+                                  actions_count,
+                                  action,
+                                  layout_session.correct,
+                                  on_action_applied)
+                actions_count += 1
+
+        if ppt_action_handler is None:
+            ppt_action_handler = await _open_streamed_actions(
+                workers, document, data, slide_context)
+        updated_ppt_response = await workers.run(
+            "actions.save", PPTActionsService.save_streamed_actions, ppt_action_handler)
+
+    layout_report = layout_session.close()
+    return updated_ppt_response, actions_count, layout_report
+
+
+async def _commit_version(updated_ppt_response: Dict[str, Any]) -> None:
+    # Makes the edit staged by the worker, if any, the head of its document
+    staged = updated_ppt_response.pop("staged_version", None)
+    if staged is not None:
+        try:
+            updated_ppt_response["version_report"] = await run_in_threadpool(
+                Settings.PPT_VERSIONS.commit, staged)
+        except VersionConflictError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+
+async def _open_streamed_actions(workers: WorkerSession,
+                                 document: Tuple[str, Optional[str]],
+                                 data: Dict[str, Any],
+                                 slide_context: Dict[str, Any]) -> Any:
+    return await workers.run(
+        "actions.load",
+        PPTActionsService.open_streamed_actions,
+        *document,
+        _slide_index(data),
+        slide_context["selected_shape"].get("actual"),
+        data["attached_file"] if "attached_file" in data else None,
+    )
+
+
+async def _apply_actions(
+        document: Tuple[str, Optional[str]],
+        data: Dict[str, Any],
+        slide_context: Dict[str, Any],
+        GPT_response: ActionsList,
+        on_action_applied: Optional[Callable[[int, ShapeParameters], None]] = None
+) -> Dict[str, str]:
+    return await Settings.WORKER_POOL.run(
+        "actions",
+        PPTActionsService.apply_actions,
+        *document,
+        _slide_index(data),
+        GPT_response,
+        slide_context["selected_shape"]["actual"]
+        if "actual" in slide_context["selected_shape"] else None,
+        data["attached_file"] if "attached_file" in data else None,
+        on_action_applied,
+    )
+
+
+@router.get("/slides/{file_id}", name="download_slide")
+async def download_slide(file_id: str, request: Request):
+    """
+        Serves an updated slide saved by `/process` or `/process/stream`.
+
+        \n**Parameters**
+        \n\tfile_id (str):
+            The `file_id` returned by `/process`.
+
+        \n**Returns**
+        \n\tSlideFileResponse:
+            The .pptx bytes, streamed from disk, with ETag/Last-Modified,
+            `If-None-Match` (304) and Range support. With `SLIDE_DOWNLOAD_GZIP`
+            enabled, non-range requests accepting gzip get a gzip-compressed stream
+            instead.
+
+        \n**Raises**
+        \n\tHTTPException (404):
+            Raised if no slide file exists for `file_id`.
+    """
+    file_path = _slide_file_path(file_id)
+    response = SlideFileResponse(file_path,
+                                 media_type=PPTX_MEDIA_TYPE,
+                                 filename=file_id,
+                                 stat_result=os.stat(file_path))
+    if not Settings.SLIDE_DOWNLOAD_GZIP:
+        return response
+
+    response.headers["vary"] = "Accept-Encoding"
+    if ("gzip" not in request.headers.get("accept-encoding", "")
+            or "range" in request.headers):
+        return response
+
+    etag = response.headers["etag"].rstrip('"') + '-gzip"'
+    if request.headers.get("if-none-match") == etag:
+        return SlideFileResponse.not_modified(etag, response.headers["last-modified"])
+    return StreamingResponse(
+        gzip_file_chunks(str(file_path)),
+        media_type=PPTX_MEDIA_TYPE,
+        headers={
+            "content-encoding": "gzip",
+            "content-disposition": response.headers["content-disposition"],
+            "etag": etag,
+            "last-modified": response.headers["last-modified"],
+            "vary": "Accept-Encoding",
+        }
+    )
+
+
+def _slide_file_path(file_id: str) -> Path:
+    slides_directory = Path.cwd() / SLIDES_DIRECTORY
+    file_path = slides_directory / file_id
+    if (Path(file_id).name != file_id
+            or file_path.suffix != ".pptx"
+            or not file_path.is_file()):
+        raise HTTPException(status_code=404, detail="Slide file not found")
+    return file_path
+
+
+@router.get("/documents/{document_id}/versions")
+async def document_versions(document_id: str):
+    """
+        Lists the versions of a presentation edited with `PPT_VERSIONING`.
+
+        \n**Parameters**
+        \n\tdocument_id (str):
+            The `document_id` returned by `/upload`.
+
+        \n**Returns**
+        \n\tDict[str, Any]:
+            The head version, whether it can be undone or redone, and per version its
+            parent, creation time, edited slides and number of changed package members.
+            Version 0 is the uploaded deck.
+
+        \n**Raises**
+        \n\tHTTPException (400):
+            Raised if `document_id` is not a SHA-256 hex digest.
+
+        \n\tHTTPException (404):
+            Raised if the presentation is not stored or versioning is disabled.
+    """
+    return await run_in_threadpool(PPTActionsService.run_version_operation,
+                                   Settings.PPT_VERSIONS.history, document_id)
+
+
+@router.post("/documents/{document_id}/undo")
+async def undo_document_version(document_id: str):
+    """
+        Makes the version the head was edited from the head of a presentation, so
+        the next `/process` edits it; later versions stay available to `/redo`
+        until then.
+
+        \n**Parameters**
+        \n\tdocument_id (str):
+            The `document_id` returned by `/upload`.
+
+        \n**Returns**
+        \n\tDict[str, Any]:
+            The versions, as returned by `GET /documents/{document_id}/versions`.
+
+        \n**Raises**
+        \n\tHTTPException (404):
+            Raised if the presentation is not stored or versioning is disabled.
+
+        \n\tHTTPException (409):
+            Raised if the version the head was edited from is no longer kept.
+    """
+    return await run_in_threadpool(PPTActionsService.run_version_operation,
+                                   Settings.PPT_VERSIONS.undo, document_id)
+
+
+@router.post("/documents/{document_id}/redo")
+async def redo_document_version(document_id: str):
+    """
+        Makes the version last undone the head of a presentation again.
+
+        \n**Parameters**
+        \n\tdocument_id (str):
+            The `document_id` returned by `/upload`.
+
+        \n**Returns**
+        \n\tDict[str, Any]:
+            The versions, as returned by `GET /documents/{document_id}/versions`.
+
+        \n**Raises**
+        \n\tHTTPException (404):
+            Raised if the presentation is not stored or versioning is disabled.
+
+        \n\tHTTPException (409):
+            Raised if no version was undone since the last edit.
+    """
+    return await run_in_threadpool(PPTActionsService.run_version_operation,
+                                   Settings.PPT_VERSIONS.redo, document_id)
+
+
+@router.get("/documents/{document_id}/versions/{version}", name="download_version")
+async def download_document_version(document_id: str, version: int):
+    """
+        Serves a whole version of a presentation, rebuilt from the uploaded deck and
+        the slides and media changed up to that version.
+
+        \n**Parameters**
+        \n\tdocument_id (str):
+            The `document_id` returned by `/upload`.
+
+        \n\tversion (int):
+            A version listed by `GET /documents/{document_id}/versions`.
+
+        \n**Returns**
+        \n\tSlideFileResponse:
+            The .pptx bytes with ETag/Last-Modified, `If-None-Match` (304) and Range
+            support.
+
+        \n**Raises**
+        \n\tHTTPException (404):
+            Raised if the presentation or version does not exist (versions beyond
+            `PPT_VERSIONS_MAX` are compacted) or versioning is disabled.
+    """
+    file_path = await run_in_threadpool(PPTActionsService.run_version_operation,
+                                        Settings.PPT_VERSIONS.checkout, document_id,
+                                        version)
+    return SlideFileResponse(file_path,
+                             media_type=PPTX_MEDIA_TYPE,
+                             filename=f"{document_id}_v{version}.pptx",
+                             stat_result=os.stat(file_path))
+
+
+@router.get("/cache/stats")
+async def presentation_cache_stats():
+    """
+        Returns hit/miss/eviction counters of the parsed-presentation cache.
+
+        \n**Returns**
+        \n\tDict[str, int]:
+            Cache counters with the current and maximum entries and bytes.
+    """
+    return Settings.PPT_CACHE.stats()
+
+
+@router.get("/process/coalescing/stats")
+async def process_coalescing_stats():
+    """
+        Returns counters of the coalescing of identical concurrent `/process` requests.
+
+        \n**Returns**
+        \n\tDict[str, Any]:
+            Computations in flight, requests that ran one (`leaders`), requests that
+            awaited one in flight (`coalesced`) and computations cancelled after all
+            their clients disconnected.
+    """
+    return Settings.PROCESS_SINGLE_FLIGHT.stats()
+
+
+@router.get("/images/stats")
+async def image_cache_stats():
+    """
+        Returns the preloaded icons and hit/miss/eviction counters of the attached
+        image cache.
+
+        \n**Returns**
+        \n\tDict[str, Any]:
+            Icons and their bytes, cache counters with the current and maximum
+            entries and bytes.
+    """
+    return Settings.IMAGE_ASSETS.stats()
+
+
+@router.get("/llm-cache/stats")
+async def llm_cache_stats():
+    """
+        Returns hit/miss counters of the LLM response cache.
+
+        \n**Returns**
+        \n\tDict[str, Any]:
+            Memory and SQLite hit counters, misses, entries and the cache configuration.
+    """
+    return Settings.LLM_CACHE.stats()
+
+
+@router.get("/llm/routing/stats")
+async def llm_routing_stats():
+    """
+        Returns counters of the routing of LLM calls between the fast and large models.
+
+        \n**Returns**
+        \n\tDict[str, Any]:
+            The router configuration, calls, escalations, escalation rate and mean
+            latency per tier, and calls per routing and escalation reason.
+    """
+    return Settings.MODEL_ROUTER.stats()
+
+
+@router.get("/llm/resilience/stats")
+async def llm_resilience_stats():
+    """
+        Returns the state of the LLM call deadlines, retries, hedging and circuit
+        breakers.
+
+        \n**Returns**
+        \n\tDict[str, Any]:
+            The configuration, retry budget tokens and, per deployment, the circuit
+            breaker state, median latency, hedge delay and attempt outcomes.
+    """
+    return Settings.LLM_RESILIENCE.stats()
+
+
+@router.get("/versions/stats")
+async def version_history_stats():
+    """
+        Returns counters and disk usage of the version history.
+
+        \n**Returns**
+        \n\tDict[str, Any]:
+            Documents with a history, blobs and rebuilt decks with their bytes, commits,
+            undos, redos, rebuilds and bytes staged by this worker, and the outcome of
+            the last compaction.
+    """
+    return await run_in_threadpool(Settings.PPT_VERSIONS.stats)
+
+
+@router.get("/layout/stats")
+async def layout_stats():
+    """
+        Returns counters of the layout post-processor.
+
+        \n**Returns**
+        \n\tDict[str, Any]:
+            Responses and actions processed, actions corrected in total and per kind of
+            correction (grid alignment, clamping to the slide, overlap resolution).
+    """
+    return Settings.LAYOUT_POST_PROCESSOR.stats()
+
+
+@router.get("/workers/stats")
+async def worker_pool_stats():
+    """
+        Returns the presentation worker pool configuration, saturation and
+        per-stage timings.
+
+        \n**Returns**
+        \n\tDict[str, Any]:
+            Pool kind and size, in-flight and rejected calls, and queue/run times
+            per stage.
+    """
+    return Settings.WORKER_POOL.stats()
+
+
+@router.get("/metrics")
+async def metrics():
+    """
+        Returns latency histograms per request stage (request parsing, deck load,
+        context extraction, prompt render, LLM call and parse, layout, action
+        execution, save, response encoding), LLM token counts, payload sizes and
+        HTTP request durations in the Prometheus text format.
+
+        \n**Returns**
+        \n\tstr:
+            The metrics in the Prometheus text exposition format 0.0.4.
+    """
+    return PlainTextResponse(Settings.METRICS.render(),
+                             media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,10 +1,10 @@
-import base64
-import hashlib
 import os
 import traceback
+import uuid
+from contextlib import ExitStack
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Tuple
 
 from fastapi import UploadFile, HTTPException
 from pptx.dml.color import RGBColor
@@ -14,26 +14,296 @@ from pptx.util import Mm, Pt
 
 from app.schemas.actions import ActionsList, ShapeParameters, ParagraphAttributes
 from app.config.settings import Settings
+from app.constants import SLIDES_DIRECTORY
+from app.services.ppt.context import PresentationContext, SlideContext
+from app.services.ppt.export import SlideExporter
+from app.services.ppt.images import ImageAsset
+from app.services.ppt.shape_writer import ShapeTreeWriter
+from app.services.ppt.versions import HistoryEndError
+from app.utils.workers import timed_stage
 
 
 class PPTActionsService:
     @staticmethod
-    def save_ppt(presentation: UploadFile, checksum: str) -> Dict[str, str]:
-        content = presentation.file.read()
-        computed_checksum = hashlib.sha256(content).hexdigest()
+    def save_ppt(presentation: UploadFile, checksum: str) -> Dict[str, Any]:
+        """
+        Streams the upload into the content-addressed presentation store while
+        verifying its checksum; an already stored deck is not read again.
+        """
+        try:
+            stored = Settings.PPT_STORAGE.save(presentation.file, checksum)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-        if checksum != computed_checksum:
-            raise HTTPException(status_code=400, detail="Checksum mismatch")
+        Settings.CURRENT_PPT = stored["file_path"]
+        Settings.CURRENT_PPT_CHECKSUM = stored["checksum"]
+
+        return {
+            "message": "Presentation already stored" if stored["deduplicated"]
+            else "Presentation saved successfully",
+            "filename": stored["file_path"],
+            **stored
+        }
+
+    @staticmethod
+    def use_stored_ppt(checksum: str) -> Dict[str, Any]:
+        """
+        Selects an already stored deck without uploading it again.
+        """
+        try:
+            stored = Settings.PPT_STORAGE.describe(checksum, deduplicated=True)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Presentation not found")
 
-        file_path = Path(Settings.LOCAL_PPT_FILENAME)
-        with file_path.open("wb") as f:
-            f.write(content)
+        Settings.CURRENT_PPT = stored["file_path"]
+        Settings.CURRENT_PPT_CHECKSUM = checksum
 
         return {
-            "message": "Presentation saved successfully",
-            "filename": str(file_path)
+            "message": "Presentation already stored",
+            "filename": stored["file_path"],
+            **stored
         }
 
+    @staticmethod
+    def resolve_document(document_id: Optional[str]) -> Tuple[str, Optional[str]]:
+        """
+        Returns the local path and checksum of the document `document_id`, or of
+        the last uploaded presentation when no document id is given.
+        """
+        if document_id is None:
+            if not (Settings.PPT_VERSIONING and Settings.CURRENT_PPT_CHECKSUM):
+                return Settings.CURRENT_PPT, Settings.CURRENT_PPT_CHECKSUM
+            document_id = Settings.CURRENT_PPT_CHECKSUM
+
+        try:
+            if Settings.PPT_VERSIONING:
+                # The head version, keyed apart from the uploaded deck
+                return Settings.PPT_VERSIONS.resolve(document_id)
+            return Settings.PPT_STORAGE.local_path(document_id), document_id
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Presentation not found")
+
+    @staticmethod
+    def run_version_operation(operation: Callable[..., Any],
+                              document_id: str,
+                              *args: Any) -> Any:
+        """
+        Runs a `Settings.PPT_VERSIONS` operation on the history of the document
+        `document_id`, mapping its errors to HTTP errors.
+        """
+        if not Settings.PPT_VERSIONING:
+            raise HTTPException(status_code=404, detail="Version history is disabled")
+        try:
+            return operation(document_id, *args)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Presentation not found")
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except HistoryEndError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @staticmethod
+    def load_slide_context(presentation_path: str,
+                           checksum: Optional[str],
+                           slide_index: int,
+                           shape_name: Optional[str] = None,
+                           lazy: bool = False) -> Dict[str, Any]:
+        """
+        Extracts the slide context from the cached presentation, or straight from
+        the .pptx zip in lazy mode when the presentation is not cached yet.
+        """
+        with ExitStack() as stack:
+            with timed_stage("load"):
+                presentation_context = PresentationContext(
+                    presentation_path,
+                    stack.enter_context(Settings.PPT_CACHE.read(
+                        presentation_path, checksum, load=not lazy)),
+                    lazy=lazy
+                )
+            with timed_stage("extract"):
+                return presentation_context.get_slide_context(slide_index,
+                                                              shape_name)
+
+    @staticmethod
+    def load_slides_context(presentation_path: str,
+                            checksum: Optional[str],
+                            targets: List[Tuple[int, Optional[str]]]
+                            ) -> List[Dict[str, Any]]:
+        """
+        Extracts the context of each `(slide_index, shape_name)` target from a
+        single parse of the cached presentation. Targets that cannot be extracted
+        get an empty context.
+        """
+        with ExitStack() as stack:
+            with timed_stage("load"):
+                presentation_context = PresentationContext(
+                    presentation_path,
+                    stack.enter_context(
+                        Settings.PPT_CACHE.read(presentation_path, checksum))
+                )
+            with timed_stage("extract"):
+                return [presentation_context.get_slide_context(slide_index,
+                                                               shape_name)
+                        for slide_index, shape_name in targets]
+
+    @staticmethod
+    def apply_batch_actions(presentation_path: str,
+                            checksum: Optional[str],
+                            targets: List[Tuple[int, ActionsList, Optional[int]]],
+                            attached_file: Optional[Any]) -> Dict[str, Any]:
+        """
+        Applies the actions of each `(slide_index, actions, selected_shape_index)`
+        target to one checkout of the cached presentation and saves all
+        updated slides into a single file. Targets that fail, or some of whose
+        actions fail, are reported in `errors` by position instead of failing the
+        batch; a slide is saved only if at least one of its actions was applied.
+        """
+        with timed_stage("load"):
+            working_context = SlideContext(
+                presentation_path,
+                Settings.PPT_CACHE.checkout(
+                    presentation_path, checksum,
+                    [slide_index for slide_index, _, _ in targets])
+            )
+
+        # Selected shapes are tracked by element: deleting one shifts the indices
+        # of later shapes when several targets share a slide
+        errors: Dict[int, str] = {}
+        selected_elements = {}
+        for position, (slide_index, _, selected_shape_index) in enumerate(targets):
+            try:
+                slide = working_context.get_slide(slide_index)
+                if selected_shape_index is not None:
+                    selected_elements[position] = \
+                        slide.shapes[selected_shape_index]._element
+            except (ValueError, IndexError) as e:
+                errors[position] = str(e)
+
+        ppt_action_handler = None
+        applied_slide_indices = set()
+        with timed_stage("execute"):
+            for position, (slide_index, ppt_actions_GPT, _) in enumerate(targets):
+                if position in errors:
+                    continue
+                try:
+                    slide = working_context.get_slide(slide_index)
+                    selected_element = selected_elements.get(position)
+                    ppt_action_handler = PPTActionHandler(
+                        presentation_path,
+                        working_context.presentation,
+                        slide,
+                        slide_index,
+                        ppt_actions_GPT,
+                        next(index for index, shape in enumerate(slide.shapes)
+                             if shape._element is selected_element)
+                        if selected_element is not None else None,
+                        attached_file,
+                        checksum,
+                    )
+                    failures = ppt_action_handler.execute_actions()
+                    if failures:
+                        errors[position] = "Error applying actions: " + \
+                            "; ".join(failures)
+                    if len(failures) < len(ppt_actions_GPT.actions):
+                        applied_slide_indices.add(slide_index)
+                except Exception as e:
+                    errors[position] = f"Error applying actions: {str(e)}"
+
+        if ppt_action_handler is None or not applied_slide_indices:
+            return {"errors": errors}
+        with timed_stage("save"):
+            saved = ppt_action_handler.save_presentation(
+                slide_indices=sorted(applied_slide_indices))
+        return {**saved, "slide_indices": sorted(applied_slide_indices),
+                "errors": errors}
+
+    @staticmethod
+    def open_streamed_actions(presentation_path: str,
+                              checksum: Optional[str],
+                              slide_index: int,
+                              selected_shape_index: Optional[int],
+                              attached_file: Optional[Any]) -> "PPTActionHandler":
+        """
+        Checks out the slide of the cached presentation for actions applied
+        one at a time while they are generated, with `apply_streamed_action`, and
+        saved with `save_streamed_actions`. The handler stays in memory between
+        calls, so this is only usable from a thread pool.
+        """
+        working_context = SlideContext(
+            presentation_path,
+            Settings.PPT_CACHE.checkout(presentation_path, checksum, [slide_index])
+        )
+        return PPTActionHandler(
+            presentation_path,
+            working_context.presentation,
+            working_context.get_slide(slide_index),
+            slide_index,
+            ActionsList(actions=[]),
+            selected_shape_index,
+            attached_file,
+            checksum,
+        )
+
+    @staticmethod
+    def apply_streamed_action(ppt_action_handler: "PPTActionHandler",
+                              index: int,
+                              action: ShapeParameters,
+                              correct_action: Optional[
+                                  Callable[[ShapeParameters], ShapeParameters]] = None,
+                              on_action_applied: Optional[
+                                  Callable[[int, ShapeParameters], None]] = None
+                              ) -> None:
+        if correct_action:
+            action = correct_action(action)
+        ppt_action_handler.execute_streamed_action(index, action, on_action_applied)
+
+    @staticmethod
+    def save_streamed_actions(ppt_action_handler: "PPTActionHandler") -> Dict[str, str]:
+        ppt_action_handler.finish_streamed_actions()
+        return ppt_action_handler.save_presentation()
+
+    @staticmethod
+    def apply_actions(presentation_path: str,
+                      checksum: Optional[str],
+                      slide_index: int,
+                      ppt_actions_GPT: ActionsList,
+                      selected_shape_index: Optional[int],
+                      attached_file: Optional[Any],
+                      on_action_applied: Optional[
+                          Callable[[int, ShapeParameters], None]] = None
+                      ) -> Dict[str, str]:
+        """
+        Applies the GPT proposed actions to a checkout of the slide of the cached
+        presentation and saves the updated slide. `on_action_applied` is called
+        after each action and is only usable from a thread pool.
+        """
+        with timed_stage("load"):
+            working_context = SlideContext(
+                presentation_path,
+                Settings.PPT_CACHE.checkout(presentation_path, checksum,
+                                            [slide_index])
+            )
+        ppt_action_handler = PPTActionHandler(
+            presentation_path,
+            working_context.presentation,
+            working_context.get_slide(slide_index),
+            slide_index,
+            ppt_actions_GPT,
+            selected_shape_index,
+            attached_file,
+            checksum,
+        )
+        with timed_stage("execute"):
+            ppt_action_handler.execute_actions(on_action_applied)
+        with timed_stage("save"):
+            return ppt_action_handler.save_presentation()
+
 
 class PPTActionHandler:
     """
@@ -49,7 +319,8 @@ class PPTActionHandler:
             slide_idx: int,
             ppt_actions_GPT: ActionsList,
             selected_shape_index: Optional[int],
-            attached_file: Optional[Any]) -> None:
+            attached_file: Optional[Any],
+            version_key: Optional[str] = None) -> None:
         self.file_name = file_name
         self.presentation = presentation
         self.slide = slide
@@ -58,6 +329,8 @@ class PPTActionHandler:
         self.ppt_actions_GPT = ppt_actions_GPT
         self.selected_shape_index = selected_shape_index
         self.attached_file = attached_file
+        self.version_key = version_key
+        self.shape_writer: Optional[ShapeTreeWriter] = None
         self.action_map = {
             "create_textbox": self._create_textbox,
             # "update_textbox": self._update_textbox,
@@ -68,14 +341,35 @@ class PPTActionHandler:
             "delete_shape": self._delete_shape
         }
 
-    def execute_actions(self) -> None:
+    def execute_actions(
+            self,
+            on_action_applied: Optional[Callable[[int, ShapeParameters], None]] = None
+    ) -> List[str]:
+        """
+        Executes all actions, returning the errors of those that failed instead
+        of raising.
+        """
+        failures = []
         try:
-            for action in self.ppt_actions_GPT.actions:
-                self.execute_action(
-                    action_type=action.action_type.value,
-                    parameters=action,
-                    attached_file=self.attached_file if self.attached_file else None
-                )
+            # With BULK_SHAPE_WRITER, new shapes are inserted together at the end
+            self.shape_writer = ShapeTreeWriter(self.slide) \
+                if Settings.BULK_SHAPE_WRITER else None
+            try:
+                for index, action in enumerate(self.ppt_actions_GPT.actions):
+                    error = self.execute_action(
+                        action_type=action.action_type.value,
+                        parameters=action,
+                        attached_file=self.attached_file if self.attached_file else None
+                    )
+                    if error is not None:
+                        failures.append(
+                            f"action {index} ({action.action_type.value}): {error}")
+                    if on_action_applied:
+                        on_action_applied(index, action)
+            finally:
+                if self.shape_writer is not None:
+                    self.shape_writer.flush()
+                    self.shape_writer = None
             if self.selected_shape_index:
                 self._delete_shape()
         except Exception as e:
@@ -83,26 +377,65 @@ class PPTActionHandler:
                   f"\nError Type: {type(e).__name__}"
                   f"\nError Message: {str(e)}"
                   f"\nTraceback:{traceback.format_exc()}")
+            failures.append(str(e))
+        return failures
+
+    def execute_streamed_action(
+            self,
+            index: int,
+            action: ShapeParameters,
+            on_action_applied: Optional[Callable[[int, ShapeParameters], None]] = None
+    ) -> None:
+        """
+        Executes one action of a response still being generated; the selected
+        shape is deleted by `finish_streamed_actions` once all have arrived.
+        """
+        self.execute_action(
+            action_type=action.action_type.value,
+            parameters=action,
+            attached_file=self.attached_file if self.attached_file else None
+        )
+        if on_action_applied:
+            on_action_applied(index, action)
+
+    def finish_streamed_actions(self) -> None:
+        if self.selected_shape_index:
+            self._delete_shape()
 
     def execute_action(self,
                        action_type: str,
                        parameters: ShapeParameters,
-                       attached_file: Optional[str] = None) -> None:
+                       attached_file: Optional[str] = None) -> Optional[str]:
         """
-        Executes the specified action type with provided parameters.
+        Executes the specified action type with provided parameters, returning
+        the error message if it failed.
         """
         try:
             if action_type not in self.action_map:
                 raise ValueError(f"Unsupported action type: {action_type}")
 
             self.action_map[action_type](parameters, attached_file)
+            return None
         except Exception as e:
             print(f"An error occurred during action execution:"
                   f"\nError Type: {type(e).__name__}"
                   f"\nError Message: {str(e)}"
                   f"\nTraceback:{traceback.format_exc()}")
+            return str(e)
 
     def _create_textbox(self, parameters: ShapeParameters, *_) -> None:
+        word_wrap = parameters.word_wrap if parameters.word_wrap else True
+        if self.shape_writer is not None:
+            self.shape_writer.add_textbox(
+                Mm(parameters.left),
+                Mm(parameters.top),
+                Mm(parameters.width),
+                Mm(parameters.height),
+                word_wrap,
+                parameters.paragraphs
+            )
+            return
+
         textbox = self.slide.shapes.add_textbox(
             Mm(parameters.left),
             Mm(parameters.top),
@@ -110,7 +443,7 @@ class PPTActionHandler:
             Mm(parameters.height)
         )
         text_frame = textbox.text_frame
-        text_frame.word_wrap = parameters.word_wrap if parameters.word_wrap else True
+        text_frame.word_wrap = word_wrap
         self._add_paragraphs(text_frame, parameters.paragraphs)
 
     def _update_textbox(self, parameters: ShapeParameters, *_) -> None:
@@ -124,13 +457,7 @@ class PPTActionHandler:
         if not attached_file:
             raise ValueError("Attached file is required for image creation.")
 
-        self.slide.shapes.add_picture(
-            attached_file,
-            Mm(parameters.left),
-            Mm(parameters.top),
-            Mm(parameters.width),
-            Mm(parameters.height)
-        )
+        self._add_picture(Settings.IMAGE_ASSETS.image(attached_file), parameters)
 
     def _update_image(self, parameters: ShapeParameters, *_) -> None:
         shape = self.slide.shapes[self.selected_shape_index]
@@ -144,15 +471,16 @@ class PPTActionHandler:
             shape.height = Mm(parameters.height)
 
     def _create_icon(self, parameters: ShapeParameters, *_) -> None:
-        icon_path = self.cwd_path.joinpath("resources",
-                                           "icons", f"{parameters.icon_name.value}.png")
-        self.slide.shapes.add_picture(
-            str(icon_path),
-            Mm(parameters.left),
-            Mm(parameters.top),
-            Mm(parameters.width),
-            Mm(parameters.height)
-        )
+        self._add_picture(Settings.IMAGE_ASSETS.icon(parameters.icon_name.value),
+                          parameters)
+
+    def _add_picture(self, asset: ImageAsset, parameters: ShapeParameters) -> None:
+        position = (Mm(parameters.left), Mm(parameters.top),
+                    Mm(parameters.width), Mm(parameters.height))
+        if self.shape_writer is not None:
+            self.shape_writer.add_picture(asset, *position)
+        else:
+            Settings.IMAGE_ASSETS.add_picture(self.slide.shapes, asset, *position)
 
     def _update_icon(self, parameters: ShapeParameters, *_) -> None:
         self._update_image(parameters)
@@ -178,29 +506,37 @@ class PPTActionHandler:
                                 for i in (0, 2, 4))
                 font.color.rgb = RGBColor(r, g, b)
 
-    def save_presentation(self, output_directory: str = "slides_ppt") -> Dict[str, str]:
+    def save_presentation(self,
+                          output_directory: str = SLIDES_DIRECTORY,
+                          slide_indices: Optional[List[int]] = None) -> Dict[str, Any]:
+        """
+        Saves the updated slide, or the slides at `slide_indices`, under
+        `output_directory` and returns a handle to the file; the bytes are served
+        separately by `GET /slides/{file_id}`. With `PPT_VERSIONING`, the edit of
+        the version `version_key` is staged as the next version of its document
+        (`staged_version`), to be committed by the caller.
+        """
         try:
             if not os.path.exists(output_directory):
                 os.makedirs(output_directory)
 
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_path = str(self.cwd_path
-                            / output_directory
-                            / f"{Settings.LOCAL_PPT_FILENAME.split('.')[0]}_{timestamp}.pptx")
-
-            # Get the slide ID list element in the XML
-            slide_id_list = self.presentation.slides._sldIdLst
-            slide_indices_to_delete = [i for i in range(len(self.presentation.slides))]
-            slide_indices_to_delete.remove(self.slide_idx)
+            file_id = (f"{Settings.LOCAL_PPT_FILENAME.split('.')[0]}_{timestamp}"
+                       f"_{uuid.uuid4().hex[:8]}.pptx")
+            file_path = str(self.cwd_path / output_directory / file_id)
 
-            # Remove slides based on indices
-            for index in sorted(slide_indices_to_delete, reverse=True):
-                del slide_id_list[index]
+            # Export only the target slides and the parts they depend on
+            slide_ppt = SlideExporter(self.presentation).export(
+                slide_indices or [self.slide_idx])
+            with open(file_path, "wb") as f:
+                f.write(slide_ppt.getbuffer())
 
-            self.presentation.save(file_path)
-
-            base64_encoded_ppt = self._convert_to_base64(file_path)
-            return {"file_path": file_path, "base64_encoded_ppt": base64_encoded_ppt}
+            saved = {"file_path": file_path, "file_id": file_id}
+            if Settings.PPT_VERSIONING and self.version_key:
+                saved["staged_version"] = Settings.PPT_VERSIONS.stage(
+                    self.version_key, self.presentation,
+                    slide_indices or [self.slide_idx])
+            return saved
 
         except Exception as e:
             print(f"An error occurred during saving:"
@@ -208,12 +544,3 @@ class PPTActionHandler:
                   f"\nError Message: {str(e)}"
                   f"\nTraceback:{traceback.format_exc()}")
             return {}
-
-    @staticmethod
-    def _convert_to_base64(file_path: str) -> str:
-        try:
-            with open(file_path, "rb") as file:
-                return base64.b64encode(file.read()).decode("utf-8")
-        except Exception as e:
-            print(f"Error encoding file to Base64: {str(e)}")
-            return ""
@@ -0,0 +1,270 @@
+import copy
+import hashlib
+import threading
+import weakref
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterable, Iterator, List
+
+from pptx import Presentation
+from pptx.opc.package import Part, XmlPart, _Relationship
+from pptx.presentation import Presentation as ppt_type
+from pptx.util import lazyproperty
+
+# lxml trees take about 12 times the bytes of the XML they are parsed from
+PARSED_XML_FACTOR = 12
+XML_MEMBER_SUFFIXES = (".xml", ".rels")
+
+
+class PresentationCache:
+    """
+    In-process LRU cache of parsed presentations keyed by the SHA-256 checksum
+    of the .pptx file, bounded by entry count and a byte budget on the estimated
+    memory of the parsed presentations.
+
+    Each entry keeps a pristine template, and a shared copy handed out to one
+    reader at a time. Checkouts copy only the template parts of the slides to be edited
+    and of the parts relating to them; the layouts, masters, themes, media and
+    other slides are shared with the template, so they must not be modified.
+    Parts are copied without the lazy properties cached on them: python-pptx
+    proxies hold sub-elements (e.g. a slide's `spTree`) that `copy.deepcopy`
+    would detach from the copied part tree.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: "weakref.WeakValueDictionary[str, threading.Lock]" = \
+            weakref.WeakValueDictionary()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @contextmanager
+    def read(self,
+             presentation_path: str,
+             checksum: Optional[str] = None,
+             load: bool = True) -> Iterator[Optional[ppt_type]]:
+        """
+        Yields the shared, parsed presentation for `presentation_path` while
+        holding its lock: python-pptx and lxml create proxies and cache lazy
+        properties on first access, which is not safe from several threads at
+        once. Without `load`, yields `None` instead of loading a presentation
+        that is not cached yet.
+
+        The presentation is owned by the cache and must be treated as read-only
+        and not used after the block; use `checkout` to obtain a copy that can be
+        modified.
+        """
+        if load:
+            key = checksum or self._compute_checksum(presentation_path)
+            entry = self._get(presentation_path, key)
+        else:
+            entry = self._peek(checksum)
+        if entry is None:
+            yield None
+            return
+
+        with entry["lock"]:
+            yield entry["presentation"]
+
+    def checkout(self,
+                 presentation_path: str,
+                 checksum: Optional[str],
+                 slide_indices: Iterable[int]) -> ppt_type:
+        """
+        Return a copy of the cached presentation in which the slides at
+        `slide_indices` are private and safe to mutate, e.g. by adding shapes
+        and pictures to them.
+        """
+        key = checksum or self._compute_checksum(presentation_path)
+        entry = self._get(presentation_path, key)
+        with entry["lock"]:
+            return self._copy(entry, slide_indices)
+
+    def put(self, checksum: str, template: ppt_type, size: int) -> Dict[str, Any]:
+        """
+        Cache a freshly loaded, untouched presentation together with a shared copy
+        for readers; `size` is their estimated memory (see `parsed_size`). The
+        template must not be used by the caller afterwards.
+        """
+        prs_part = template.part
+        sldIdLst = prs_part._element.sldIdLst
+        rIds = [sldId.rId for sldId in sldIdLst.sldId_lst] \
+            if sldIdLst is not None else []
+        # Named as `Presentation.slides` names them, so reading the slides of a
+        # checkout does not rename the shared parts
+        prs_part.rename_slide_parts(rIds)
+
+        referrers: Dict[Part, List[Part]] = {}
+        for part in prs_part.package.iter_parts():
+            for rel in part.rels.values():
+                if not rel.is_external:
+                    referrers.setdefault(rel.target_part, []).append(part)
+
+        entry = {
+            "template": template,
+            "presentation": copy.deepcopy(template),
+            "slide_parts": [prs_part.related_part(rId) for rId in rIds],
+            "referrers": referrers,
+            "size": size,
+            # Held while reading the shared copy and copying from the template
+            "lock": threading.Lock()
+        }
+        if entry["size"] > self.max_bytes:
+            return entry
+
+        with self._lock:
+            previous = self._entries.pop(checksum, None)
+            if previous is not None:
+                self._size -= previous["size"]
+
+            self._entries[checksum] = entry
+            self._size += entry["size"]
+
+            while (len(self._entries) > self.max_entries
+                   or self._size > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted["size"]
+                self.evictions += 1
+
+        return entry
+
+    def invalidate(self, checksum: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(checksum, None)
+            if entry is not None:
+                self._size -= entry["size"]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _peek(self, checksum: Optional[str]) -> Optional[Dict[str, Any]]:
+        # A miss is not counted, since nothing is loaded
+        if checksum is None:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(checksum)
+            if entry is None:
+                return None
+            self._entries.move_to_end(checksum)
+            self.hits += 1
+            return entry
+
+    def _lookup(self, checksum: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(checksum)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(checksum)
+            self.hits += 1
+            return entry
+
+    def _get(self, presentation_path: str, checksum: str) -> Dict[str, Any]:
+        entry = self._lookup(checksum)
+        if entry is not None:
+            return entry
+
+        # Concurrent misses on a checksum parse the deck once, so the byte
+        # budget is not exceeded by several copies being loaded at once
+        with self._load_lock(checksum):
+            with self._lock:
+                entry = self._entries.get(checksum)
+            return entry or self._load(presentation_path, checksum)
+
+    def _load_lock(self, checksum: str) -> threading.Lock:
+        with self._lock:
+            load_lock = self._load_locks.get(checksum)
+            if load_lock is None:
+                load_lock = threading.Lock()
+                self._load_locks[checksum] = load_lock
+            return load_lock
+
+    def _load(self, presentation_path: str, checksum: str) -> Dict[str, Any]:
+        try:
+            template = Presentation(presentation_path)
+        except Exception as e:
+            raise ValueError(f"Error loading presentation: {str(e)}")
+
+        return self.put(checksum, template, self.parsed_size(presentation_path))
+
+    @staticmethod
+    def parsed_size(presentation_path: str) -> int:
+        """
+        Estimated memory of a cache entry for the .pptx file: binary parts are
+        kept as they are and shared by the template and its copy, XML parts are
+        parsed into lxml trees of about `PARSED_XML_FACTOR` times their size in
+        each of them.
+        """
+        with zipfile.ZipFile(presentation_path) as zip_file:
+            return sum(2 * PARSED_XML_FACTOR * info.file_size
+                       if info.filename.endswith(XML_MEMBER_SUFFIXES)
+                       else info.file_size
+                       for info in zip_file.infolist())
+
+    @staticmethod
+    def _copy(entry: Dict[str, Any], slide_indices: Iterable[int]) -> ppt_type:
+        """
+        Copies the package, the presentation part, the slides at `slide_indices`
+        and every part relating to a copied part (e.g. notes slides, or slides
+        linking to an edited one), so that no shared part refers to a copy.
+        """
+        template_package = entry["template"].part.package
+        pending = [entry["template"].part]
+        for slide_index in slide_indices:
+            try:
+                pending.append(entry["slide_parts"][slide_index])
+            except IndexError:
+                # Raised when the slide is looked up in the copy
+                continue
+
+        copies: Dict[Part, Part] = {}
+        package = type(template_package)(template_package._pkg_file)
+        while pending:
+            part = pending.pop()
+            if part not in copies:
+                copies[part] = PresentationCache._copy_part(part, package)
+                pending.extend(entry["referrers"].get(part, []))
+
+        for source, target in [(template_package, package), *copies.items()]:
+            for rId, rel in source._rels.items():
+                target._rels._rels[rId] = _Relationship(
+                    rel._base_uri, rId, rel.reltype, rel._target_mode,
+                    rel._target if rel.is_external
+                    else copies.get(rel._target, rel._target))
+        return package.main_document_part.presentation
+
+    @staticmethod
+    def _copy_part(part: Part, package: Any) -> Part:
+        copied = copy.copy(part)
+        for name in list(vars(copied)):
+            if isinstance(getattr(type(part), name, None), lazyproperty):
+                del vars(copied)[name]
+        copied._package = package
+        if isinstance(part, XmlPart):
+            copied._element = copy.deepcopy(part._element)
+        return copied
+
+    def _compute_checksum(self, presentation_path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(presentation_path, "rb") as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
@@ -1,16 +1,28 @@
 import os
 import traceback
-from typing import Optional, Dict, Any
+import zipfile
+from typing import Optional, Dict, Any, List
 
 from pptx import Presentation
+from pptx.opc.constants import RELATIONSHIP_TARGET_MODE as RTM
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.oxml import CT_Relationships
+from pptx.opc.packuri import PackURI, PACKAGE_URI
+from pptx.oxml import parse_xml
 from pptx.presentation import Presentation as ppt_type
-from pptx.slide import Slide
+from pptx.slide import Slide, SlideLayout, SlideMaster
+from pptx.util import Emu, lazyproperty
+
+from app.services.ppt.spatial import SpatialIndex
 
 
 class SlideContext:
-    def __init__(self, presentation_path: str):
+    def __init__(self,
+                 presentation_path: str,
+                 presentation: Optional[ppt_type] = None):
         self.presentation_path = presentation_path
-        self.presentation = self._load_presentation()
+        self.presentation = presentation if presentation is not None \
+            else self._load_presentation()
 
     def _load_presentation(self) -> ppt_type:
         try:
@@ -25,6 +37,114 @@ class SlideContext:
             raise ValueError(f"Slide index {slide_index} is out of range.")
 
 
+class _LazyPart:
+    """
+    Minimal stand-in for a python-pptx slide, layout or master part. Related parts
+    are parsed from the open .pptx zip only when a placeholder inherits from them.
+    """
+
+    def __init__(self, reader: "LazySlideReader", partname: PackURI):
+        self._reader = reader
+        self.partname = partname
+
+    @property
+    def part(self) -> "_LazyPart":
+        return self
+
+    @lazyproperty
+    def element(self):
+        return parse_xml(self._reader.read(self.partname))
+
+    @lazyproperty
+    def slide_layout(self) -> SlideLayout:
+        layout_part = self._related_part(RT.SLIDE_LAYOUT)
+        return SlideLayout(layout_part.element, layout_part)
+
+    @lazyproperty
+    def slide_master(self) -> SlideMaster:
+        master_part = self._related_part(RT.SLIDE_MASTER)
+        return SlideMaster(master_part.element, master_part)
+
+    def _related_part(self, reltype: str) -> "_LazyPart":
+        return _LazyPart(self._reader,
+                         self._reader.related_partnames(self.partname)[reltype][0])
+
+
+class LazySlideReader:
+    """
+    Reads a single slide straight from the .pptx zip, parsing only the presentation
+    part, the target slide and (on demand) its layout and master instead of
+    materialising every part of the package.
+    """
+
+    def __init__(self, presentation_path: str):
+        self.presentation_path = presentation_path
+        self._zip_file = zipfile.ZipFile(presentation_path)
+        self._presentation_partname = self.related_partnames(
+            PACKAGE_URI)[RT.OFFICE_DOCUMENT][0]
+        self._presentation = parse_xml(self.read(self._presentation_partname))
+
+    def __enter__(self) -> "LazySlideReader":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._zip_file.close()
+
+    def read(self, partname: PackURI) -> bytes:
+        return self._zip_file.read(partname.membername)
+
+    def related_partnames(self, partname: PackURI) -> Dict[str, List[PackURI]]:
+        rels_membername = partname.rels_uri.membername
+        if rels_membername not in self._zip_file.NameToInfo:
+            return {}
+
+        rels: CT_Relationships = parse_xml(self._zip_file.read(rels_membername))
+        related: Dict[str, List[PackURI]] = {}
+        for rel in rels.relationship_lst:
+            if rel.targetMode == RTM.EXTERNAL:
+                continue
+            related.setdefault(rel.reltype, []).append(
+                PackURI.from_rel_ref(partname.baseURI, rel.target_ref))
+        return related
+
+    @lazyproperty
+    def slide_partnames(self) -> List[PackURI]:
+        sldIdLst = self._presentation.sldIdLst
+        if sldIdLst is None:
+            return []
+
+        rels: CT_Relationships = parse_xml(self._zip_file.read(
+            self._presentation_partname.rels_uri.membername))
+        targets = {rel.rId: rel.target_ref for rel in rels.relationship_lst}
+        return [
+            PackURI.from_rel_ref(self._presentation_partname.baseURI,
+                                 targets[sldId.rId])
+            for sldId in sldIdLst.sldId_lst
+        ]
+
+    def get_slide(self, slide_index: int) -> Slide:
+        try:
+            partname = self.slide_partnames[slide_index]
+        except IndexError:
+            raise ValueError(f"Slide index {slide_index} is out of range.")
+
+        slide_part = _LazyPart(self, partname)
+        return Slide(slide_part.element, slide_part)
+
+    def get_presentation_metadata(self) -> Dict[str, Any]:
+        sldSz = self._presentation.sldSz
+        return {
+            "file_name": os.path.basename(self.presentation_path),
+            "file_size": os.path.getsize(self.presentation_path),
+            "slide_count": len(self.slide_partnames),
+            "slide_width": Emu(sldSz.cx).mm if sldSz is not None else None,
+            "slide_height": Emu(sldSz.cy).mm if sldSz is not None else None,
+        }
+
+
 class ShapeContextExtractor:
     @staticmethod
     def extract_shape_context(slide: Slide,
@@ -74,11 +194,32 @@ class ShapeContextExtractor:
 
 
 class PresentationContext:
-    def __init__(self, presentation_path: str):
-        self.slide_context = SlideContext(presentation_path)
+    """
+    Extracts presentation and slide context. In lazy mode, and while no parsed
+    presentation is available, slides are read with `LazySlideReader`.
+    """
+
+    def __init__(self,
+                 presentation_path: str,
+                 presentation: Optional[ppt_type] = None,
+                 lazy: bool = False):
+        self.presentation_path = presentation_path
+        self.lazy = lazy
+        self._slide_context = SlideContext(presentation_path, presentation) \
+            if presentation is not None or not lazy else None
+
+    @property
+    def slide_context(self) -> SlideContext:
+        if self._slide_context is None:
+            self._slide_context = SlideContext(self.presentation_path)
+        return self._slide_context
 
     def get_presentation_metadata(self) -> Dict[str, Any]:
         try:
+            if self._slide_context is None:
+                with LazySlideReader(self.presentation_path) as reader:
+                    return reader.get_presentation_metadata()
+
             return {
                 "file_name": os.path.basename(self.slide_context.presentation_path),
                 "file_size": os.path.getsize(self.slide_context.presentation_path),
@@ -95,20 +236,42 @@ class PresentationContext:
                           slide_index: int,
                           shape_name: Optional[str] = None) -> Dict[str, Any]:
         try:
-            slide = self.slide_context.get_slide(slide_index)
-            shape_context = ShapeContextExtractor.extract_shape_context(
-                slide,
+            if self._slide_context is None:
+                with LazySlideReader(self.presentation_path) as reader:
+                    return self._build_slide_context(
+                        reader.get_slide(slide_index),
+                        reader.get_presentation_metadata(),
+                        shape_name
+                    )
+
+            return self._build_slide_context(
+                self.slide_context.get_slide(slide_index),
+                self.get_presentation_metadata(),
                 shape_name
             )
-            return {
-                "presentation_info": self.get_presentation_metadata(),
-                "shapes": shape_context["shapes_info"],
-                "selected_shape": shape_context["selected_shape_info"],
-                "covered_areas": shape_context["covered_areas"]
-            }
         except Exception as e:
             print(f"An error occurred:"
                   f"\nError Type: {type(e).__name__}"
                   f"\nError Message: {str(e)}"
                   f"\nTraceback:{traceback.format_exc()}")
             return {}
+
+    @staticmethod
+    def _build_slide_context(slide: Slide,
+                             presentation_info: Dict[str, Any],
+                             shape_name: Optional[str] = None) -> Dict[str, Any]:
+        shape_context = ShapeContextExtractor.extract_shape_context(slide, shape_name)
+        slide_context = {
+            "presentation_info": presentation_info,
+            "shapes": shape_context["shapes_info"],
+            "selected_shape": shape_context["selected_shape_info"],
+            "covered_areas": shape_context["covered_areas"]
+        }
+        if (presentation_info.get("slide_width")
+                and presentation_info.get("slide_height")):
+            slide_context["layout"] = SpatialIndex.from_shapes(
+                presentation_info["slide_width"],
+                presentation_info["slide_height"],
+                shape_context["shapes_info"]
+            ).summary()
+        return slide_context
@@ -0,0 +1,130 @@
+import copy
+import io
+import zipfile
+from collections import deque
+from typing import Iterable, List, Set
+
+from pptx.opc.oxml import CT_Relationships, serialize_part_xml
+from pptx.opc.package import Part, XmlPart, _Relationships
+from pptx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from pptx.opc.serialized import _ContentTypesItem
+from pptx.oxml.ns import nsuri
+from pptx.presentation import Presentation as ppt_type
+
+
+class SlideExporter:
+    """
+    Writes a minimal .pptx package containing only the requested slides and the
+    parts they transitively depend on (layouts, masters, themes, media), instead of
+    serialising every part of the deck.
+    """
+
+    def __init__(self, presentation: ppt_type):
+        self.presentation = presentation
+        self.package = presentation.part.package
+
+    def export(self, slide_indices: Iterable[int]) -> io.BytesIO:
+        """
+        Return an in-memory .pptx containing the slides at `slide_indices`.
+        The presentation itself is left untouched.
+        """
+        slide_parts = [slide.part for slide in self.presentation.slides]
+        kept_slide_parts = set()
+        for slide_index in slide_indices:
+            try:
+                kept_slide_parts.add(slide_parts[slide_index])
+            except IndexError:
+                raise ValueError(f"Slide index {slide_index} is out of range.")
+        excluded_parts = set(slide_parts) - kept_slide_parts
+
+        parts = self._collect_parts(excluded_parts)
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr(
+                CONTENT_TYPES_URI.membername,
+                serialize_part_xml(_ContentTypesItem.xml_for(parts))
+            )
+            zip_file.writestr(
+                PACKAGE_URI.rels_uri.membername,
+                self._rels_xml(self.package._rels, excluded_parts)
+            )
+            for part in parts:
+                dropped_rIds = self._dropped_rIds(part.rels, excluded_parts)
+                zip_file.writestr(part.partname.membername,
+                                  self._part_blob(part, dropped_rIds))
+                if part.rels:
+                    zip_file.writestr(part.partname.rels_uri.membername,
+                                      self._rels_xml(part.rels, excluded_parts))
+
+        buffer.seek(0)
+        return buffer
+
+    def _collect_parts(self, excluded_parts: Set[Part]) -> List[Part]:
+        """
+        Breadth-first walk of the relationship graph from the package root that
+        never enters an excluded slide part.
+        """
+        parts: List[Part] = []
+        visited: Set[Part] = set()
+        pending = deque(self._target_parts(self.package._rels, excluded_parts))
+
+        while pending:
+            part = pending.popleft()
+            if part in visited:
+                continue
+            visited.add(part)
+            parts.append(part)
+            pending.extend(self._target_parts(part.rels, excluded_parts))
+
+        return parts
+
+    @staticmethod
+    def _target_parts(rels: _Relationships, excluded_parts: Set[Part]) -> List[Part]:
+        return [
+            rel.target_part for rel in rels.values()
+            if not rel.is_external and rel.target_part not in excluded_parts
+        ]
+
+    @staticmethod
+    def _dropped_rIds(rels: _Relationships, excluded_parts: Set[Part]) -> Set[str]:
+        return {
+            rel.rId for rel in rels.values()
+            if not rel.is_external and rel.target_part in excluded_parts
+        }
+
+    @classmethod
+    def _rels_xml(cls, rels: _Relationships, excluded_parts: Set[Part]) -> bytes:
+        dropped_rIds = cls._dropped_rIds(rels, excluded_parts)
+        if not dropped_rIds:
+            return rels.xml
+
+        rels_elm = CT_Relationships.new()
+        for rId, rel in rels.items():
+            if rId not in dropped_rIds:
+                rels_elm.add_rel(rel.rId, rel.reltype, rel.target_ref, rel.is_external)
+        return rels_elm.xml_file_bytes
+
+    @staticmethod
+    def _part_blob(part: Part, dropped_rIds: Set[str]) -> bytes:
+        """
+        Serialise `part`, leaving out every element that refers to a dropped
+        relationship (e.g. `p:sldId` entries of excluded slides or hyperlinks
+        pointing at them).
+        """
+        if not dropped_rIds or not isinstance(part, XmlPart):
+            return part.blob
+
+        element = copy.deepcopy(part._element)
+        relationship_namespace = f"{{{nsuri('r')}}}"
+        references = [
+            owner for owner in element.iter()
+            if any(name.startswith(relationship_namespace) and value in dropped_rIds
+                   for name, value in owner.attrib.items())
+        ]
+        for owner in references:
+            parent = owner.getparent()
+            if parent is not None:
+                parent.remove(owner)
+
+        return serialize_part_xml(element)
@@ -0,0 +1,201 @@
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.parts.image import Image, ImagePart
+from pptx.shapes.picture import Picture
+from pptx.shapes.shapetree import SlideShapes
+from pptx.util import Emu, Length
+
+EMU_PER_INCH = 914400
+
+# Image parts of each open package by SHA-1, so placing a picture does not walk
+# every relationship of the package to find an identical image
+_package_image_parts: "weakref.WeakKeyDictionary[Any, Dict[str, ImagePart]]" = \
+    weakref.WeakKeyDictionary()
+_package_image_parts_lock = threading.Lock()
+
+
+class ImageAsset(NamedTuple):
+    image: Image
+    # Pixel size decoded once, and the native size in EMU at the image DPI
+    px_size: Tuple[int, int]
+    native_size: Tuple[Length, Length]
+
+
+def load_image_asset(blob: bytes, filename: Optional[str]) -> ImageAsset:
+    """
+    Hashes and decodes `blob` once; python-pptx caches the digest, format and
+    DPI on the `Image`, which `add_picture` would otherwise recompute per picture.
+    """
+    image = Image.from_blob(blob, filename)
+    for lazy_property in ("sha1", "content_type", "ext"):
+        getattr(image, lazy_property)
+    (width_px, height_px), (horz_dpi, vert_dpi) = image.size, image.dpi
+    return ImageAsset(image, (width_px, height_px), (
+        Emu(int(EMU_PER_INCH * width_px / horz_dpi)),
+        Emu(int(EMU_PER_INCH * height_px / vert_dpi))))
+
+
+class ImageAssetCache:
+    """
+    In-process cache of decoded images for picture shapes: the icons offered in
+    the prompt, preloaded once, and user-attached images, kept in an LRU bounded
+    by entry count and bytes and keyed by path, size and modification time so a
+    replaced file is read again.
+    """
+
+    def __init__(self,
+                 icons_directory: str,
+                 icons: List[Dict[str, str]],
+                 max_entries: int,
+                 max_bytes: int):
+        self.icons_directory = icons_directory
+        self.icon_names = [Path(icon["name"]).stem for icon in icons]
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._icons: Dict[str, ImageAsset] = {}
+        self._images: "OrderedDict[Tuple[str, int, int], ImageAsset]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def preload_icons(self) -> int:
+        """
+        Loads every known icon, returning the number loaded. A missing or broken
+        icon is reported, and read again when it is placed.
+        """
+        for name in self.icon_names:
+            try:
+                self._icons[name] = self._load_icon(name)
+            except Exception as e:
+                print(f"Error preloading icon {name}: {str(e)}")
+        return len(self._icons)
+
+    def icon(self, name: str) -> ImageAsset:
+        asset = self._icons.get(name)
+        if asset is None:
+            # Not preloaded, e.g. on a process worker, which does not run startup
+            asset = self._icons[name] = self._load_icon(name)
+        return asset
+
+    def image(self, path: str) -> ImageAsset:
+        """
+        Return the decoded image file at `path`, read once while it is unchanged.
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            asset = self._images.get(key)
+            if asset is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return asset
+            self.misses += 1
+
+        with open(path, "rb") as f:
+            asset = load_image_asset(f.read(), os.path.basename(path))
+        size = len(asset.image.blob)
+        if size > self.max_bytes:
+            return asset
+
+        with self._lock:
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.image.blob)
+            self._images[key] = asset
+            self._size += size
+
+            while (len(self._images) > self.max_entries
+                   or self._size > self.max_bytes):
+                _, evicted = self._images.popitem(last=False)
+                self._size -= len(evicted.image.blob)
+                self.evictions += 1
+        return asset
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "icons": len(self._icons),
+                "icon_bytes": sum(len(asset.image.blob)
+                                  for asset in self._icons.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._images),
+                "size_bytes": self._size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+    @staticmethod
+    def add_picture(shapes: SlideShapes,
+                    asset: ImageAsset,
+                    left: Length,
+                    top: Length,
+                    width: Optional[Length] = None,
+                    height: Optional[Length] = None) -> Picture:
+        """
+        `shapes.add_picture` for a decoded image: reuses the image part of the
+        package holding the same image, or adds one, without reading, hashing
+        or decoding the image again. Missing sizes keep the aspect ratio.
+
+        The image parts of a package are indexed on its first picture, so images
+        added to it afterwards by other means than this method are not reused.
+        """
+        image_part, rId = ImageAssetCache.relate_image(shapes.part, asset)
+        width, height = ImageAssetCache.picture_size(asset, width, height)
+
+        shape_id = shapes._next_shape_id
+        pic = shapes._grpSp.add_pic(shape_id, f"Picture {shape_id - 1}",
+                                    image_part.desc, rId, left, top, width, height)
+        shapes._recalculate_extents()
+        return shapes._shape_factory(pic)
+
+    @staticmethod
+    def relate_image(slide_part: Any, asset: ImageAsset) -> Tuple[ImagePart, str]:
+        """
+        Returns the image part of the package holding `asset`, added if needed,
+        and the id of the relationship of `slide_part` to it.
+        """
+        image_parts = _image_parts_by_sha1(slide_part.package)
+        image_part = image_parts.get(asset.image.sha1)
+        if image_part is None:
+            image_part = image_parts[asset.image.sha1] = ImagePart.new(
+                slide_part.package, asset.image)
+        return image_part, slide_part.relate_to(image_part, RT.IMAGE)
+
+    @staticmethod
+    def picture_size(asset: ImageAsset,
+                     width: Optional[Length],
+                     height: Optional[Length]) -> Tuple[Length, Length]:
+        native_width, native_height = asset.native_size
+        if width and not height:
+            height = Emu(int(round(native_height * width / native_width)))
+        elif height and not width:
+            width = Emu(int(round(native_width * height / native_height)))
+        elif not width and not height:
+            width, height = native_width, native_height
+        return width, height
+
+    def _load_icon(self, name: str) -> ImageAsset:
+        path = Path(self.icons_directory) / f"{name}.png"
+        return load_image_asset(path.read_bytes(), path.name)
+
+
+def _image_parts_by_sha1(package: Any) -> Dict[str, ImagePart]:
+    with _package_image_parts_lock:
+        image_parts = _package_image_parts.get(package)
+        if image_parts is None:
+            image_parts = _package_image_parts[package] = {}
+            for image_part in package._image_parts:
+                # Unsupported image types, like SVG, are never reused
+                if hasattr(image_part, "sha1"):
+                    image_parts.setdefault(image_part.sha1, image_part)
+        return image_parts
@@ -0,0 +1,193 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from app.schemas.actions import ActionsList, ActionType, ShapeParameters
+from app.services.ppt.spatial import SpatialIndex
+from app.utils.metrics import MetricsRegistry
+
+CORRECTIONS = ("grid_aligned", "clamped", "overlaps_resolved")
+# Rounding slack before `check` reports a shape as off the slide
+OFF_SLIDE_TOLERANCE_MM = 1.0
+
+
+class LayoutPostProcessor:
+    """
+    Deterministic pass over all proposed actions of a response before they are
+    applied: aligns positions and sizes to a `grid_mm` grid, clamps shapes to
+    the slide bounds and, with `resolve_overlaps`, moves shapes that would
+    overlap existing or previously placed ones into the nearest free area.
+
+    An action counts as corrected only when it was moved back inside the slide
+    or away from an overlap; grid alignment alone is counted in `grid_aligned`.
+
+    Parsed responses may be shared through the LLM response cache, so corrected
+    actions are copies and the response itself is never mutated.
+    """
+
+    def __init__(self, grid_mm: float = 0, resolve_overlaps: bool = True,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.grid_mm = grid_mm
+        self.resolve_overlaps = resolve_overlaps
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.actions = 0
+        self.corrected = 0
+        self.corrections = dict.fromkeys(CORRECTIONS, 0)
+        self._actions_metric = metrics.counter(
+            "layout_actions", "Actions checked and corrected by the layout "
+            "post-processor.", ("result",)) if metrics is not None else None
+
+    def process(self,
+                actions_list: ActionsList,
+                slide_context: Dict[str, Any]) -> Tuple[ActionsList, Dict[str, Any]]:
+        """
+        Returns the corrected actions and a report with the number of actions
+        checked and corrected, per kind of correction.
+        """
+        session = self.session(slide_context)
+        actions = [session.correct(action) for action in actions_list.actions]
+        report = session.close()
+        if all(corrected is action
+               for corrected, action in zip(actions, actions_list.actions)):
+            return actions_list, report
+        return actions_list.model_copy(update={"actions": actions}), report
+
+    def session(self, slide_context: Dict[str, Any]) -> "LayoutSession":
+        """
+        Starts correcting the actions of one response one at a time, e.g. while
+        they are streamed in.
+        """
+        return LayoutSession(self, slide_context)
+
+    @staticmethod
+    def check(actions_list: ActionsList,
+              slide_context: Dict[str, Any]) -> Optional[str]:
+        """
+        Returns why a response is not worth applying as it is, or `None`: it
+        has no actions, an action lacks the fields of its type, or a shape
+        lies partly off the slide. Used to escalate responses of a small model.
+        """
+        if not actions_list.actions:
+            return "no_actions"
+
+        presentation_info = slide_context.get("presentation_info", {})
+        slide_width = presentation_info.get("slide_width")
+        slide_height = presentation_info.get("slide_height")
+        for action in actions_list.actions:
+            if action.action_type == ActionType.DELETE_SHAPE:
+                continue
+            if (action.action_type == ActionType.CREATE_TEXTBOX
+                    and not action.paragraphs) \
+                    or (action.action_type == ActionType.CREATE_ICON
+                        and action.icon_name is None):
+                return "incomplete_action"
+            if action.width <= 0 or action.height <= 0:
+                return "empty_shape"
+            if slide_width and slide_height and (
+                    action.left < -OFF_SLIDE_TOLERANCE_MM
+                    or action.top < -OFF_SLIDE_TOLERANCE_MM
+                    or action.left + action.width > slide_width + OFF_SLIDE_TOLERANCE_MM
+                    or action.top + action.height
+                    > slide_height + OFF_SLIDE_TOLERANCE_MM):
+                return "off_slide"
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "grid_mm": self.grid_mm,
+                "resolve_overlaps": self.resolve_overlaps,
+                "responses": self.responses,
+                "actions": self.actions,
+                "corrected": self.corrected,
+                **self.corrections,
+            }
+
+    def _record(self, report: Dict[str, Any]) -> None:
+        with self._lock:
+            self.responses += 1
+            self.actions += report["actions"]
+            self.corrected += report["corrected"]
+            for correction in CORRECTIONS:
+                self.corrections[correction] += report[correction]
+        if self._actions_metric is not None:
+            self._actions_metric.inc(report["actions"], result="checked")
+            self._actions_metric.inc(report["corrected"], result="corrected")
+
+
+class LayoutSession:
+    """
+    Corrects the actions of one response in order, each against the slide shapes
+    and the actions corrected before it, and records the report in the
+    post-processor statistics on `close`.
+    """
+
+    def __init__(self, post_processor: LayoutPostProcessor,
+                 slide_context: Dict[str, Any]):
+        self.post_processor = post_processor
+        self.report = {"actions": 0, "corrected": 0, **dict.fromkeys(CORRECTIONS, 0)}
+        presentation_info = slide_context.get("presentation_info", {})
+        self.slide_width = presentation_info.get("slide_width")
+        self.slide_height = presentation_info.get("slide_height")
+        self.spatial_index = None
+        if self.slide_width and self.slide_height:
+            # The selected shape is replaced by the actions, so it is not an obstacle
+            selected_index = (slide_context.get("selected_shape") or {}).get(
+                "relative")
+            self.spatial_index = SpatialIndex.from_shapes(
+                self.slide_width, self.slide_height, [
+                    None if index == selected_index else shape_info
+                    for index, shape_info in enumerate(slide_context.get("shapes", []))
+                ])
+
+    def correct(self, action: ShapeParameters) -> ShapeParameters:
+        self.report["actions"] += 1
+        if self.spatial_index is None or action.action_type == ActionType.DELETE_SHAPE:
+            return action
+
+        original = (action.top, action.left, action.width, action.height)
+        aligned = self._align(original)
+        if aligned != original:
+            self.report["grid_aligned"] += 1
+
+        clamped = self._clamp(aligned)
+        if clamped != aligned:
+            self.report["clamped"] += 1
+
+        area = self.spatial_index.snap(clamped) \
+            if self.post_processor.resolve_overlaps else clamped
+        if area != clamped:
+            self.report["overlaps_resolved"] += 1
+        self.spatial_index.insert(area)
+
+        if area == original:
+            return action
+        if area != aligned:
+            self.report["corrected"] += 1
+        top, left, width, height = area
+        return action.model_copy(update={
+            "top": top, "left": left, "width": width, "height": height})
+
+    def close(self) -> Dict[str, Any]:
+        self.post_processor._record(self.report)
+        return self.report
+
+    def _align(self, area: Tuple[float, float, float, float]
+               ) -> Tuple[float, float, float, float]:
+        grid_mm = self.post_processor.grid_mm
+        if not grid_mm:
+            return area
+
+        top, left, width, height = (round(value / grid_mm) * grid_mm
+                                    for value in area)
+        return top, left, max(width, grid_mm), max(height, grid_mm)
+
+    def _clamp(self, area: Tuple[float, float, float, float]
+               ) -> Tuple[float, float, float, float]:
+        top, left, width, height = area
+        width = min(max(width, 0.0), self.slide_width)
+        height = min(max(height, 0.0), self.slide_height)
+        return (min(max(top, 0.0), self.slide_height - height),
+                min(max(left, 0.0), self.slide_width - width),
+                width,
+                height)
@@ -0,0 +1,191 @@
+import copy
+import re
+from typing import List, Optional
+
+from lxml import etree
+from pptx.dml.color import RGBColor
+from pptx.oxml.ns import qn
+from pptx.oxml.shapes.autoshape import CT_Shape
+from pptx.oxml.shapes.picture import CT_Picture
+from pptx.slide import Slide
+from pptx.util import Length, Pt
+
+from app.schemas.actions import ParagraphAttributes
+from app.services.ppt.images import ImageAsset, ImageAssetCache
+
+# Shapes as python-pptx creates them, parsed once and copied per shape
+_TEXTBOX_TEMPLATE = CT_Shape.new_textbox_sp(0, "", 0, 0, 0, 0)
+_PICTURE_TEMPLATE = CT_Picture.new_pic(0, "", "", "", 0, 0, 0, 0)
+
+A_P, A_PPR, A_DEF_RPR, A_R, A_T, A_BR, A_SOLID_FILL, A_SRGB_CLR = (
+    qn(tag) for tag in ("a:p", "a:pPr", "a:defRPr", "a:r", "a:t", "a:br",
+                        "a:solidFill", "a:srgbClr"))
+# Paragraph children replaced when its text is set
+CONTENT_TAGS = {A_R, A_BR, qn("a:fld")}
+BOOLEAN_VALUES = {True: "1", False: "0"}
+UNDERLINE_VALUES = {True: "sng", False: "none"}
+LINE_BREAK = re.compile("\n|\v")
+# Escaped in run text by python-pptx, e.g. BEL as "_x0007_"
+CONTROL_CHARACTER = re.compile(r"([\x00-\x08\x0B-\x1F])")
+
+
+class ShapeTreeWriter:
+    """
+    Adds the text boxes and pictures of a list of actions to a slide in one
+    pass: shape ids are allocated once instead of searching the slide for the
+    highest id per shape, each `p:sp`/`p:pic` is copied from a template parsed
+    once and filled in through lxml instead of text frame and font proxies, and
+    all are inserted into `spTree` together by `flush`. The slide XML is the
+    same as adding each shape with `add_textbox` and `ImageAssetCache.add_picture`.
+
+    Ids are allocated from the highest id on the slide when the writer is
+    created; shapes added to the slide by other means before `flush` would hold
+    the same ids, so `flush` then renumbers the pending shapes after them.
+    """
+
+    def __init__(self, slide: Slide):
+        self.slide = slide
+        self._spTree = slide.shapes._spTree
+        self._next_shape_id = slide.shapes._next_shape_id
+        self._elements: List[etree._Element] = []
+
+    def add_textbox(self,
+                    left: Length,
+                    top: Length,
+                    width: Length,
+                    height: Length,
+                    word_wrap: bool,
+                    paragraphs: List[ParagraphAttributes]) -> None:
+        shape_id = self._allocate_shape_id()
+        sp = copy.deepcopy(_TEXTBOX_TEMPLATE)
+        nvSpPr, spPr, txBody = sp[0], sp[1], sp[2]
+        nvSpPr[0].set("id", str(shape_id))
+        nvSpPr[0].set("name", f"TextBox {shape_id - 1}")
+        self._set_xfrm(spPr[0], left, top, width, height)
+        # Kept even if a paragraph fails, like a text box added by python-pptx
+        self._elements.append(sp)
+
+        txBody[0].set("wrap", "square" if word_wrap else "none")
+        write_paragraphs(txBody, paragraphs)
+
+    def add_picture(self,
+                    asset: ImageAsset,
+                    left: Length,
+                    top: Length,
+                    width: Optional[Length] = None,
+                    height: Optional[Length] = None) -> None:
+        image_part, rId = ImageAssetCache.relate_image(self.slide.part, asset)
+        width, height = ImageAssetCache.picture_size(asset, width, height)
+
+        shape_id = self._allocate_shape_id()
+        pic = copy.deepcopy(_PICTURE_TEMPLATE)
+        nvPicPr, blipFill, spPr = pic[0], pic[1], pic[2]
+        nvPicPr[0].set("id", str(shape_id))
+        nvPicPr[0].set("name", f"Picture {shape_id - 1}")
+        nvPicPr[0].set("descr", image_part.desc)
+        blipFill[0].set(qn("r:embed"), rId)
+        self._set_xfrm(spPr[0], left, top, width, height)
+        self._elements.append(pic)
+
+    def flush(self) -> int:
+        """
+        Inserts the shapes added since the last flush into the slide, before its
+        `p:extLst` if any, and returns their number.
+        """
+        elements, self._elements = self._elements, []
+        if elements:
+            self._renumber(elements)
+        extLst = self._spTree.find(qn("p:extLst"))
+        if extLst is None:
+            self._spTree.extend(elements)
+        else:
+            for element in elements:
+                extLst.addprevious(element)
+        return len(elements)
+
+    def _renumber(self, elements: List[etree._Element]) -> None:
+        next_shape_id = self.slide.shapes._next_shape_id
+        if next_shape_id <= int(elements[0][0][0].get("id")):
+            return
+        for element in elements:
+            cNvPr = element[0][0]
+            prefix = cNvPr.get("name").rsplit(" ", 1)[0]
+            cNvPr.set("id", str(next_shape_id))
+            cNvPr.set("name", f"{prefix} {next_shape_id - 1}")
+            next_shape_id += 1
+        self._next_shape_id = next_shape_id
+
+    def _allocate_shape_id(self) -> int:
+        shape_id = self._next_shape_id
+        self._next_shape_id += 1
+        return shape_id
+
+    @staticmethod
+    def _set_xfrm(xfrm: etree._Element, left: Length, top: Length,
+                  width: Length, height: Length) -> None:
+        xfrm[0].set("x", str(int(left)))
+        xfrm[0].set("y", str(int(top)))
+        xfrm[1].set("cx", str(int(width)))
+        xfrm[1].set("cy", str(int(height)))
+
+
+def write_paragraphs(txBody: etree._Element,
+                     paragraphs: List[ParagraphAttributes]) -> None:
+    """
+    Writes `paragraphs` into the text body of a new text box as
+    `PPTActionHandler._add_paragraphs` does through the text frame: the first
+    paragraph is reused as long as the text of the text box is empty, and
+    attributes are set, or removed when unset, in the same order.
+    """
+    p = txBody.find(A_P)
+    text_empty = True
+    for paragraph in paragraphs:
+        if text_empty:
+            for element in [child for child in p if child.tag in CONTENT_TAGS]:
+                p.remove(element)
+        else:
+            p = etree.SubElement(txBody, A_P)
+        _append_text(p, paragraph.text)
+        text_empty = text_empty and not paragraph.text
+
+        pPr = p.find(A_PPR)
+        if pPr is None:
+            pPr = etree.Element(A_PPR)
+            p.insert(0, pPr)
+        defRPr = pPr.find(A_DEF_RPR)
+        if defRPr is None:
+            defRPr = etree.SubElement(pPr, A_DEF_RPR)
+        _set_attribute(defRPr, "sz", str(Pt(paragraph.font.size).centipoints))
+        _set_attribute(defRPr, "b", BOOLEAN_VALUES.get(paragraph.font.bold))
+        _set_attribute(defRPr, "i", BOOLEAN_VALUES.get(paragraph.font.italic))
+        _set_attribute(defRPr, "u", UNDERLINE_VALUES.get(paragraph.font.underline))
+
+        if paragraph.font.color:
+            r, g, b = tuple(int(paragraph.font.color.lstrip("#")[i:i + 2], 16)
+                            for i in (0, 2, 4))
+            color = str(RGBColor(r, g, b))
+            solidFill = defRPr.find(A_SOLID_FILL)
+            if solidFill is None:
+                solidFill = etree.SubElement(defRPr, A_SOLID_FILL)
+            srgbClr = solidFill.find(A_SRGB_CLR)
+            if srgbClr is None:
+                srgbClr = etree.SubElement(solidFill, A_SRGB_CLR)
+            srgbClr.set("val", color)
+
+
+def _append_text(p: etree._Element, text: str) -> None:
+    # Runs split at line breaks, as `CT_TextParagraph.append_text`
+    for index, run_text in enumerate(LINE_BREAK.split(text)):
+        if index:
+            etree.SubElement(p, A_BR)
+        if run_text:
+            r = etree.SubElement(p, A_R)
+            etree.SubElement(r, A_T).text = CONTROL_CHARACTER.sub(
+                lambda match: "_x%04X_" % ord(match.group(1)), run_text)
+
+
+def _set_attribute(element: etree._Element, name: str, value: Optional[str]) -> None:
+    if value is None:
+        element.attrib.pop(name, None)
+    else:
+        element.set(name, value)
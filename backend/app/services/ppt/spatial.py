@@ -0,0 +1,321 @@
+import heapq
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from pptx.util import Emu
+
+# (left, top, right, bottom) in millimetres
+Box = Tuple[float, float, float, float]
+
+# Maximum number of entries per R-tree node
+NODE_CAPACITY = 8
+
+# Free rectangles narrower or lower than this (mm) are not worth placing shapes in
+MIN_FREE_SIZE = 5.0
+
+# Shapes covering at least this share of the slide are backgrounds, not obstacles
+BACKGROUND_COVERAGE = 0.9
+
+# Overlaps thinner than this (mm) are rounding noise, e.g. from snapping to an edge
+EPSILON = 1e-6
+
+# Number of free areas, largest first, exposed in the slide context
+MAX_FREE_AREAS = 8
+
+
+def box_from_area(area: Sequence[float]) -> Box:
+    """
+    Converts a `(top, left, width, height)` covered area into a box.
+    """
+    top, left, width, height = area
+    return left, top, left + width, top + height
+
+
+def area_from_box(box: Box, digits: Optional[int] = None
+                  ) -> Tuple[float, float, float, float]:
+    left, top, right, bottom = box
+    area = (top, left, right - left, bottom - top)
+    return area if digits is None else tuple(round(value, digits) for value in area)
+
+
+def intersects(a: Box, b: Box) -> bool:
+    """
+    Whether the boxes overlap by a positive area; touching edges do not count.
+    """
+    return (a[0] < b[2] - EPSILON and b[0] < a[2] - EPSILON
+            and a[1] < b[3] - EPSILON and b[1] < a[3] - EPSILON)
+
+
+def contains(outer: Box, inner: Box) -> bool:
+    return (outer[0] <= inner[0] and outer[1] <= inner[1]
+            and inner[2] <= outer[2] and inner[3] <= outer[3])
+
+
+def gap(a: Box, b: Box) -> float:
+    """
+    Shortest distance between the edges of two boxes, 0 if they touch or overlap.
+    """
+    dx = max(a[0] - b[2], b[0] - a[2], 0.0)
+    dy = max(a[1] - b[3], b[1] - a[3], 0.0)
+    return math.hypot(dx, dy)
+
+
+def _bounding_box(boxes: Iterable[Box]) -> Box:
+    lefts, tops, rights, bottoms = zip(*boxes)
+    return min(lefts), min(tops), max(rights), max(bottoms)
+
+
+def _str_pack(entries: List[Tuple[Box, Any]],
+              capacity: int) -> List[Tuple[Box, List[Tuple[Box, Any]]]]:
+    """
+    Sort-Tile-Recursive packing: groups `(box, payload)` entries into nodes of at
+    most `capacity` entries, sorting by centre x into vertical slices and each
+    slice by centre y.
+    """
+    node_count = math.ceil(len(entries) / capacity)
+    slice_size = capacity * math.ceil(math.sqrt(node_count))
+    entries = sorted(entries, key=lambda entry: entry[0][0] + entry[0][2])
+
+    nodes = []
+    for slice_start in range(0, len(entries), slice_size):
+        vertical_slice = sorted(entries[slice_start:slice_start + slice_size],
+                                key=lambda entry: entry[0][1] + entry[0][3])
+        for node_start in range(0, len(vertical_slice), capacity):
+            children = vertical_slice[node_start:node_start + capacity]
+            nodes.append((_bounding_box(box for box, _ in children), children))
+    return nodes
+
+
+class RTree:
+    """
+    Static R-tree over `(box, item)` entries, bulk-loaded in O(n log n) with
+    Sort-Tile-Recursive packing. Answers intersection queries in O(log n + k) and
+    nearest-neighbour queries by best-first search.
+    """
+
+    def __init__(self,
+                 entries: Iterable[Tuple[Box, Any]],
+                 capacity: int = NODE_CAPACITY):
+        level = list(entries)
+        self.size = len(level)
+        self._root = None
+
+        leaf = True
+        while level:
+            level = [(box, (leaf, children))
+                     for box, children in _str_pack(level, capacity)]
+            leaf = False
+            if len(level) == 1:
+                self._root = level[0]
+                break
+
+    def intersecting(self, box: Box) -> Iterator[Any]:
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            _, (leaf, children) = stack.pop()
+            for child_box, child in children:
+                if not intersects(child_box, box):
+                    continue
+                if leaf:
+                    yield child
+                else:
+                    stack.append((child_box, child))
+
+    def nearest(self, box: Box, exclude: Any = None) -> Optional[Tuple[float, Any]]:
+        """
+        The `(gap, item)` of the entry closest to `box`, skipping `exclude`.
+        """
+        if self._root is None:
+            return None
+
+        tiebreak = 0
+        heap = [(0.0, tiebreak, False, self._root[1])]
+        while heap:
+            distance, _, is_item, payload = heapq.heappop(heap)
+            if is_item:
+                return distance, payload
+
+            leaf, children = payload
+            for child_box, child in children:
+                if leaf and child == exclude:
+                    continue
+                tiebreak += 1
+                heapq.heappush(heap, (gap(box, child_box), tiebreak, leaf, child))
+        return None
+
+
+class SpatialIndex:
+    """
+    Spatial queries over the shapes of a slide, in millimetres: overlap counts,
+    nearest-neighbour gaps, maximal free rectangles and validation / snapping of
+    new shape positions. Areas use the `(top, left, width, height)` order of
+    `covered_areas`.
+
+    Existing shapes are indexed in an `RTree`; shapes placed afterwards with
+    `insert` are kept in a short list next to it.
+    """
+
+    def __init__(self,
+                 slide_width: float,
+                 slide_height: float,
+                 areas: Sequence[Optional[Sequence[float]]]):
+        self.slide_box: Box = (0.0, 0.0, slide_width, slide_height)
+        self.boxes: List[Optional[Box]] = [
+            box_from_area(area) if area is not None else None for area in areas]
+        self.tree = RTree((box, index) for index, box in enumerate(self.boxes)
+                          if box is not None)
+        self._inserted: List[Box] = []
+        self._free_boxes: Optional[List[Box]] = None
+
+    @classmethod
+    def from_shapes(cls,
+                    slide_width: float,
+                    slide_height: float,
+                    shapes: Iterable[Optional[Dict[str, Any]]]) -> "SpatialIndex":
+        """
+        Builds the index from shape infos holding `left`, `top`, `width` and
+        `height` in EMU, as listed in the slide context.
+        """
+        areas = []
+        for shape in shapes:
+            values = [shape.get(key) for key in ("top", "left", "width", "height")] \
+                if shape else [None]
+            areas.append(tuple(Emu(value).mm for value in values)
+                         if all(value is not None for value in values) else None)
+        return cls(slide_width, slide_height, areas)
+
+    def summary(self, max_free_areas: int = MAX_FREE_AREAS) -> Dict[str, Any]:
+        """
+        Free areas (largest first), per-shape overlap counts and per-shape gaps to
+        the nearest other shape, rounded to 0.1 mm, for the slide context.
+        """
+        return {
+            "free_areas": self.free_areas(max_free_areas),
+            "overlaps": self.overlap_counts(),
+            "nearest_gaps": [round(distance, 1) if distance is not None else None
+                             for distance in self.nearest_gaps()],
+        }
+
+    def overlap_counts(self) -> List[Optional[int]]:
+        return [sum(1 for other in self.tree.intersecting(box) if other != index)
+                if box is not None else None
+                for index, box in enumerate(self.boxes)]
+
+    def nearest_gaps(self) -> List[Optional[float]]:
+        gaps = []
+        for index, box in enumerate(self.boxes):
+            nearest = self.tree.nearest(box, exclude=index) if box is not None else None
+            gaps.append(nearest[0] if nearest is not None else None)
+        return gaps
+
+    def free_areas(self, limit: Optional[int] = None
+                   ) -> List[Tuple[float, float, float, float]]:
+        free_boxes = sorted(self.free_boxes(),
+                            key=lambda box: (box[2] - box[0]) * (box[3] - box[1]),
+                            reverse=True)
+        return [area_from_box(box, 1) for box in free_boxes[:limit]]
+
+    def free_boxes(self) -> List[Box]:
+        """
+        Maximal rectangles of the slide not covered by any obstacle, computed with
+        the MaxRects split-and-prune scheme and kept up to date by `insert`.
+        """
+        if self._free_boxes is None:
+            free_boxes = [self.slide_box]
+            for obstacle in self._obstacles():
+                free_boxes = self._split(free_boxes, obstacle)
+            self._free_boxes = free_boxes
+        return self._free_boxes
+
+    def conflicts(self, box: Box) -> List[Box]:
+        """
+        Obstacles overlapping `box`, ignoring those that fully contain it (panels
+        and other containers the new shape is placed on).
+        """
+        candidates = [self.boxes[index] for index in self.tree.intersecting(box)]
+        candidates.extend(other for other in self._inserted if intersects(other, box))
+        return [other for other in candidates
+                if not self._is_background(other) and not contains(other, box)]
+
+    def validate(self, area: Sequence[float]) -> Dict[str, Any]:
+        box = box_from_area(area)
+        return {
+            "in_bounds": contains(self.slide_box, box),
+            "overlaps": len(self.conflicts(box)),
+        }
+
+    def snap(self, area: Sequence[float]) -> Tuple[float, float, float, float]:
+        """
+        Moves `area` inside the slide and, if it then overlaps existing shapes, to
+        the closest position inside a free rectangle large enough to hold it.
+        Sizes are kept unless they exceed the slide; an area no free rectangle
+        can hold is only moved inside the slide.
+        """
+        top, left, width, height = area
+        slide_width, slide_height = self.slide_box[2], self.slide_box[3]
+        width = min(max(width, 0.0), slide_width)
+        height = min(max(height, 0.0), slide_height)
+        left = min(max(left, 0.0), slide_width - width)
+        top = min(max(top, 0.0), slide_height - height)
+        if not self.conflicts((left, top, left + width, top + height)):
+            return top, left, width, height
+
+        best = None
+        for free in self.free_boxes():
+            if free[2] - free[0] < width or free[3] - free[1] < height:
+                continue
+            free_left = min(max(left, free[0]), free[2] - width)
+            free_top = min(max(top, free[1]), free[3] - height)
+            distance = math.hypot(free_left - left, free_top - top)
+            if best is None or distance < best[0]:
+                best = (distance, (free_top, free_left, width, height))
+        return best[1] if best is not None else (top, left, width, height)
+
+    def insert(self, area: Sequence[float]) -> None:
+        box = box_from_area(area)
+        self._inserted.append(box)
+        if self._free_boxes is not None and not self._is_background(box):
+            self._free_boxes = self._split(self._free_boxes, box)
+
+    def _obstacles(self) -> Iterator[Box]:
+        for box in self.boxes + self._inserted:
+            if box is not None and not self._is_background(box):
+                yield box
+
+    def _is_background(self, box: Box) -> bool:
+        slide_area = self.slide_box[2] * self.slide_box[3]
+        return bool(slide_area) and ((box[2] - box[0]) * (box[3] - box[1])
+                                     >= BACKGROUND_COVERAGE * slide_area)
+
+    @staticmethod
+    def _split(free_boxes: List[Box], obstacle: Box) -> List[Box]:
+        kept, touching, created = [], [], []
+        obstacle_left, obstacle_top, obstacle_right, obstacle_bottom = obstacle
+        for free in free_boxes:
+            # Most free boxes are far from the obstacle: skip the finer checks
+            if (free[0] > obstacle_right or free[2] < obstacle_left
+                    or free[1] > obstacle_bottom or free[3] < obstacle_top):
+                kept.append(free)
+                continue
+            if not intersects(free, obstacle):
+                kept.append(free)
+                touching.append(free)
+                continue
+
+            left, top, right, bottom = free
+            for part in ((left, top, obstacle_left, bottom),
+                         (obstacle_right, top, right, bottom),
+                         (left, top, right, obstacle_top),
+                         (left, obstacle_bottom, right, bottom)):
+                if (part[2] - part[0] >= MIN_FREE_SIZE
+                        and part[3] - part[1] >= MIN_FREE_SIZE
+                        and part not in created):
+                    created.append(part)
+
+        # Kept boxes stay maximal. New parts all touch the obstacle, so a box that
+        # contains one touches it as well
+        return kept + [
+            part for part in created
+            if not any(other is not part and contains(other, part)
+                       for other in touching + created)
+        ]
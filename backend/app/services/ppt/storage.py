@@ -0,0 +1,212 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional
+
+CHECKSUM_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class LocalDiskBackend:
+    """
+    Stores presentations as files in a local directory.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        # Uploads are staged next to the store so the final rename is atomic
+        self.staging_directory = self.directory
+
+    def exists(self, key: str) -> bool:
+        return (self.directory / key).is_file()
+
+    def size(self, key: str) -> int:
+        return (self.directory / key).stat().st_size
+
+    def put_file(self, key: str, source_path: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        os.replace(source_path, self.directory / key)
+
+    def local_path(self, key: str) -> Path:
+        file_path = self.directory / key
+        if not file_path.is_file():
+            raise FileNotFoundError(key)
+        return file_path
+
+    def delete(self, key: str) -> None:
+        (self.directory / key).unlink(missing_ok=True)
+
+
+class LocalObjectStoreBackend:
+    """
+    Stand-in for a shared object store (e.g. Azure Blob Storage) backed by a local
+    "bucket" directory. Objects are only written and read whole, and are
+    downloaded into a per-worker cache directory before python-pptx opens them,
+    so any worker sharing the bucket can serve any document.
+    """
+
+    def __init__(self, bucket_directory: str, cache_directory: str):
+        self.bucket_directory = Path(bucket_directory)
+        self.cache_directory = Path(cache_directory)
+        self.staging_directory = self.cache_directory
+
+    def exists(self, key: str) -> bool:
+        return (self.bucket_directory / key).is_file()
+
+    def size(self, key: str) -> int:
+        return (self.bucket_directory / key).stat().st_size
+
+    def put_file(self, key: str, source_path: str) -> None:
+        self.bucket_directory.mkdir(parents=True, exist_ok=True)
+        self._copy_atomically(Path(source_path), self.bucket_directory / key)
+        # The uploading worker keeps its staged copy as the cached download
+        os.replace(source_path, self.cache_directory / key)
+
+    def local_path(self, key: str) -> Path:
+        cached_path = self.cache_directory / key
+        if not cached_path.is_file():
+            if not self.exists(key):
+                raise FileNotFoundError(key)
+            self.cache_directory.mkdir(parents=True, exist_ok=True)
+            self._copy_atomically(self.bucket_directory / key, cached_path)
+        return cached_path
+
+    def delete(self, key: str) -> None:
+        (self.bucket_directory / key).unlink(missing_ok=True)
+        (self.cache_directory / key).unlink(missing_ok=True)
+
+    @staticmethod
+    def _copy_atomically(source: Path, target: Path) -> None:
+        temporary_path = target.with_name(f"{target.name}.{uuid.uuid4().hex}.part")
+        try:
+            shutil.copyfile(source, temporary_path)
+            os.replace(temporary_path, target)
+        finally:
+            temporary_path.unlink(missing_ok=True)
+
+
+def create_storage_backend(kind: str, directory: str, object_store_directory: str):
+    if kind == "local":
+        return LocalDiskBackend(directory)
+    if kind == "object":
+        return LocalObjectStoreBackend(object_store_directory, directory)
+    raise ValueError(f"Unsupported presentation store backend: {kind}")
+
+
+class PresentationStorage:
+    """
+    Content-addressed store of uploaded presentations keyed by document id, the
+    SHA-256 checksum of the deck. Each deck is stored once as `<sha256>.pptx`;
+    uploads are streamed to a staging file while hashed and only then handed to
+    the backend, so readers never see a partial file. Writes and downloads of
+    the same document are serialised by a per-document lock.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._locks: "weakref.WeakValueDictionary[str, threading.Lock]" = \
+            weakref.WeakValueDictionary()
+        self._locks_guard = threading.Lock()
+
+    def lock(self, checksum: str) -> threading.Lock:
+        """
+        Lock of the document `checksum`; hold a reference for as long as it is used.
+        """
+        with self._locks_guard:
+            document_lock = self._locks.get(checksum)
+            if document_lock is None:
+                document_lock = threading.Lock()
+                self._locks[checksum] = document_lock
+            return document_lock
+
+    def exists(self, checksum: str) -> bool:
+        return self.backend.exists(self._key(checksum))
+
+    def local_path(self, checksum: str) -> str:
+        """
+        Return a local file path of the document, downloading it from the backend
+        if needed. Raises `FileNotFoundError` if the document is not stored.
+        """
+        key = self._key(checksum)
+        with self.lock(checksum):
+            return str(self.backend.local_path(key))
+
+    def describe(self, checksum: str, deduplicated: bool = False) -> Dict[str, Any]:
+        return {
+            "document_id": checksum,
+            "checksum": checksum,
+            "file_path": self.local_path(checksum),
+            "size_bytes": self.backend.size(self._key(checksum)),
+            "deduplicated": deduplicated,
+        }
+
+    def save(self, source: BinaryIO, expected_checksum: Optional[str] = None
+             ) -> Dict[str, Any]:
+        """
+        Store the deck read from `source` and return its handle. When a deck with
+        `expected_checksum` is already stored, `source` is not read at all.
+
+        Raises `ValueError` if the content does not match `expected_checksum`.
+        """
+        if expected_checksum and self.exists(expected_checksum):
+            return self.describe(expected_checksum, deduplicated=True)
+
+        staging_directory = self.backend.staging_directory
+        staging_directory.mkdir(parents=True, exist_ok=True)
+        descriptor, temporary_path = tempfile.mkstemp(dir=staging_directory,
+                                                      suffix=".part")
+        try:
+            sha256 = hashlib.sha256()
+            with os.fdopen(descriptor, "wb") as target:
+                for chunk in iter(lambda: source.read(self.CHUNK_SIZE), b""):
+                    sha256.update(chunk)
+                    target.write(chunk)
+            checksum = sha256.hexdigest()
+
+            if expected_checksum and checksum != expected_checksum:
+                raise ValueError("Checksum mismatch")
+
+            with self.lock(checksum):
+                deduplicated = self.exists(checksum)
+                if not deduplicated:
+                    self.backend.put_file(self._key(checksum), temporary_path)
+            return self.describe(checksum, deduplicated=deduplicated)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    @staticmethod
+    def _key(checksum: str) -> str:
+        if not CHECKSUM_PATTERN.fullmatch(checksum):
+            raise ValueError("Checksum must be a lowercase hex SHA-256 digest")
+        return f"{checksum}.pptx"
+
+
+def collect_expired_files(directory: str, ttl_seconds: float) -> int:
+    """
+    Delete files in `directory` not modified for `ttl_seconds`; returns the
+    number of files removed.
+    """
+    expires_before = time.time() - ttl_seconds
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < expires_before:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
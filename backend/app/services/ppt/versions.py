@@ -0,0 +1,486 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import weakref
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pptx.opc.oxml import serialize_part_xml
+from pptx.opc.package import Part
+from pptx.opc.packuri import CONTENT_TYPES_URI
+from pptx.opc.serialized import _ContentTypesItem
+from pptx.presentation import Presentation as ppt_type
+
+from app.services.ppt.storage import CHECKSUM_PATTERN, PresentationStorage
+
+# `<document id>@v<version>` identifies a version of a document; version 0,
+# the uploaded deck, is identified by the document id alone
+VERSION_KEY_PATTERN = re.compile(r"(?P<document_id>[^@]+)@v(?P<version>[0-9]+)")
+
+# Members compressed in blobs and rebuilt decks; media are stored as they are
+TEXT_MEMBER_SUFFIXES = (".xml", ".rels")
+
+
+class HistoryEndError(Exception):
+    """
+    Raised by `undo` at the oldest and by `redo` at the newest version.
+    """
+
+
+class VersionConflictError(Exception):
+    """
+    Raised by `commit` when the head moved since the change was staged and the
+    change cannot be rebased onto it.
+    """
+
+
+class VersionStore:
+    """
+    Edit history of stored presentations. Version 0 of a document is the
+    uploaded deck; every later version records the package members that differ
+    from it (edited slide XML and relationships, added media, content types),
+    each stored once as a zlib-compressed blob named by the SHA-256 of its
+    content. A version is rebuilt on demand from the uploaded deck and its
+    blobs, so undo and redo only move the head of the document, and versions
+    older than the last `max_versions` are dropped without rewriting the others.
+
+    Edits `stage` their blobs in the worker that saved them; the manifest of a
+    document is only changed by `commit`, `undo` and `redo`, under its lock.
+    Each version records its `parent`, the version it was edited from, and undo
+    follows that link rather than the order of the versions.
+    """
+
+    def __init__(self, directory: str, storage: PresentationStorage,
+                 max_versions: int = 50):
+        self.directory = Path(directory)
+        self.blobs_directory = self.directory / "blobs"
+        self.documents_directory = self.directory / "documents"
+        self.checkouts_directory = self.directory / "checkouts"
+        self.storage = storage
+        self.max_versions = max_versions
+        self.counters = {"commits": 0, "rebases": 0, "undos": 0, "redos": 0,
+                         "rebuilds": 0, "staged_bytes": 0}
+        self.last_compaction: Optional[Dict[str, int]] = None
+        self._base_members: Dict[str, Set[str]] = {}
+        self._locks: "weakref.WeakValueDictionary[str, threading.Lock]" = \
+            weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(document_id: str, version: int) -> str:
+        return f"{document_id}@v{version}" if version else document_id
+
+    @staticmethod
+    def parse_key(key: str) -> Tuple[str, int]:
+        match = VERSION_KEY_PATTERN.fullmatch(key)
+        if match is None:
+            return key, 0
+        return match["document_id"], int(match["version"])
+
+    def head(self, document_id: str) -> int:
+        return self._load(document_id)["head"]
+
+    def resolve(self, document_id: str) -> Tuple[str, str]:
+        """
+        Returns the local path and key of the head version of a document.
+        Raises `FileNotFoundError` if the document is not stored.
+        """
+        head = self.head(document_id)
+        return self.checkout(document_id, head), self.key(document_id, head)
+
+    def checkout(self, document_id: str, version: int) -> str:
+        """
+        Returns a local path of the deck at `version`, rebuilding it from the
+        uploaded deck and the blobs of the version if needed. Raises
+        `LookupError` for versions that do not exist or were compacted.
+        """
+        base_path = self.storage.local_path(document_id)
+        if version == 0:
+            return base_path
+
+        checkout_path = self.checkouts_directory / f"{document_id}_v{version}.pptx"
+        with self._document_lock(document_id):
+            # Looked up first, so decks of compacted versions are not served
+            members = self._version(self._load(document_id), version)["members"]
+            if checkout_path.is_file():
+                return str(checkout_path)
+
+            self.checkouts_directory.mkdir(parents=True, exist_ok=True)
+            temporary_path = checkout_path.with_name(
+                f"{checkout_path.name}.{uuid.uuid4().hex}.part")
+            try:
+                self._rebuild(base_path, members, temporary_path)
+                os.replace(temporary_path, checkout_path)
+            finally:
+                temporary_path.unlink(missing_ok=True)
+            self._count("rebuilds")
+        return str(checkout_path)
+
+    def stage(self, key: str, presentation: ppt_type,
+              slide_indices: Iterable[int]) -> Dict[str, Any]:
+        """
+        Stores the blobs of the slides at `slide_indices` of `presentation`, an
+        edited copy of the version `key`, and of the parts added to the deck
+        since. Returns the change to hand to `commit`.
+        """
+        document_id, parent = self.parse_key(key)
+        slide_indices = sorted(slide_indices)
+        members = dict(self._version(self._load(document_id), parent)["members"])
+        known_members = self._base(document_id) | set(members)
+        slide_parts = [slide.part for slide in presentation.slides]
+
+        stored_bytes = 0
+        parts_added = False
+        pending: List[Tuple[Part, bool]] = [
+            (slide_parts[slide_index], False) for slide_index in slide_indices]
+        while pending:
+            part, added = pending.pop()
+            for member, content in self._part_members(part):
+                digest, written = self._put_blob(member, content)
+                members[member] = digest
+                stored_bytes += written
+            for rel in part.rels.values():
+                target_member = None if rel.is_external \
+                    else rel.target_part.partname.membername
+                if target_member is not None and target_member not in known_members:
+                    known_members.add(target_member)
+                    pending.append((rel.target_part, True))
+            parts_added = parts_added or added
+
+        if parts_added:
+            digest, written = self._put_blob(
+                CONTENT_TYPES_URI.membername,
+                serialize_part_xml(_ContentTypesItem.xml_for(
+                    presentation.part.package.iter_parts())))
+            members[CONTENT_TYPES_URI.membername] = digest
+            stored_bytes += written
+        self._count("staged_bytes", stored_bytes)
+
+        return {"document_id": document_id, "parent": parent,
+                "slide_indices": slide_indices, "members": members,
+                "stored_bytes": stored_bytes}
+
+    def commit(self, staged: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Appends a staged change as the new head of its document, dropping the
+        versions that could be redone and, beyond `max_versions`, the oldest.
+
+        If the head moved since the change was staged, the change is rebased
+        onto the head when they changed different members; raises
+        `VersionConflictError` otherwise.
+        """
+        document_id = staged["document_id"]
+        with self._document_lock(document_id):
+            manifest = self._load(document_id)
+            parent = manifest["head"]
+            members = staged["members"] if staged["parent"] == parent \
+                else self._rebase(manifest, staged)
+            versions = manifest["versions"]
+            del versions[self._index(manifest, parent) + 1:]
+            version = manifest["next_version"]
+            versions.append({
+                "version": version,
+                "parent": parent,
+                "created": time.time(),
+                "slide_indices": staged["slide_indices"],
+                "members": members,
+            })
+            manifest["head"] = version
+            manifest["next_version"] = version + 1
+            self._trim(manifest)
+            self._save(document_id, manifest)
+        self._count("commits")
+        if parent != staged["parent"]:
+            self._count("rebases")
+        return {"version": version, "parent": parent,
+                "rebased": parent != staged["parent"],
+                "key": self.key(document_id, version),
+                "stored_bytes": staged["stored_bytes"]}
+
+    def undo(self, document_id: str) -> Dict[str, Any]:
+        """
+        Moves the head of a document to its parent version. Raises
+        `HistoryEndError` if it has none or the parent was dropped.
+        """
+        return self._move_head(document_id, self._parent, "undos")
+
+    def redo(self, document_id: str) -> Dict[str, Any]:
+        """
+        Moves the head of a document to the version last undone. Raises
+        `HistoryEndError` if there is none.
+        """
+        return self._move_head(document_id, self._child, "redos")
+
+    def history(self, document_id: str) -> Dict[str, Any]:
+        manifest = self._load(document_id)
+        return {
+            "document_id": document_id,
+            "head": manifest["head"],
+            "key": self.key(document_id, manifest["head"]),
+            "can_undo": self._parent(manifest) is not None,
+            "can_redo": self._child(manifest) is not None,
+            "versions": [{
+                "version": entry["version"],
+                "parent": entry.get("parent"),
+                "created": entry["created"],
+                "slide_indices": entry.get("slide_indices", []),
+                "changed_members": len(entry["members"]),
+            } for entry in manifest["versions"]],
+        }
+
+    def compact(self, grace_seconds: float = 3600) -> Dict[str, int]:
+        """
+        Drops versions beyond `max_versions` from every document, then deletes
+        blobs no version refers to and rebuilt decks of versions that are not a
+        head, once not used for `grace_seconds` (so blobs staged for a commit
+        still in flight are kept).
+        """
+        referenced: Set[str] = set()
+        heads: Set[str] = set()
+        versions_removed = 0
+        for manifest_path in self._manifest_paths():
+            document_id = manifest_path.stem
+            with self._document_lock(document_id):
+                manifest = self._load(document_id)
+                removed = self._trim(manifest)
+                if removed:
+                    self._save(document_id, manifest)
+            versions_removed += removed
+            heads.add(f"{document_id}_v{manifest['head']}.pptx")
+            for entry in manifest["versions"]:
+                referenced.update(entry["members"].values())
+
+        expires_before = time.time() - grace_seconds
+        blobs_removed = self._remove_files(
+            self.blobs_directory.glob("*/*"), expires_before,
+            lambda path: path.name not in referenced)
+        checkouts_removed = self._remove_files(
+            self.checkouts_directory.glob("*"), expires_before,
+            lambda path: path.name not in heads)
+        self.last_compaction = {"versions_removed": versions_removed,
+                                "blobs_removed": blobs_removed,
+                                "checkouts_removed": checkouts_removed}
+        return self.last_compaction
+
+    def stats(self) -> Dict[str, Any]:
+        blobs = [path.stat().st_size for path in self.blobs_directory.glob("*/*")]
+        checkouts = [path.stat().st_size
+                     for path in self.checkouts_directory.glob("*.pptx")]
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "max_versions": self.max_versions,
+            "documents": len(self._manifest_paths()),
+            "blobs": len(blobs),
+            "blob_bytes": sum(blobs),
+            "checkouts": len(checkouts),
+            "checkout_bytes": sum(checkouts),
+            **counters,
+            "last_compaction": self.last_compaction,
+        }
+
+    def _move_head(self, document_id: str,
+                   target: Callable[[Dict[str, Any]], Optional[int]],
+                   counter: str) -> Dict[str, Any]:
+        with self._document_lock(document_id):
+            manifest = self._load(document_id)
+            version = target(manifest)
+            if version is None:
+                raise HistoryEndError(f"Nothing to {counter[:-1]}")
+            manifest["head"] = version
+            self._save(document_id, manifest)
+        self._count(counter)
+        return self.history(document_id)
+
+    def _parent(self, manifest: Dict[str, Any]) -> Optional[int]:
+        """
+        The parent of the head, if it is still kept.
+        """
+        parent = self._version(manifest, manifest["head"]).get("parent")
+        if parent is None or not any(entry["version"] == parent
+                                     for entry in manifest["versions"]):
+            return None
+        return parent
+
+    @staticmethod
+    def _child(manifest: Dict[str, Any]) -> Optional[int]:
+        """
+        The newest version edited from the head, i.e. the one last undone.
+        """
+        children = [entry["version"] for entry in manifest["versions"]
+                    if entry.get("parent") == manifest["head"]]
+        return max(children) if children else None
+
+    def _rebase(self, manifest: Dict[str, Any],
+                staged: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns the members of the head with the members changed by `staged`
+        since its parent applied on top. Raises `VersionConflictError` if the
+        parent was dropped or the head changed any of the same members.
+        """
+        try:
+            parent_members = self._version(manifest, staged["parent"])["members"]
+        except LookupError:
+            raise VersionConflictError(
+                f"Version {staged['parent']} the edit was made on no longer exists")
+        head_members = self._version(manifest, manifest["head"])["members"]
+        changed = {member: digest for member, digest in staged["members"].items()
+                   if parent_members.get(member) != digest}
+        head_changed = {member for member in parent_members.keys() | head_members.keys()
+                        if parent_members.get(member) != head_members.get(member)}
+        if head_changed & changed.keys():
+            raise VersionConflictError(
+                f"Version {manifest['head']} changed the same parts as the edit "
+                f"made on version {staged['parent']}")
+        return {**head_members, **changed}
+
+    def _trim(self, manifest: Dict[str, Any]) -> int:
+        """
+        Keeps version 0, the head and the last `max_versions` versions.
+        """
+        versions = manifest["versions"]
+        kept = [entry for index, entry in enumerate(versions)
+                if index == 0 or index >= len(versions) - self.max_versions
+                or entry["version"] == manifest["head"]]
+        removed = len(versions) - len(kept)
+        manifest["versions"] = kept
+        return removed
+
+    def _rebuild(self, base_path: str, members: Dict[str, str],
+                 target_path: Path) -> None:
+        """
+        Writes the uploaded deck with `members` replaced by their blobs, in the
+        member order of the uploaded deck, followed by the members it lacks.
+        """
+        with zipfile.ZipFile(base_path) as base, \
+                zipfile.ZipFile(target_path, "w") as target:
+            names = base.namelist()
+            for name in names:
+                digest = members.get(name)
+                content = self._get_blob(digest) if digest else base.read(name)
+                target.writestr(name, content, self._compression(name))
+            for name in members.keys() - set(names):
+                target.writestr(name, self._get_blob(members[name]),
+                                self._compression(name))
+
+    @staticmethod
+    def _compression(member: str) -> int:
+        return zipfile.ZIP_DEFLATED if member.endswith(TEXT_MEMBER_SUFFIXES) \
+            else zipfile.ZIP_STORED
+
+    @staticmethod
+    def _part_members(part: Part) -> List[Tuple[str, bytes]]:
+        members = [(part.partname.membername, part.blob)]
+        if part.rels:
+            members.append((part.partname.rels_uri.membername, part.rels.xml))
+        return members
+
+    def _put_blob(self, member: str, content: bytes) -> Tuple[str, int]:
+        """
+        Stores `content` unless a blob with the same content exists; returns
+        its digest and the bytes written.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        blob_path = self.blobs_directory / digest[:2] / digest
+        if blob_path.is_file():
+            # A blob about to be referenced again must outlive the grace period
+            os.utime(blob_path)
+            return digest, 0
+
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        data = zlib.compress(content, 6 if member.endswith(TEXT_MEMBER_SUFFIXES)
+                             else 0)
+        temporary_path = blob_path.with_name(f"{digest}.{uuid.uuid4().hex}.part")
+        try:
+            temporary_path.write_bytes(data)
+            os.replace(temporary_path, blob_path)
+        finally:
+            temporary_path.unlink(missing_ok=True)
+        return digest, len(data)
+
+    def _get_blob(self, digest: str) -> bytes:
+        return zlib.decompress(
+            (self.blobs_directory / digest[:2] / digest).read_bytes())
+
+    def _base(self, document_id: str) -> Set[str]:
+        names = self._base_members.get(document_id)
+        if names is None:
+            with zipfile.ZipFile(self.storage.local_path(document_id)) as base:
+                names = set(base.namelist())
+            with self._lock:
+                self._base_members[document_id] = names
+        return names
+
+    def _load(self, document_id: str) -> Dict[str, Any]:
+        """
+        Returns the manifest of a document, or a new one holding version 0 if
+        the document has no history. Raises `FileNotFoundError` if the
+        document is not stored.
+        """
+        try:
+            return json.loads(self._manifest_path(document_id).read_text())
+        except FileNotFoundError:
+            self.storage.local_path(document_id)
+            return {"document_id": document_id, "head": 0, "next_version": 1,
+                    "versions": [{"version": 0, "parent": None,
+                                  "created": time.time(), "members": {}}]}
+
+    def _save(self, document_id: str, manifest: Dict[str, Any]) -> None:
+        manifest_path = self._manifest_path(document_id)
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = manifest_path.with_name(
+            f"{manifest_path.name}.{uuid.uuid4().hex}.part")
+        try:
+            temporary_path.write_text(json.dumps(manifest))
+            os.replace(temporary_path, manifest_path)
+        finally:
+            temporary_path.unlink(missing_ok=True)
+
+    def _manifest_path(self, document_id: str) -> Path:
+        if not CHECKSUM_PATTERN.fullmatch(document_id):
+            raise ValueError("Checksum must be a lowercase hex SHA-256 digest")
+        return self.documents_directory / f"{document_id}.json"
+
+    def _manifest_paths(self) -> List[Path]:
+        return list(self.documents_directory.glob("*.json"))
+
+    @staticmethod
+    def _index(manifest: Dict[str, Any], version: int) -> int:
+        for index, entry in enumerate(manifest["versions"]):
+            if entry["version"] == version:
+                return index
+        raise LookupError(f"Version {version} not found")
+
+    def _version(self, manifest: Dict[str, Any], version: int) -> Dict[str, Any]:
+        return manifest["versions"][self._index(manifest, version)]
+
+    @staticmethod
+    def _remove_files(paths: Iterable[Path], expires_before: float,
+                      unused: Callable[[Path], bool]) -> int:
+        removed = 0
+        for path in paths:
+            try:
+                if unused(path) and path.stat().st_mtime < expires_before:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def _document_lock(self, document_id: str) -> threading.Lock:
+        with self._lock:
+            document_lock = self._locks.get(document_id)
+            if document_lock is None:
+                document_lock = threading.Lock()
+                self._locks[document_id] = document_lock
+            return document_lock
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += amount
@@ -0,0 +1,32 @@
+import asyncio
+from typing import Awaitable, TypeVar
+
+from fastapi import HTTPException, Request
+
+T = TypeVar("T")
+
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def cancel_on_disconnect(request: Request,
+                               awaitable: Awaitable[T],
+                               poll_interval: float = 0.25) -> T:
+    """
+    Await `awaitable`, cancelling it as soon as the client disconnects so that
+    abandoned requests stop holding LLM connections.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(
+                    status_code=CLIENT_CLOSED_REQUEST,
+                    detail="Client disconnected before the response was ready"
+                )
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from pydantic import BaseModel
+
+_SPACES = re.compile(r"[ \t]+")
+
+
+def normalise_prompt(prompt: str) -> str:
+    """
+    Strips the prompt and collapses runs of spaces within each line; line breaks
+    are kept since they can change the model's reading of the prompt.
+    """
+    return "\n".join(
+        _SPACES.sub(" ", line) for line in prompt.strip().splitlines()
+    )
+
+
+class LLMResponseCache:
+    """
+    Cache of parsed structured-output completions keyed by a hash of the model,
+    the system and user prompts, stripped and with runs of spaces collapsed
+    within each line, and the output schema.
+
+    Parsed responses are kept in an in-memory LRU so hits skip both the network
+    and pydantic parsing; cached objects are shared and must not be mutated. An
+    optional SQLite file persists responses as JSON across restarts and
+    processes; disk hits are parsed once and promoted to memory.
+    """
+
+    def __init__(self,
+                 max_entries: int,
+                 ttl_seconds: float,
+                 sqlite_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.sqlite_path = sqlite_path
+        self._entries: "OrderedDict[str, Tuple[float, BaseModel]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._schema_versions: Dict[type, str] = {}
+        self._connection: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if sqlite_path:
+            self._connection = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses (key TEXT PRIMARY KEY, "
+                "expires_at REAL NOT NULL, response TEXT NOT NULL)"
+            )
+            self._connection.commit()
+
+    def key(self,
+            model: str,
+            system_prompt: str,
+            user_prompt: str,
+            output_schema: type) -> str:
+        payload = json.dumps([
+            model,
+            normalise_prompt(system_prompt),
+            normalise_prompt(user_prompt),
+            self.schema_version(output_schema),
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def schema_version(self, output_schema: type) -> str:
+        """
+        Hash of the JSON schema of `output_schema`, so responses cached for an
+        older version of the schema are never returned.
+        """
+        version = self._schema_versions.get(output_schema)
+        if version is None:
+            schema = json.dumps(output_schema.model_json_schema(), sort_keys=True)
+            version = hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+            self._schema_versions[output_schema] = version
+        return version
+
+    @property
+    def persistent(self) -> bool:
+        return self._connection is not None
+
+    def get_memory(self, key: str) -> Optional[BaseModel]:
+        """
+        The response cached in memory for `key`, if any; unlike `get`, a miss is
+        not counted and the SQLite file is not read, so this never blocks on I/O.
+        """
+        with self._lock:
+            return self._get_memory(key, time.time())
+
+    def get(self, key: str, output_schema: type) -> Optional[BaseModel]:
+        now = time.time()
+        with self._lock:
+            response = self._get_memory(key, now)
+            if response is not None:
+                return response
+
+            if self._connection is not None:
+                row = self._connection.execute(
+                    "SELECT expires_at, response FROM llm_responses WHERE key = ?",
+                    (key,)
+                ).fetchone()
+                if row is not None and row[0] > now:
+                    response = output_schema.model_validate_json(row[1])
+                    self._remember(key, row[0], response)
+                    self.disk_hits += 1
+                    return response
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: BaseModel) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, response)
+            if self._connection is not None:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?)",
+                    (key, expires_at, response.model_dump_json())
+                )
+                self._connection.execute(
+                    "DELETE FROM llm_responses WHERE expires_at <= ?", (time.time(),))
+                self._connection.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "sqlite_path": self.sqlite_path,
+            }
+
+    def _get_memory(self, key: str, now: float) -> Optional[BaseModel]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return response
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _remember(self, key: str, expires_at: float, response: BaseModel) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
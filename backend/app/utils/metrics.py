@@ -0,0 +1,305 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a cached prompt render to a slow LLM call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0, 30.0, 60.0)
+# Bytes, from a small JSON body to a media-heavy deck
+SIZE_BUCKETS = tuple(float(4 ** exponent) for exponent in range(5, 15))
+TOKEN_BUCKETS = (16.0, 64.0, 256.0, 512.0, 1024.0, 2048.0, 4096.0, 8192.0, 16384.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str],
+                   extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"'
+                          for name, value in pairs) + "}"
+
+
+class Counter:
+    """
+    Monotonic counter, optionally split by label values.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str,
+                 label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(map(labels.__getitem__, self.label_names))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}_total{_format_labels(self.label_names, key)} "
+                f"{_format_value(value)}" for key, value in values]
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus sense, optionally split by
+    label values. Observations are O(log buckets) under a short lock.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float],
+                 label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        # Per label values: per-bucket (non-cumulative) counts, sum and count
+        self._series: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(map(labels.__getitem__, self.label_names))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, **labels: str) -> Optional[Dict[str, Any]]:
+        """
+        Count, sum and cumulative bucket counts of one label set, or `None` if
+        nothing was observed for it.
+        """
+        key = tuple(map(labels.__getitem__, self.label_names))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                return None
+            counts, total, count = list(series[0]), series[1], series[2]
+        cumulative, running = [], 0
+        for bucket_count in counts:
+            running += bucket_count
+            cumulative.append(running)
+        return {"count": count, "sum": total,
+                "buckets": dict(zip(self.buckets + (math.inf,), cumulative))}
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(value[0]), value[1], value[2]))
+                            for key, value in self._series.items())
+        lines = []
+        for key, (counts, total, count) in series:
+            running = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                running += bucket_count
+                labels = _format_labels(self.label_names, key,
+                                        ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {running}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    In-process metrics served in the Prometheus text format: latency per
+    request stage, LLM token counts, payload sizes and HTTP requests. With
+    `tracing` and the optional `opentelemetry-api` package installed, every
+    timed stage is also an OpenTelemetry span, nested like the stages themselves.
+    """
+
+    def __init__(self, prefix: str = "ppt", tracing: bool = False):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+        self.tracer = otel_trace.get_tracer(__name__) \
+            if tracing and otel_trace is not None else None
+
+        self.stage_seconds = self.histogram(
+            "stage_seconds", "Duration of a request processing stage.",
+            LATENCY_BUCKETS, ("stage",))
+        self.queue_seconds = self.histogram(
+            "worker_queue_seconds", "Wait for a presentation worker per stage.",
+            LATENCY_BUCKETS, ("stage",))
+        self.llm_tokens = self.histogram(
+            "llm_tokens", "Tokens of an LLM call, as reported by the service.",
+            TOKEN_BUCKETS, ("kind",))
+        self.prompt_tokens = self.histogram(
+            "prompt_tokens", "Estimated tokens of a rendered prompt and its context.",
+            TOKEN_BUCKETS, ("part",))
+        self.payload_bytes = self.histogram(
+            "payload_bytes", "Size of a request, prompt, LLM response or slide.",
+            SIZE_BUCKETS, ("kind",))
+        self.http_seconds = self.histogram(
+            "http_request_seconds", "Duration of an HTTP request.",
+            LATENCY_BUCKETS, ("method", "route", "status"))
+        self.errors = self.counter(
+            "stage_errors", "Stages that ended with an exception.", ("stage",))
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float],
+                  label_names: Sequence[str] = ()) -> Histogram:
+        return self._register(Histogram(f"{self.prefix}_{name}", documentation,
+                                        buckets, label_names))
+
+    def counter(self, name: str, documentation: str,
+                label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(f"{self.prefix}_{name}", documentation,
+                                      label_names))
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Any]:
+        """
+        An OpenTelemetry span with tracing enabled, otherwise nothing.
+        """
+        if self.tracer is None:
+            yield None
+            return
+        with self.tracer.start_as_current_span(name, attributes=attributes) as span:
+            yield span
+
+    def stage(self, name: str, **attributes: Any) -> "_Stage":
+        """
+        Time a stage into `stage_seconds` and, with tracing, wrap it in a span
+        carrying `attributes`.
+        """
+        return _Stage(self, name, attributes)
+
+    def observe_stage(self, name: str, run_seconds: float,
+                      queue_seconds: Optional[float] = None) -> None:
+        """
+        Record a stage timed elsewhere, e.g. on a process worker.
+        """
+        self.stage_seconds.observe(run_seconds, stage=name)
+        if queue_seconds is not None:
+            self.queue_seconds.observe(queue_seconds, stage=name)
+
+    def observe_tokens(self, usage: Optional[Dict[str, Any]]) -> None:
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage and usage.get(kind) is not None:
+                self.llm_tokens.observe(usage[kind], kind=kind.split("_")[0])
+
+    def observe_prompt(self, report: Dict[str, Any]) -> None:
+        for part in ("total", "context"):
+            if report.get(f"{part}_tokens") is not None:
+                self.prompt_tokens.observe(report[f"{part}_tokens"], part=part)
+
+    def observe_size(self, kind: str, size_bytes: int) -> None:
+        self.payload_bytes.observe(size_bytes, kind=kind)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            name = f"{metric.name}_total" if metric.kind == "counter" else metric.name
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: Any) -> Any:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+
+class _Stage:
+    """
+    Context manager behind `MetricsRegistry.stage`; a class rather than a
+    generator, as it wraps every stage of every request.
+    """
+
+    __slots__ = ("metrics", "name", "attributes", "started", "span")
+
+    def __init__(self, metrics: MetricsRegistry, name: str, attributes: Dict[str, Any]):
+        self.metrics = metrics
+        self.name = name
+        self.attributes = attributes
+        self.span = None
+
+    def __enter__(self) -> Any:
+        if self.metrics.tracer is not None:
+            self.span = self.metrics.tracer.start_as_current_span(
+                self.name, attributes=self.attributes)
+            entered = self.span.__enter__()
+        else:
+            entered = None
+        self.started = time.perf_counter()
+        return entered
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> bool:
+        self.metrics.stage_seconds.observe(time.perf_counter() - self.started,
+                                           stage=self.name)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.metrics.errors.inc(stage=self.name)
+        if self.span is not None:
+            return bool(self.span.__exit__(exc_type, exc, traceback))
+        return False
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the duration of every HTTP request, streamed body
+    included, by method, route template and status code.
+    """
+
+    def __init__(self, app: Any, metrics: MetricsRegistry):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope; unmatched paths
+            # share one label to keep the number of series bounded
+            route = scope.get("route")
+            self.metrics.http_seconds.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status))
@@ -0,0 +1,105 @@
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from app.utils.metrics import MetricsRegistry
+
+FAST_TIER = "fast"
+LARGE_TIER = "large"
+
+# Instructions that restructure a slide rather than edit a shape or two
+COMPLEX_INSTRUCTION = re.compile(
+    r"\b(redesign|rearrange|reorgani[sz]e|restructure|layout|align|distribute"
+    r"|diagram|timeline|chart|table|infographic|agenda)", re.IGNORECASE)
+
+
+class ModelRouter:
+    """
+    Routes a structured completion to a small, fast deployment when both the
+    instruction and the slide are simple, and to the large one otherwise. A
+    fast response failing validation or the caller's checks is escalated to
+    the large deployment. Without a fast deployment everything goes to the
+    large one.
+    """
+
+    def __init__(self,
+                 fast_model: Optional[str],
+                 max_shapes: int = 10,
+                 max_text_chars: int = 1000,
+                 max_instruction_words: int = 20,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.fast_model = fast_model
+        self.max_shapes = max_shapes
+        self.max_text_chars = max_text_chars
+        self.max_instruction_words = max_instruction_words
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._tiers = {tier: {"requests": 0, "escalated": 0, "seconds_total": 0.0}
+                       for tier in (FAST_TIER, LARGE_TIER)}
+        self.reasons: Dict[str, int] = {}
+        self.escalation_reasons: Dict[str, int] = {}
+        self._routes = metrics.counter(
+            "llm_routes", "LLM calls per model tier and outcome.",
+            ("tier", "outcome")) if metrics is not None else None
+
+    def classify(self, instruction: str,
+                 slide_context: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Returns the tier for an instruction on a slide, and the reason.
+        """
+        if not self.fast_model:
+            reason = "no_fast_model"
+        elif len(instruction.split()) > self.max_instruction_words:
+            reason = "long_instruction"
+        elif COMPLEX_INSTRUCTION.search(instruction):
+            reason = "complex_instruction"
+        elif len(slide_context.get("shapes", [])) > self.max_shapes:
+            reason = "many_shapes"
+        elif sum(len(shape.get("text") or "")
+                 for shape in slide_context.get("shapes", [])) > self.max_text_chars:
+            reason = "long_text"
+        else:
+            return FAST_TIER, "simple"
+        return LARGE_TIER, reason
+
+    def record(self, tier: str, seconds: float,
+               escalation: Optional[str] = None, reason: Optional[str] = None) -> None:
+        """
+        Records one call of `tier`, and why the request was routed there, or
+        why a fast call was escalated.
+        """
+        with self._lock:
+            timings = self._tiers[tier]
+            timings["requests"] += 1
+            timings["seconds_total"] += seconds
+            if reason is not None:
+                self.reasons[reason] = self.reasons.get(reason, 0) + 1
+            if escalation is not None:
+                timings["escalated"] += 1
+                self.escalation_reasons[escalation] = \
+                    self.escalation_reasons.get(escalation, 0) + 1
+        if self.metrics is not None:
+            self.metrics.observe_stage(f"llm.tier.{tier}", seconds)
+            self._routes.inc(tier=tier,
+                             outcome="escalated" if escalation else "accepted")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "fast_model": self.fast_model,
+                "max_shapes": self.max_shapes,
+                "max_text_chars": self.max_text_chars,
+                "max_instruction_words": self.max_instruction_words,
+                "tiers": {
+                    tier: {
+                        **timings,
+                        "escalation_rate": timings["escalated"] / timings["requests"]
+                        if timings["requests"] else 0.0,
+                        "seconds_avg": timings["seconds_total"] / timings["requests"]
+                        if timings["requests"] else 0.0,
+                    }
+                    for tier, timings in self._tiers.items()
+                },
+                "reasons": dict(self.reasons),
+                "escalation_reasons": dict(self.escalation_reasons),
+            }
@@ -1,7 +1,21 @@
+import time
 import traceback
-from typing import Optional, Dict, Any
+from contextlib import nullcontext
+from typing import (Optional, Dict, Any, AsyncIterator, Awaitable, Callable,
+                    ContextManager, Tuple, TypeVar)
 
-from openai import AzureOpenAI
+import httpx
+from openai import DEFAULT_MAX_RETRIES, AsyncAzureOpenAI, AzureOpenAI
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from app.utils.llm_cache import LLMResponseCache
+from app.utils.metrics import MetricsRegistry
+from app.utils.model_router import FAST_TIER, LARGE_TIER, ModelRouter
+from app.utils.resilience import CircuitOpenError, ResilientCaller
+from app.utils.structured_output import check_completion, compile_structured_output
+
+T = TypeVar("T")
 
 
 class OpenAIChatService:
@@ -75,3 +89,348 @@ class OpenAIChatService:
                 f"\nError Message: {str(e)}"
                 f"\nTraceback:{traceback.format_exc()}")
             return None
+
+
+class AsyncOpenAIChatService(OpenAIChatService):
+    """
+    Non-blocking variant of `OpenAIChatService` whose clients share one bounded
+    HTTP connection pool. Structured responses are served from `cache` when given,
+    and are decoded from the raw response body with a precompiled schema, or
+    streamed item by item with `stream_chatGPT`. Call latency, token counts and
+    response sizes are recorded in `metrics` when given. With a `router`,
+    `route_chatGPT` sends simple requests to its fast deployment. With
+    `resilience`, calls get deadlines, budgeted retries, hedging and a circuit
+    breaker per deployment instead of the SDK's retries.
+    """
+
+    def __init__(self,
+                 endpoint: str,
+                 api_key: str,
+                 api_version: str,
+                 model: str,
+                 max_connections: int = 20,
+                 timeout: float = 60.0,
+                 cache: Optional[LLMResponseCache] = None,
+                 metrics: Optional[MetricsRegistry] = None,
+                 router: Optional[ModelRouter] = None,
+                 resilience: Optional[ResilientCaller] = None):
+        super().__init__(endpoint, api_key, api_version, model)
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.cache = cache
+        self.metrics = metrics
+        self.router = router
+        self.resilience = resilience
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout)
+        )
+
+    def _get_azure_client(self) -> AsyncAzureOpenAI:
+        """
+        Initialize and return an async Azure OpenAI client on the shared pool.
+        """
+        try:
+            return AsyncAzureOpenAI(
+                azure_endpoint=self.endpoint,
+                api_key=self.api_key,
+                api_version=self.api_version,
+                http_client=self._http_client,
+                max_retries=0 if self.resilience is not None else DEFAULT_MAX_RETRIES
+            )
+        except Exception as e:
+            raise ConnectionError(f"Failed to initialize Azure OpenAI client: {str(e)}")
+
+    async def run_chatGPT(self,
+                          gpt_client: AsyncAzureOpenAI,
+                          system_prompt: str,
+                          user_prompt: str,
+                          output_schema: Optional[Any] = None,
+                          timeout: Optional[float] = None,
+                          use_cache: bool = True,
+                          model: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Executes a ChatGPT completion without blocking the event loop.
+
+        Args:
+            gpt_client (AsyncAzureOpenAI): An async Azure OpenAI client.
+            system_prompt (str): System-level instruction to guide the AI.
+            user_prompt (str): User-level instruction or query.
+            output_schema (Optional[Any]): Optional schema for structured output.
+            timeout (Optional[float]): Per-call timeout in seconds, defaults to the
+                pool timeout.
+            use_cache (bool): Whether a cached response may be returned; fresh
+                structured responses are cached either way.
+            model (Optional[str]): Deployment to call, defaults to `model`.
+
+        Returns:
+            Optional[Dict[str, Any]]: Parsed response from ChatGPT, or `None` if
+                the call failed.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker of the deployment is open.
+        """
+        if not gpt_client:
+            gpt_client = self._get_azure_client()
+        model = model or self.model
+
+        cache_key = None
+        if self.cache is not None and output_schema:
+            cache_key = self.cache.key(model, system_prompt, user_prompt,
+                                       output_schema)
+            if use_cache:
+                cached_response = await self._cache_get(cache_key, output_schema)
+                if cached_response is not None:
+                    return cached_response
+
+        try:
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ]
+
+            if not output_schema:
+                return await self._call(
+                    model,
+                    lambda: gpt_client.beta.chat.completions.parse(
+                        model=model,
+                        messages=messages,
+                        timeout=timeout or self.timeout,
+                    ))
+
+            # Skip the SDK's per-call schema generation and response object
+            # construction: validate the raw body against the compiled schema
+            structured_output = compile_structured_output(output_schema)
+            with self._stage("llm.request"):
+                raw_response = await self._call(
+                    model,
+                    lambda: gpt_client.chat.completions.with_raw_response.create(
+                        model=model,
+                        messages=messages,
+                        response_format=structured_output.response_format,
+                        timeout=timeout or self.timeout,
+                    ))
+            with self._stage("llm.parse"):
+                parsed_response, usage = \
+                    structured_output.decode_completion_with_usage(raw_response.content)
+            if self.metrics is not None:
+                self.metrics.observe_size("llm_response", len(raw_response.content))
+                self.metrics.observe_tokens(usage)
+
+            if cache_key is not None:
+                await self._cache_put(cache_key, parsed_response)
+            return parsed_response
+
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            print(
+                f"An error occurred:"
+                f"\nError Type: {type(e).__name__}"
+                f"\nError Message: {str(e)}"
+                f"\nTraceback:{traceback.format_exc()}")
+            return None
+
+    def route(self, instruction: str, slide_context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns the route of a request: the tier and model `router` chooses for
+        the instruction and slide, and why.
+        """
+        tier, reason = self.router.classify(instruction, slide_context) \
+            if self.router is not None else (LARGE_TIER, "no_router")
+        return {"tier": tier,
+                "model": self.router.fast_model if tier == FAST_TIER else self.model,
+                "reason": reason,
+                "escalated": None}
+
+    async def route_chatGPT(self,
+                            gpt_client: AsyncAzureOpenAI,
+                            system_prompt: str,
+                            user_prompt: str,
+                            output_schema: Any,
+                            route_report: Dict[str, Any],
+                            check: Optional[Callable[[Any], Optional[str]]] = None,
+                            timeout: Optional[float] = None,
+                            use_cache: bool = True
+                            ) -> Tuple[Optional[Any], Dict[str, Any]]:
+        """
+        Executes a structured completion on the deployment of `route_report`,
+        from `route`, escalating to `model` if the fast deployment gives no
+        valid response or `check` reports a problem with it.
+
+        Args:
+            gpt_client (AsyncAzureOpenAI): An async Azure OpenAI client.
+            system_prompt (str): System-level instruction to guide the AI.
+            user_prompt (str): User-level instruction or query.
+            output_schema (Any): Schema for structured output, e.g. `ActionsList`.
+            route_report (Dict[str, Any]): The route of the request.
+            check (Optional[Callable[[Any], Optional[str]]]): Returns why a fast
+                response is not acceptable, or `None` to accept it.
+            timeout (Optional[float]): Per-call timeout in seconds.
+            use_cache (bool): Whether cached responses may be returned.
+
+        Returns:
+            Tuple[Optional[Any], Dict[str, Any]]: The parsed response, and the
+                route that produced it, with the escalation reason if the fast
+                response was rejected.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker of `model` is open.
+        """
+        route_report = dict(route_report)
+        if route_report["tier"] == FAST_TIER:
+            started = time.perf_counter()
+            try:
+                response = await self.run_chatGPT(
+                    gpt_client, system_prompt, user_prompt, output_schema, timeout,
+                    use_cache, model=route_report["model"])
+                escalation = "no_valid_response" if response is None \
+                    else check(response) if check is not None else None
+            except CircuitOpenError:
+                response, escalation = None, "circuit_open"
+            self.router.record(FAST_TIER, time.perf_counter() - started,
+                               escalation, route_report["reason"])
+            if escalation is None:
+                return response, route_report
+
+            route_report.update(tier=LARGE_TIER, model=self.model,
+                                escalated=escalation)
+
+        started = time.perf_counter()
+        response = await self.run_chatGPT(
+            gpt_client, system_prompt, user_prompt, output_schema, timeout, use_cache)
+        if self.router is not None:
+            self.router.record(
+                LARGE_TIER, time.perf_counter() - started,
+                reason=None if route_report["escalated"] else route_report["reason"])
+        return response, route_report
+
+    async def stream_chatGPT(self,
+                             gpt_client: AsyncAzureOpenAI,
+                             system_prompt: str,
+                             user_prompt: str,
+                             output_schema: Any,
+                             timeout: Optional[float] = None,
+                             use_cache: bool = True,
+                             route_reason: Optional[str] = None) -> AsyncIterator[Any]:
+        """
+        Streams a structured completion whose schema holds a single list field,
+        yielding each list item as soon as it has been generated. Streams always
+        use the large deployment, as items cannot be escalated once yielded.
+
+        Args:
+            gpt_client (AsyncAzureOpenAI): An async Azure OpenAI client.
+            system_prompt (str): System-level instruction to guide the AI.
+            user_prompt (str): User-level instruction or query.
+            output_schema (Any): Schema for structured output, e.g. `ActionsList`.
+            timeout (Optional[float]): Per-call timeout in seconds, defaults to the
+                pool timeout.
+            use_cache (bool): Whether a cached response may be replayed; complete
+                responses are cached either way.
+            route_reason (Optional[str]): Why the request was routed to the large
+                deployment, recorded in the `router` statistics.
+
+        Yields:
+            Any: Items of the list field, e.g. `ShapeParameters`.
+
+        Raises:
+            ValueError: If the completion is cut short, refused or does not match
+                the schema; items already yielded stay valid.
+            CircuitOpenError: If the circuit breaker of `model` is open.
+        """
+        if not gpt_client:
+            gpt_client = self._get_azure_client()
+
+        structured_output = compile_structured_output(output_schema)
+        parser = structured_output.incremental_parser()
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(self.model, system_prompt, user_prompt,
+                                       output_schema)
+            if use_cache:
+                cached_response = await self._cache_get(cache_key, output_schema)
+                if cached_response is not None:
+                    for item in getattr(cached_response, structured_output.list_field):
+                        yield item
+                    return
+
+        started = time.perf_counter()
+        first_item = None
+        # Only opening the stream is retried, before any item has been yielded;
+        # hedging would generate the whole response twice
+        stream = await self._call(
+            self.model,
+            lambda: gpt_client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+                response_format=structured_output.response_format,
+                timeout=timeout or self.timeout,
+                stream=True,
+                stream_options={"include_usage": True},
+            ),
+            hedge=False)
+        content, finish_reason, refusal, usage = [], None, None, None
+        # Closed on every exit, including when the caller stops iterating early
+        async with stream:
+            async for chunk in stream:
+                usage = chunk.usage or usage
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                finish_reason = choice.finish_reason or finish_reason
+                refusal = choice.delta.refusal or refusal
+                if choice.delta.content:
+                    content.append(choice.delta.content)
+                    for item in parser.feed(choice.delta.content):
+                        if first_item is None:
+                            first_item = time.perf_counter() - started
+                        yield item
+
+        parsed_response = structured_output.adapter.validate_json(check_completion(
+            finish_reason, refusal, "".join(content) if content else None))
+        if cache_key is not None:
+            await self._cache_put(cache_key, parsed_response)
+
+        if self.router is not None:
+            self.router.record(LARGE_TIER, time.perf_counter() - started,
+                               reason=route_reason)
+        if self.metrics is not None:
+            # Time spent by the caller on each item is included; spans cannot
+            # cross the yields of a generator, so the stages are recorded here
+            self.metrics.observe_stage("llm.stream", time.perf_counter() - started)
+            if first_item is not None:
+                self.metrics.observe_stage("llm.first_item", first_item)
+            self.metrics.observe_size("llm_response",
+                                      sum(len(part.encode()) for part in content))
+            self.metrics.observe_tokens(usage.model_dump() if usage else None)
+
+    async def _cache_get(self, key: str, output_schema: Any) -> Optional[BaseModel]:
+        # Memory hits are served on the event loop; SQLite reads and the parsing
+        # of the stored response run in a thread
+        if not self.cache.persistent:
+            return self.cache.get(key, output_schema)
+        return self.cache.get_memory(key) \
+            or await run_in_threadpool(self.cache.get, key, output_schema)
+
+    async def _cache_put(self, key: str, response: BaseModel) -> None:
+        if not self.cache.persistent:
+            self.cache.put(key, response)
+        else:
+            await run_in_threadpool(self.cache.put, key, response)
+
+    async def _call(self, model: str, fn: Callable[[], Awaitable[T]],
+                    hedge: bool = True) -> T:
+        if self.resilience is None:
+            return await fn()
+        return await self.resilience.call(model, fn, hedge)
+
+    def _stage(self, name: str) -> ContextManager[Any]:
+        return self.metrics.stage(name) if self.metrics is not None else nullcontext()
+
+    async def close(self) -> None:
+        await self._http_client.aclose()
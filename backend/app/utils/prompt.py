@@ -1,18 +1,33 @@
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Optional, Tuple, List
+
+from app.utils.prompt_serializer import (CompactContextSerializer, estimate_tokens,
+                                         to_compact_json)
+
+# Placeholders whose values do not depend on the request
+STATIC_PLACEHOLDERS = {"icon_names", "possible_actions"}
 
 
 class PromptTemplate:
     """
     Encapsulates the logic for building user and system prompts based on templates.
+    Context data is serialised as compact JSON within `token_budget` tokens.
+
+    System prompts may only use static placeholders and are rendered once, when
+    the template is built, so every request sends a byte-identical system prompt
+    that provider-side prompt-prefix caching can reuse.
     """
 
     def __init__(self,
                  prompts_map: Dict[str, Dict[str, Any]],
                  icon_names: List[Dict[str, str]],
-                 possible_actions: List[Dict[str, str]]):
+                 possible_actions: List[Dict[str, str]],
+                 token_budget: Optional[int] = None):
         self.prompts_map = prompts_map
         self.icon_names = icon_names
         self.possible_actions = possible_actions
+        self.serializer = CompactContextSerializer(token_budget)
+        self.system_prompts = {prompt_key: self._render_system_prompt(prompt_key)
+                               for prompt_key in prompts_map}
 
     def generate_prompts(self,
                          prompt_key: str,
@@ -20,37 +35,73 @@ class PromptTemplate:
                          context_data: Dict[str, Any],
                          covered_areas: List[Tuple[float, float, float, float]]
                          ) -> Tuple[str, str]:
+        user_prompt, system_prompt, _ = self.generate_prompts_with_report(
+            prompt_key, request_data, context_data, covered_areas)
+        return user_prompt, system_prompt
+
+    def generate_prompts_with_report(self,
+                                     prompt_key: str,
+                                     request_data: Dict[str, Any],
+                                     context_data: Dict[str, Any],
+                                     covered_areas: List[
+                                         Tuple[float, float, float, float]]
+                                     ) -> Tuple[str, str, Dict[str, Any]]:
+        """
+        Same as `generate_prompts`, also returning the estimated token counts of
+        the prompts and how much of the context was truncated to fit the budget.
+        """
         try:
             placeholders = set(self.prompts_map[prompt_key]["user"]
                                ["placeholders_list"])
+            report = {"token_budget": self.serializer.token_budget}
             prompt_placeholders_data = self._prepare_placeholders(
-                placeholders, request_data, context_data, covered_areas
+                placeholders, request_data, context_data, covered_areas, report
             )
 
             user_prompt = (self.prompts_map[prompt_key]["user"]["prompt"].
                            format(**prompt_placeholders_data))
-            system_prompt = (self.prompts_map[prompt_key]["system"]["prompt"].
-                             format(**prompt_placeholders_data))
+            system_prompt = self.system_prompts[prompt_key]
 
-            return user_prompt, system_prompt
+            report.update({
+                "user_prompt_chars": len(user_prompt),
+                "system_prompt_chars": len(system_prompt),
+                "user_prompt_tokens": estimate_tokens(user_prompt),
+                "system_prompt_tokens": estimate_tokens(system_prompt),
+            })
+            report["total_tokens"] = (report["user_prompt_tokens"]
+                                      + report["system_prompt_tokens"])
+            return user_prompt, system_prompt, report
 
         except KeyError as e:
             raise ValueError(f"Missing required key in prompts_map: {str(e)}")
 
+    def _render_system_prompt(self, prompt_key: str) -> str:
+        system = self.prompts_map[prompt_key]["system"]
+        placeholders = set(system["placeholders_list"])
+        if not placeholders <= STATIC_PLACEHOLDERS:
+            raise ValueError(
+                f"System prompt '{prompt_key}' uses request-dependent placeholders: "
+                f"{sorted(placeholders - STATIC_PLACEHOLDERS)}")
+
+        return system["prompt"].format(
+            **self._prepare_placeholders(placeholders, {}, {}, [], {}))
+
     def _prepare_placeholders(self,
                               placeholders: set,
                               request_data: Dict[str, Any],
                               context_data: Dict[str, Any],
-                              covered_areas: List[Tuple[float, float, float, float]]
-                              ) -> Dict[str, Any]:
+                              covered_areas: List[Tuple[float, float, float, float]],
+                              report: Dict[str, Any]) -> Dict[str, Any]:
         placeholder_data = {}
 
-        if "covered_areas" in placeholders and covered_areas:
-            placeholder_data["covered_areas"] = covered_areas
+        if "covered_areas" in placeholders:
+            placeholder_data["covered_areas"] = self.serializer.covered_areas(
+                covered_areas)
         if "icon_names" in placeholders:
-            placeholder_data["icon_names"] = self.icon_names
+            placeholder_data["icon_names"] = to_compact_json(self.icon_names)
         if "possible_actions" in placeholders:
-            placeholder_data["possible_actions"] = self.possible_actions
+            placeholder_data["possible_actions"] = to_compact_json(
+                self.possible_actions)
 
         if request_data:
             if "user_instruction" in placeholders:
@@ -62,22 +113,28 @@ class PromptTemplate:
                         shape_info[0].get("name", ""))
 
         if context_data:
-            self._add_context_data(placeholders, placeholder_data, context_data)
+            self._add_context_data(placeholders, placeholder_data, context_data, report)
 
         return placeholder_data
 
     def _add_context_data(self,
                           placeholders: set,
                           placeholder_data: Dict[str, Any],
-                          context_data: Dict[str, Any]) -> None:
+                          context_data: Dict[str, Any],
+                          report: Dict[str, Any]) -> None:
         if "context_data" in placeholders:
-            placeholder_data["context_data"] = context_data
+            placeholder_data["context_data"], context_report = \
+                self.serializer.context(context_data)
+            report.update(context_report)
+        if "free_areas" in placeholders:
+            placeholder_data["free_areas"] = self.serializer.covered_areas(
+                context_data.get("layout", {}).get("free_areas"))
         if "slide_width" in placeholders:
-            placeholder_data["slide_width"] = (
-                context_data)["presentation_info"]["slide_width"]
+            placeholder_data["slide_width"] = round(
+                context_data["presentation_info"]["slide_width"], 1)
         if "slide_height" in placeholders:
-            placeholder_data["slide_height"] = (
-                context_data)["presentation_info"]["slide_height"]
+            placeholder_data["slide_height"] = round(
+                context_data["presentation_info"]["slide_height"], 1)
 
         if context_data.get("selected_shape"):
             all_shapes = context_data["shapes"]
@@ -85,21 +142,17 @@ class PromptTemplate:
             selected_shape_info = context_data["selected_shape"]["info"]
 
             if "shape_left" in placeholders:
-                placeholder_data["shape_left"] = all_shapes[shape_relative_idx]["left"]
+                placeholder_data["shape_left"] = self.serializer.mm(
+                    all_shapes[shape_relative_idx]["left"])
             if "shape_top" in placeholders:
-                placeholder_data["shape_top"] = all_shapes[shape_relative_idx]["top"]
+                placeholder_data["shape_top"] = self.serializer.mm(
+                    all_shapes[shape_relative_idx]["top"])
             if "shape_width" in placeholders:
-                placeholder_data["shape_width"] = (
-                    all_shapes)[shape_relative_idx]["width"]
+                placeholder_data["shape_width"] = self.serializer.mm(
+                    all_shapes[shape_relative_idx]["width"])
             if "shape_height" in placeholders:
-                placeholder_data["shape_height"] = (
-                    all_shapes)[shape_relative_idx]["height"]
+                placeholder_data["shape_height"] = self.serializer.mm(
+                    all_shapes[shape_relative_idx]["height"])
             if "shape_data" in placeholders:
-                placeholder_data["shape_data"] = {
-                    "shape_name": selected_shape_info["name"],
-                    "shape_type": selected_shape_info["shape_type"],
-                    "shape_left": selected_shape_info["left"],
-                    "shape_top": selected_shape_info["top"],
-                    "shape_width": selected_shape_info["width"],
-                    "shape_height": selected_shape_info["height"],
-                }
+                placeholder_data["shape_data"] = to_compact_json(
+                    self.serializer.shape(selected_shape_info))
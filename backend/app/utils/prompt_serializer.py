@@ -0,0 +1,103 @@
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pptx.util import Emu
+
+# Rough size of a token for English text and JSON, used to estimate prompt tokens
+CHARS_PER_TOKEN = 4
+
+# Per-shape text limits (characters) tried in turn until the context fits the budget
+TEXT_LIMITS = (400, 200, 100, 50, 20, 0)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def to_compact_json(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+class CompactContextSerializer:
+    """
+    Serialises slide context for prompts as minified JSON: positions and sizes in
+    millimetres rounded to 0.1, shape types as short lowercase codes, and only
+    the fields the model needs. When the context exceeds `token_budget`, the
+    text of shapes other than the selected one is truncated step by step.
+    """
+
+    def __init__(self, token_budget: Optional[int] = None):
+        self.token_budget = token_budget
+
+    def context(self, context_data: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Return the compact CONTEXT_DATA and a report with its estimated tokens, the
+        number of truncated text frames and whether it still exceeds the budget.
+        """
+        selected_shape = context_data.get("selected_shape") or {}
+        selected_index = selected_shape.get("relative")
+        shapes = context_data.get("shapes", [])
+
+        serialized, truncated_shapes = self._serialize_shapes(shapes, selected_index)
+        if self.token_budget:
+            for text_limit in TEXT_LIMITS:
+                if estimate_tokens(serialized) <= self.token_budget:
+                    break
+                serialized, truncated_shapes = self._serialize_shapes(
+                    shapes, selected_index, text_limit)
+
+        context_tokens = estimate_tokens(serialized)
+        return serialized, {
+            "context_tokens": context_tokens,
+            "truncated_shapes": truncated_shapes,
+            "over_budget": bool(self.token_budget)
+            and context_tokens > self.token_budget,
+        }
+
+    def shape(self,
+              shape_info: Dict[str, Any],
+              text_limit: Optional[int] = None) -> Dict[str, Any]:
+        compact_shape = {
+            "name": shape_info["name"],
+            "type": self.shape_type(shape_info.get("shape_type")),
+            "left": self.mm(shape_info["left"]),
+            "top": self.mm(shape_info["top"]),
+            "width": self.mm(shape_info["width"]),
+            "height": self.mm(shape_info["height"]),
+        }
+        text = shape_info.get("text")
+        if text:
+            text = " ".join(text.split())
+            if text_limit is not None and len(text) > text_limit:
+                compact_shape["text_chars"] = len(text)
+                text = text[:text_limit].rstrip()
+            if text:
+                compact_shape["text"] = text
+        return compact_shape
+
+    @staticmethod
+    def covered_areas(covered_areas: Sequence[Sequence[float]]) -> str:
+        return to_compact_json([[round(value, 1) for value in area]
+                                for area in covered_areas or []])
+
+    @staticmethod
+    def shape_type(shape_type: Any) -> Optional[str]:
+        if shape_type is None:
+            return None
+        return getattr(shape_type, "name", str(shape_type)).lower()
+
+    @staticmethod
+    def mm(emu: Optional[int]) -> Optional[float]:
+        return round(Emu(emu).mm, 1) if emu is not None else None
+
+    def _serialize_shapes(self,
+                          shapes: List[Dict[str, Any]],
+                          selected_index: Optional[int],
+                          text_limit: Optional[int] = None) -> Tuple[str, int]:
+        compact_shapes = [
+            self.shape(shape_info, None if index == selected_index else text_limit)
+            for index, shape_info in enumerate(shapes)
+        ]
+        truncated_shapes = sum("text_chars" in shape for shape in compact_shapes)
+        return to_compact_json({"shapes": compact_shapes}), truncated_shapes
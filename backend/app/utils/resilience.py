@@ -0,0 +1,345 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, TypeVar
+
+import httpx
+import openai
+
+from app.utils.metrics import MetricsRegistry
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Successful calls observed before hedging starts, so the delay is a real p95
+HEDGE_MIN_SAMPLES = 20
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised without calling the endpoint while its circuit breaker is open.
+    """
+
+    def __init__(self, key: Hashable, retry_after: float):
+        super().__init__(f"Circuit breaker of {key} is open, "
+                         f"retry in {retry_after:.1f} s")
+        self.key = key
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Timeouts, connection errors, `429` and `5xx` responses may succeed on
+    another attempt; other errors, e.g. a rejected request, would fail again.
+    """
+    if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError,
+                          httpx.TransportError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class RetryBudget:
+    """
+    Token bucket shared by retries and hedged attempts: every call deposits
+    `ratio` of a token and every extra attempt takes one, so extra attempts stay
+    within `ratio` of the calls once the `reserve` is spent, instead of
+    multiplying the load on an endpoint that is already struggling.
+    """
+
+    def __init__(self, ratio: float, reserve: float = 10.0):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.tokens = reserve
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self.tokens = min(self.reserve, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                self.exhausted += 1
+                return False
+            self.tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures, rejecting calls for
+    `reset_seconds`, then lets a single probe through: its success closes the
+    breaker, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opens = 0
+        self._changed_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> float:
+        """
+        Returns 0 if a call may go ahead, or the seconds until one may.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return 0.0
+            # A probe whose caller went away without an outcome is replaced
+            remaining = self._changed_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                return remaining
+            self.state = HALF_OPEN
+            self._changed_at = time.monotonic()
+            return 0.0
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (
+                    self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opens += 1
+                self._changed_at = time.monotonic()
+
+
+class LatencyWindow:
+    """
+    Latencies of the last `size` successful calls.
+    """
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < max(min_samples, 1):
+                return None
+            samples = sorted(self._samples)
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+class ResilientCaller:
+    """
+    Calls an endpoint with a deadline per attempt and retries failed attempts
+    that may succeed on another one, after a jittered exponential backoff, while
+    the shared `RetryBudget` allows. With `hedge`, a second attempt is started
+    once the first has taken longer than the `hedge_quantile` of recent calls,
+    and the first to succeed wins. Each endpoint (`key`) has a circuit breaker
+    failing calls fast while it keeps failing.
+    """
+
+    def __init__(self,
+                 name: str,
+                 attempt_timeout: float,
+                 max_attempts: int = 3,
+                 backoff_seconds: float = 0.2,
+                 backoff_max_seconds: float = 2.0,
+                 budget_ratio: float = 0.2,
+                 hedge: bool = False,
+                 hedge_quantile: float = 0.95,
+                 breaker_failures: int = 5,
+                 breaker_reset_seconds: float = 30.0,
+                 metrics: Optional[MetricsRegistry] = None):
+        self.name = name
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.breaker_failures = breaker_failures
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.budget = RetryBudget(budget_ratio)
+        self._breakers: Dict[Hashable, CircuitBreaker] = {}
+        self._latencies: Dict[Hashable, LatencyWindow] = {}
+        self._outcomes: Dict[Hashable, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._metric = metrics.counter(
+            "resilient_calls", "Attempts and outcomes of calls per endpoint.",
+            ("name", "key", "outcome")) if metrics is not None else None
+
+    async def call(self, key: Hashable, fn: Callable[[], Awaitable[T]],
+                   hedge: bool = True) -> T:
+        """
+        Returns the result of `fn`, called once per attempt, or raises the error
+        of the last attempt, or `CircuitOpenError` without calling it.
+        `hedge=False` disables hedging, e.g. for calls with side effects.
+        """
+        breaker = self._breaker(key)
+        retry_after = breaker.allow()
+        if retry_after:
+            self._count(key, "rejected")
+            raise CircuitOpenError(key, retry_after)
+        self.budget.deposit()
+
+        attempt = 1
+        while True:
+            try:
+                result = await self._attempt(key, fn, hedge and self.hedge)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The endpoint answered, so it is not the one failing
+                    breaker.record_success()
+                    self._count(key, "error")
+                    raise
+                breaker.record_failure()
+                self._count(key, "timeout" if isinstance(e, asyncio.TimeoutError)
+                            else "failure")
+                if attempt >= self.max_attempts:
+                    raise
+                if not self.budget.withdraw():
+                    self._count(key, "budget_exhausted")
+                    raise
+                retry_after = breaker.allow()
+                if retry_after:
+                    self._count(key, "rejected")
+                    raise CircuitOpenError(key, retry_after) from e
+
+                self._count(key, "retried")
+                # Full jitter spreads the retries of concurrent callers apart
+                await asyncio.sleep(random.uniform(0, min(
+                    self.backoff_max_seconds,
+                    self.backoff_seconds * 2 ** (attempt - 1))))
+                attempt += 1
+                continue
+
+            breaker.record_success()
+            self._count(key, "success")
+            return result
+
+    def hedge_delay(self, key: Hashable) -> Optional[float]:
+        """
+        Seconds after which a hedged attempt is started, or `None` until enough
+        calls have been observed.
+        """
+        return self._latency(key).quantile(self.hedge_quantile, HEDGE_MIN_SAMPLES)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = list(self._breakers)
+            outcomes = {key: dict(counts) for key, counts in self._outcomes.items()}
+        return {
+            "attempt_timeout": self.attempt_timeout,
+            "max_attempts": self.max_attempts,
+            "hedge": self.hedge,
+            "hedge_quantile": self.hedge_quantile,
+            "budget": {
+                "ratio": self.budget.ratio,
+                "tokens": round(self.budget.tokens, 2),
+                "exhausted": self.budget.exhausted,
+            },
+            "endpoints": {
+                str(key): {
+                    "state": self._breakers[key].state,
+                    "consecutive_failures": self._breakers[key].failures,
+                    "opens": self._breakers[key].opens,
+                    "p50_seconds": self._latency(key).quantile(0.5),
+                    "hedge_delay_seconds": self.hedge_delay(key),
+                    "outcomes": outcomes.get(key, {}),
+                }
+                for key in keys
+            },
+        }
+
+    async def _attempt(self, key: Hashable, fn: Callable[[], Awaitable[T]],
+                       hedge: bool) -> T:
+        started = time.perf_counter()
+        first = self._start(fn)
+        # Start and deadline of each attempt still running
+        starts = {first: started}
+        deadlines = {first: started + self.attempt_timeout}
+        delay = self.hedge_delay(key) if hedge else None
+        hedge_at = started + delay if delay is not None else None
+        error: BaseException = asyncio.TimeoutError()
+        try:
+            while deadlines:
+                now = time.perf_counter()
+                if hedge_at is not None and now >= hedge_at:
+                    hedge_at = None
+                    if self.budget.withdraw():
+                        self._count(key, "hedged")
+                        hedged = self._start(fn)
+                        starts[hedged] = now
+                        deadlines[hedged] = now + self.attempt_timeout
+                wake_at = min(deadlines.values())
+                if hedge_at is not None:
+                    wake_at = min(wake_at, hedge_at)
+                done, _ = await asyncio.wait(deadlines, timeout=max(wake_at - now, 0),
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                winner = None
+                for task in done:
+                    del deadlines[task]
+                    if task.exception() is None:
+                        winner = task
+                    else:
+                        error = task.exception()
+                if winner is not None:
+                    # The winner's own latency, so hedging does not inflate the p95
+                    self._latency(key).observe(time.perf_counter() - starts[winner])
+                    if winner is not first:
+                        self._count(key, "hedge_won")
+                    return winner.result()
+
+                now = time.perf_counter()
+                for task, deadline in list(deadlines.items()):
+                    if deadline <= now:
+                        task.cancel()
+                        del deadlines[task]
+                        error = asyncio.TimeoutError()
+            raise error
+        finally:
+            for task in deadlines:
+                task.cancel()
+
+    @staticmethod
+    def _start(fn: Callable[[], Awaitable[T]]) -> "asyncio.Future[T]":
+        task = asyncio.ensure_future(fn())
+        # A losing attempt may fail after its result is no longer awaited
+        task.add_done_callback(
+            lambda done: done.cancelled() or done.exception())
+        return task
+
+    def _breaker(self, key: Hashable) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(key, CircuitBreaker(
+                    self.breaker_failures, self.breaker_reset_seconds))
+        return breaker
+
+    def _latency(self, key: Hashable) -> LatencyWindow:
+        latency = self._latencies.get(key)
+        if latency is None:
+            with self._lock:
+                latency = self._latencies.setdefault(key, LatencyWindow())
+        return latency
+
+    def _count(self, key: Hashable, outcome: str) -> None:
+        with self._lock:
+            counts = self._outcomes.setdefault(key, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+        if self._metric is not None:
+            self._metric.inc(name=self.name, key=str(key), outcome=outcome)
@@ -0,0 +1,71 @@
+import json
+import zlib
+from typing import Any, AsyncIterator
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, JSONResponse, Response
+from starlette.types import Receive, Scope, Send
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    `JSONResponse` rendered with orjson when it is installed, otherwise with
+    compact stdlib JSON. Return it directly from a route to also skip FastAPI's
+    `jsonable_encoder` pass; the content must then be JSON-native.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content,
+                          ensure_ascii=False,
+                          allow_nan=False,
+                          separators=(",", ":")).encode("utf-8")
+
+
+class SlideFileResponse(FileResponse):
+    """
+    `FileResponse` (ETag, Last-Modified and Range support, the file read in
+    chunks) that also answers `If-None-Match` with 304.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        if if_none_match and self._etag_matches(if_none_match):
+            not_modified = self.not_modified(self.headers["etag"],
+                                             self.headers["last-modified"])
+            return await not_modified(scope, receive, send)
+
+        await super().__call__(scope, receive, send)
+
+    @staticmethod
+    def not_modified(etag: str, last_modified: str) -> Response:
+        return Response(status_code=304,
+                        headers={"etag": etag, "last-modified": last_modified})
+
+    def _etag_matches(self, if_none_match: str) -> bool:
+        if if_none_match.strip() == "*":
+            return True
+        etag = self.headers.get("etag")
+        return any(candidate.strip().removeprefix("W/") == etag
+                   for candidate in if_none_match.split(","))
+
+
+async def gzip_file_chunks(path: str,
+                           chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """
+    Stream `path` gzip-compressed without holding the whole file in memory.
+    """
+    compressor = zlib.compressobj(wbits=31)
+    async with await anyio.open_file(path, mode="rb") as file:
+        while chunk := await file.read(chunk_size):
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+    yield compressor.flush()
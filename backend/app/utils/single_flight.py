@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from app.utils.metrics import MetricsRegistry
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first call runs, later
+    ones await its result, or its exception, instead of repeating the work.
+    Calls arriving after it has finished run again.
+
+    The shared call runs as a task of its own, so a caller that is cancelled,
+    e.g. because its client disconnected, does not cancel it for the others;
+    it is cancelled once no caller awaits it any more.
+    """
+
+    def __init__(self, name: str, metrics: Optional[MetricsRegistry] = None):
+        self.name = name
+        self._calls: Dict[Hashable, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self._metric = metrics.counter(
+            "single_flight_calls", "Calls run or coalesced with one in flight.",
+            ("name", "result")) if metrics is not None else None
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(fn())
+            call = self._calls[key] = {"task": task, "waiters": 0}
+            task.add_done_callback(lambda _: self._forget(key, call))
+            task.add_done_callback(self._retrieve_exception)
+            self._count("leader")
+        else:
+            self._count("coalesced")
+
+        call["waiters"] += 1
+        try:
+            return await asyncio.shield(call["task"])
+        finally:
+            call["waiters"] -= 1
+            if not call["waiters"] and not call["task"].done():
+                # Later calls with this key start afresh instead of joining it
+                self._forget(key, call)
+                call["task"].cancel()
+                with self._lock:
+                    self.cancelled += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "cancelled": self.cancelled,
+            }
+
+    def _forget(self, key: Hashable, call: Dict[str, Any]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    @staticmethod
+    def _retrieve_exception(task: "asyncio.Future[Any]") -> None:
+        # Its callers may all have left, leaving the exception unretrieved
+        if not task.cancelled():
+            task.exception()
+
+    def _count(self, result: str) -> None:
+        with self._lock:
+            if result == "leader":
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if self._metric is not None:
+            self._metric.inc(name=self.name, result=result)
@@ -0,0 +1,187 @@
+import re
+from functools import lru_cache
+from typing import (Any, Dict, Generic, List, Optional, Tuple, Type, TypeVar,
+                    get_args, get_origin)
+
+from openai import pydantic_function_tool
+from pydantic import BaseModel, TypeAdapter
+
+SchemaT = TypeVar("SchemaT", bound=BaseModel)
+ItemT = TypeVar("ItemT")
+
+# Characters that change the nesting or string state of a JSON text
+_JSON_STRUCTURE = re.compile(r'[\\"{}\[\]]')
+
+
+class _CompletionMessage(BaseModel):
+    content: Optional[str] = None
+    refusal: Optional[str] = None
+
+
+class _CompletionChoice(BaseModel):
+    finish_reason: Optional[str] = None
+    message: _CompletionMessage
+
+
+class _CompletionUsage(BaseModel):
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+
+class _Completion(BaseModel):
+    choices: List[_CompletionChoice]
+    usage: Optional[_CompletionUsage] = None
+
+
+# Only the fields needed to reach the structured content are validated
+_COMPLETION_ADAPTER = TypeAdapter(_Completion)
+
+
+def check_completion(finish_reason: Optional[str],
+                     refusal: Optional[str],
+                     content: Optional[str]) -> str:
+    """
+    Returns the content of a completion choice, raising `ValueError` if the
+    completion was cut short or refused.
+    """
+    if finish_reason in ("length", "content_filter"):
+        raise ValueError(f"Completion stopped early: {finish_reason}")
+    if refusal:
+        raise ValueError(f"Completion refused: {refusal}")
+    if content is None:
+        raise ValueError("Completion has no content")
+    return content
+
+
+class IncrementalListParser(Generic[ItemT]):
+    """
+    Parses the streamed JSON of an object holding one list, e.g.
+    `{"actions": [{...}, {...}]}`, returning each list item as soon as its
+    closing brace arrives. Only the text of the item being generated is kept.
+    """
+
+    def __init__(self, item_adapter: TypeAdapter):
+        self.item_adapter = item_adapter
+        self._buffer = ""
+        self._depth = 0
+        self._in_string = False
+        self._in_list = False
+        self._item_start: Optional[int] = None
+        # Buffer position before which an escaped character is skipped
+        self._skip_to = 0
+
+    def feed(self, chunk: str) -> List[ItemT]:
+        items = []
+        offset = len(self._buffer)
+        self._buffer += chunk
+        for match in _JSON_STRUCTURE.finditer(self._buffer, offset):
+            position = match.start()
+            if position < self._skip_to:
+                continue
+
+            char = match.group()
+            if self._in_string:
+                if char == "\\":
+                    self._skip_to = position + 2
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 2 and char == "[":
+                    self._in_list = True
+                elif self._depth == 3 and self._in_list and char == "{":
+                    self._item_start = position
+            else:
+                if self._depth == 3 and char == "}" and self._item_start is not None:
+                    items.append(self.item_adapter.validate_json(
+                        self._buffer[self._item_start:position + 1]))
+                    self._item_start = None
+                elif self._depth == 2 and char == "]":
+                    self._in_list = False
+                self._depth -= 1
+
+        trimmed = self._item_start if self._item_start is not None \
+            else len(self._buffer)
+        self._buffer = self._buffer[trimmed:]
+        self._skip_to = max(self._skip_to - trimmed, 0)
+        if self._item_start is not None:
+            self._item_start = 0
+        return items
+
+
+class StructuredOutput(Generic[SchemaT]):
+    """
+    The `response_format` request parameter and the validator of a structured
+    output schema, built once instead of on every completion call.
+    """
+
+    def __init__(self, schema: Type[SchemaT]):
+        self.schema = schema
+        self.response_format: Dict[str, Any] = self._response_format(schema)
+        self.adapter: TypeAdapter[SchemaT] = TypeAdapter(schema)
+        self.list_field, item_type = self._list_field(schema)
+        self.item_adapter = TypeAdapter(item_type) if item_type is not None else None
+
+    def decode_completion(self, body: bytes) -> SchemaT:
+        """
+        Decode a raw chat-completion response body straight into the schema.
+
+        Raises `ValueError` if the completion was cut short, refused or does not
+        match the schema.
+        """
+        return self.decode_completion_with_usage(body)[0]
+
+    def decode_completion_with_usage(self, body: bytes
+                                     ) -> Tuple[SchemaT, Optional[Dict[str, int]]]:
+        """
+        Same as `decode_completion`, also returning the token usage reported in
+        the body, if any.
+        """
+        completion = _COMPLETION_ADAPTER.validate_json(body)
+        if not completion.choices:
+            raise ValueError("Completion has no choices")
+
+        choice = completion.choices[0]
+        parsed = self.adapter.validate_json(check_completion(
+            choice.finish_reason, choice.message.refusal, choice.message.content))
+        return parsed, completion.usage.model_dump() if completion.usage else None
+
+    def incremental_parser(self) -> IncrementalListParser:
+        """
+        A parser returning the items of the schema's list field as they stream in.
+        """
+        if self.item_adapter is None:
+            raise ValueError(f"{self.schema.__name__} has no single list field "
+                             f"to stream")
+        return IncrementalListParser(self.item_adapter)
+
+    @staticmethod
+    def _response_format(schema: Type[BaseModel]) -> Dict[str, Any]:
+        # The strict JSON schema of the public function-tool helper is the one
+        # the SDK sends for `response_format=schema`; responses are validated
+        # with `adapter`
+        function = pydantic_function_tool(schema)["function"]
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "schema": function["parameters"],
+                "name": function["name"],
+                "strict": True,
+            },
+        }
+
+    @staticmethod
+    def _list_field(schema: Type[BaseModel]) -> Tuple[Optional[str], Optional[Any]]:
+        if len(schema.model_fields) != 1:
+            return None, None
+        name, field = next(iter(schema.model_fields.items()))
+        if get_origin(field.annotation) is not list:
+            return None, None
+        return name, get_args(field.annotation)[0]
+
+
+@lru_cache(maxsize=None)
+def compile_structured_output(schema: Type[SchemaT]) -> StructuredOutput[SchemaT]:
+    return StructuredOutput(schema)
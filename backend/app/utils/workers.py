@@ -0,0 +1,188 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.utils.metrics import MetricsRegistry
+
+_local = threading.local()
+
+
+@contextmanager
+def timed_stage(name: str) -> Iterator[None]:
+    """
+    Time a sub-stage of the function currently running on a `WorkerPool`; the
+    duration is reported under `<stage>.<name>` in the pool statistics.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = getattr(_local, "timings", None)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def _run_timed(fn: Callable, args: Tuple, kwargs: Dict[str, Any]):
+    _local.timings = {}
+    started = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        return result, started, time.perf_counter(), _local.timings
+    finally:
+        _local.timings = None
+
+
+class WorkerPool:
+    """
+    Bounded thread or process pool for blocking presentation work. Calls beyond
+    `max_workers + max_queue` in flight are rejected with 429 instead of queueing
+    without limit. Stage timings are also recorded in `metrics` when given.
+    """
+
+    def __init__(self,
+                 kind: str = "thread",
+                 max_workers: Optional[int] = None,
+                 max_queue: Optional[int] = None,
+                 metrics: Optional[MetricsRegistry] = None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unsupported worker pool kind: {kind}")
+
+        self.kind = kind
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.max_queue = max_queue if max_queue is not None else 2 * self.max_workers
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+        self.metrics = metrics
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="ppt-worker")
+        return self._executor
+
+    async def run(self, stage: str, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run `fn(*args, **kwargs)` on the pool and record its queue wait and run
+        time under `stage`. With a process pool, `fn` and its arguments must be
+        picklable.
+        """
+        self._admit()
+        try:
+            return await self._execute(stage, fn, args, kwargs)
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator["WorkerSession"]:
+        """
+        Admit a sequence of calls as one: the session counts as a single call in
+        flight until it ends, and its calls are not rejected, but no worker is
+        held between them. Use it for work driven by a stream, e.g. actions
+        applied while they are generated.
+        """
+        self._admit()
+        try:
+            yield WorkerSession(self)
+        finally:
+            self._release()
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="Server is busy processing presentations, retry shortly",
+                    headers={"Retry-After": "1"}
+                )
+            self._in_flight += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    async def _execute(self, stage: str, fn: Callable, args: Tuple,
+                       kwargs: Dict[str, Any]) -> Any:
+        submitted = time.perf_counter()
+        if self.metrics is None:
+            result, started, finished, sub_stages = \
+                await asyncio.get_running_loop().run_in_executor(
+                    self.executor, _run_timed, fn, args, kwargs)
+        else:
+            with self.metrics.span(f"worker.{stage}", pool=self.kind):
+                result, started, finished, sub_stages = \
+                    await asyncio.get_running_loop().run_in_executor(
+                        self.executor, _run_timed, fn, args, kwargs)
+
+        self._record(stage, max(started - submitted, 0.0), finished - started)
+        for name, seconds in sub_stages.items():
+            self._record(f"{stage}.{name}", None, seconds)
+        return result
+
+    def _record(self, stage: str, queue_seconds: Optional[float],
+                run_seconds: float) -> None:
+        if self.metrics is not None:
+            self.metrics.observe_stage(stage, run_seconds, queue_seconds)
+        queue_seconds = queue_seconds or 0.0
+        with self._lock:
+            timings = self._stages.setdefault(stage, {
+                "count": 0,
+                "queue_seconds_total": 0.0,
+                "run_seconds_total": 0.0,
+                "run_seconds_max": 0.0,
+            })
+            timings["count"] += 1
+            timings["queue_seconds_total"] += queue_seconds
+            timings["run_seconds_total"] += run_seconds
+            timings["run_seconds_max"] = max(timings["run_seconds_max"], run_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "rejected": self.rejected,
+                "stages": {
+                    stage: {
+                        **timings,
+                        "queue_seconds_avg": timings["queue_seconds_total"]
+                        / timings["count"],
+                        "run_seconds_avg": timings["run_seconds_total"]
+                        / timings["count"],
+                    }
+                    for stage, timings in self._stages.items()
+                },
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class WorkerSession:
+    """
+    Runs the calls of a `WorkerPool.session` without further admission checks.
+    """
+
+    def __init__(self, pool: WorkerPool):
+        self.pool = pool
+
+    async def run(self, stage: str, fn: Callable, *args, **kwargs) -> Any:
+        return await self.pool._execute(stage, fn, args, kwargs)
@@ -0,0 +1,91 @@
+"""
+Wall time and deck loads/saves of applying one instruction to 5 and 20 slides
+through one `/process` request per slide against a single `/process/batch`
+request, with LLM calls answered by the local stub.
+
+Usage (from the backend directory, with the variables of `.env` set):
+    python -m benchmarks.batch_process
+"""
+import hashlib
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.config.settings import Settings
+from app.main import app
+from app.utils.openai import AsyncOpenAIChatService
+from benchmarks.decks import generate_deck
+from benchmarks.stub_llm import StubLLMServer
+
+API_VERSION = "2024-08-01-preview"
+STUB_LATENCY = 0.2
+SLIDE_COUNTS = (5, 20)
+NO_CACHE = {"cache-control": "no-cache"}
+
+
+def _stage_counts():
+    stages = Settings.WORKER_POOL.stats()["stages"]
+    return {stage: stages.get(stage, {}).get("count", 0)
+            for stage in ("context.load", "actions.save")}
+
+
+def main() -> None:
+    print(f"stub latency {STUB_LATENCY * 1000:.0f} ms, "
+          f"batch concurrency {Settings.BATCH_LLM_CONCURRENCY}")
+    print(f"{'slides':>6} {'path':>11} {'wall s':>7} {'loads':>5} {'saves':>5} "
+          f"{'LLM calls':>9}")
+    with StubLLMServer(latency=STUB_LATENCY) as stub, \
+            tempfile.TemporaryDirectory() as directory, TestClient(app) as client:
+        service = AsyncOpenAIChatService(
+            f"{stub.url}/openai/deployments/stub/chat/completions"
+            f"?api-version={API_VERSION}",
+            "stub-key", API_VERSION, "stub")
+        Settings.GPT_ASYNC_SERVICE = service
+        Settings.GPT_ASYNC_CLIENT = service._get_azure_client()
+
+        for slide_count in SLIDE_COUNTS:
+            deck_path = generate_deck(
+                str(Path(directory) / f"deck_{slide_count}.pptx"), slide_count)
+            blob = Path(deck_path).read_bytes()
+            document_id = client.post(
+                "/upload",
+                files={"presentation": ("deck.pptx", blob)},
+                data={"checksum": hashlib.sha256(blob).hexdigest()}
+            ).json()["document_id"]
+            body = {"documentId": document_id, "prompt": "Add a summary"}
+
+            def per_slide():
+                for slide_index in range(slide_count):
+                    response = client.post(
+                        "/process",
+                        json={**body, "slidesInfo": [{"index": slide_index}]},
+                        headers=NO_CACHE)
+                    assert response.status_code == 200, response.text
+
+            def batch():
+                response = client.post(
+                    "/process/batch",
+                    json={**body, "targets": [{"slidesInfo": [{"index": slide_index}]}
+                                              for slide_index in range(slide_count)]},
+                    headers=NO_CACHE)
+                assert response.status_code == 200, response.text
+                assert all(result["status"] == "applied"
+                           for result in response.json()["results"])
+
+            for name, run in (("per slide", per_slide), ("batch", batch)):
+                stages_before = _stage_counts()
+                served_before = stub.requests_served
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+                stages = {stage: count - stages_before[stage]
+                          for stage, count in _stage_counts().items()}
+                print(f"{slide_count:>6} {name:>11} {elapsed:>7.2f} "
+                      f"{stages['context.load']:>5} {stages['actions.save']:>5} "
+                      f"{stub.requests_served - served_before:>9}")
+
+
+if __name__ == "__main__":
+    main()
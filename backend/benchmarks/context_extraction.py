@@ -0,0 +1,57 @@
+"""
+Cold-path latency and process peak RSS of slide context extraction, comparing the full
+python-pptx load against the lazy single-slide reader.
+
+Usage (from the backend directory):
+    python -m benchmarks.context_extraction
+"""
+import multiprocessing
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.decks import generate_deck
+from benchmarks.utils import peak_rss_kib
+
+SLIDE_COUNTS = (10, 100, 500)
+RUNS = 5
+
+
+def _measure(presentation_path: str, slide_index: int, lazy: bool, results) -> None:
+    from app.services.ppt.context import PresentationContext
+
+    started = time.perf_counter()
+    PresentationContext(presentation_path, lazy=lazy).get_slide_context(slide_index)
+    elapsed = time.perf_counter() - started
+    results.put((elapsed, peak_rss_kib()))
+
+
+def _cold_run(presentation_path: str, slide_index: int, lazy: bool):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_measure,
+                              args=(presentation_path, slide_index, lazy, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main() -> None:
+    print(f"{'slides':>6} {'mode':>5} {'latency ms':>11} {'peak RSS KiB':>13}")
+    with tempfile.TemporaryDirectory() as directory:
+        for slide_count in SLIDE_COUNTS:
+            presentation_path = generate_deck(
+                str(Path(directory) / f"deck_{slide_count}.pptx"), slide_count)
+            for lazy in (False, True):
+                runs = [_cold_run(presentation_path, slide_count // 2, lazy)
+                        for _ in range(RUNS)]
+                latency = statistics.median(run[0] for run in runs) * 1000
+                rss = statistics.median(run[1] for run in runs)
+                print(f"{slide_count:>6} {'lazy' if lazy else 'full':>5} "
+                      f"{latency:>11.1f} {rss:>13,.0f}")
+
+
+if __name__ == "__main__":
+    main()
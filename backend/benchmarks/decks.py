@@ -0,0 +1,49 @@
+import io
+import os
+from pathlib import Path
+
+from PIL import Image
+from pptx import Presentation
+from pptx.util import Mm
+
+ICON_PATH = Path(__file__).resolve().parent.parent / "resources" / "icons" / "gear.png"
+
+
+def _noise_png(size_bytes: int) -> io.BytesIO:
+    """
+    Build an incompressible PNG of roughly `size_bytes` so media dominates the deck.
+    """
+    side = max(int((size_bytes / 3) ** 0.5), 1)
+    image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    stream = io.BytesIO()
+    image.save(stream, format="PNG")
+    stream.seek(0)
+    return stream
+
+
+def generate_deck(path: str,
+                  slide_count: int,
+                  shapes_per_slide: int = 5,
+                  media_bytes: int = 0) -> str:
+    """
+    Generate a synthetic deck with a title/body layout, `shapes_per_slide` text
+    boxes, one icon and, when `media_bytes` is set, one unique picture per slide.
+    """
+    presentation = Presentation()
+    for slide_number in range(slide_count):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = f"Slide {slide_number + 1}"
+        slide.placeholders[1].text = "Lorem ipsum dolor sit amet. " * 10
+
+        for shape_number in range(shapes_per_slide):
+            textbox = slide.shapes.add_textbox(
+                Mm(10 + shape_number * 25), Mm(150), Mm(20), Mm(10))
+            textbox.text_frame.text = f"Box {shape_number + 1}"
+
+        slide.shapes.add_picture(str(ICON_PATH), Mm(220), Mm(10), Mm(20), Mm(20))
+        if media_bytes:
+            slide.shapes.add_picture(
+                _noise_png(media_bytes), Mm(150), Mm(60), Mm(80), Mm(60))
+
+    presentation.save(path)
+    return path
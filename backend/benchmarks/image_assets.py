@@ -0,0 +1,107 @@
+"""
+Time to place icons and an attached image on every slide of a deck, through
+`shapes.add_picture` with a file path, which reads, hashes and decodes the image
+for every picture, vs. `ImageAssetCache.add_picture` with images decoded once.
+
+Fails with an AssertionError if both paths do not produce the same pictures
+(name, description, position, size and image) and the same image parts, so it
+doubles as a regression check:
+    python -m benchmarks.image_assets
+(from the backend directory).
+"""
+import copy
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from pptx import Presentation
+from pptx.util import Mm
+
+from app.constants import ICONS, ICONS_DIRECTORY
+from app.services.ppt.images import ImageAssetCache
+from benchmarks.decks import _noise_png, generate_deck
+
+# (slides, media bytes per slide of the deck)
+DECKS = ((10, 0), (100, 0), (20, 256 * 1024))
+ATTACHED_BYTES = 256 * 1024
+RUNS = 5
+
+
+def _pictures(presentation) -> Tuple[List[Tuple], List[str]]:
+    pictures = [
+        (slide_index, shape.name, shape._element.nvPicPr.cNvPr.get("descr"),
+         shape.left, shape.top, shape.width, shape.height, shape.image.sha1)
+        for slide_index, slide in enumerate(presentation.slides)
+        for shape in slide.shapes if shape.shape_type == 13
+    ]
+    image_parts = sorted(f"{part.partname} {part.sha1}"
+                         for part in presentation.part.package._image_parts)
+    return pictures, image_parts
+
+
+def _place(presentation, add_picture: Callable, icons: List[str],
+           attached_path: str) -> float:
+    started = time.perf_counter()
+    for slide in presentation.slides:
+        for index, icon in enumerate(icons):
+            add_picture(slide.shapes, ("icon", icon),
+                        Mm(10 + index * 25), Mm(120), Mm(20), Mm(20))
+        add_picture(slide.shapes, ("image", attached_path),
+                    Mm(150), Mm(60), Mm(80), None)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    icons_directory = Path(__file__).resolve().parent.parent / ICONS_DIRECTORY
+    icons = [Path(icon["name"]).stem for icon in ICONS]
+    assets = ImageAssetCache(str(icons_directory), ICONS, 8, 64 * 1024 * 1024)
+    started = time.perf_counter()
+    assets.preload_icons()
+    preload_ms = (time.perf_counter() - started) * 1000
+
+    def add_from_path(shapes, source, left, top, width, height):
+        kind, name = source
+        path = str(icons_directory / f"{name}.png") if kind == "icon" else name
+        return shapes.add_picture(path, left, top, width, height)
+
+    def add_from_cache(shapes, source, left, top, width, height):
+        kind, name = source
+        asset = assets.icon(name) if kind == "icon" else assets.image(name)
+        return assets.add_picture(shapes, asset, left, top, width, height)
+
+    print(f"{len(icons)} icons preloaded in {preload_ms:.1f} ms, "
+          f"attached image {ATTACHED_BYTES // 1024} KiB")
+    print(f"{'slides':>6} {'media KiB':>9} {'pictures':>8} {'path':>6} "
+          f"{'place ms':>9} {'us/picture':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        attached_path = str(Path(directory) / "attached.png")
+        Path(attached_path).write_bytes(_noise_png(ATTACHED_BYTES).getvalue())
+
+        for slide_count, media_bytes in DECKS:
+            template = Presentation(generate_deck(
+                str(Path(directory) / f"deck_{slide_count}.pptx"),
+                slide_count, media_bytes=media_bytes))
+            picture_count = slide_count * (len(icons) + 1)
+
+            results = {}
+            for name, add_picture in (("path", add_from_path),
+                                      ("cache", add_from_cache)):
+                timings = []
+                for _ in range(RUNS):
+                    presentation = copy.deepcopy(template)
+                    timings.append(_place(presentation, add_picture, icons,
+                                          attached_path))
+                results[name] = _pictures(presentation)
+                place_s = statistics.median(timings)
+                print(f"{slide_count:>6} {media_bytes // 1024:>9} {picture_count:>8} "
+                      f"{name:>6} {place_s * 1000:>9.1f} "
+                      f"{place_s / picture_count * 1e6:>10.1f}")
+
+            assert results["cache"] == results["path"], \
+                f"Cached pictures differ on the {slide_count} slide deck"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Time and corrections of the layout post-processor for responses of 1, 20 and 200
+random actions on slides with 10 and 100 shapes.
+
+Fails with an AssertionError if a corrected action leaves the slide, the input
+response is mutated, or an overlap remains although a free area could hold the
+shape, so it doubles as a regression check:
+    python -m benchmarks.layout_post_processor
+(from the backend directory).
+"""
+import random
+import time
+
+from pptx.util import Mm
+
+from app.schemas.actions import ActionsList
+from app.services.ppt.layout import LayoutPostProcessor
+from app.services.ppt.spatial import SpatialIndex
+from benchmarks.stub_llm import stub_actions
+
+SLIDE_WIDTH, SLIDE_HEIGHT = 254.0, 190.5
+SHAPE_COUNTS = (10, 100)
+ACTION_COUNTS = (1, 20, 200)
+RUNS = 20
+
+
+def _slide_context(rng: random.Random, shape_count: int):
+    shapes = []
+    for index in range(shape_count):
+        width, height = rng.uniform(10, 50), rng.uniform(5, 25)
+        shapes.append({
+            "name": f"Shape {index}",
+            "left": Mm(rng.uniform(0, SLIDE_WIDTH - width)),
+            "top": Mm(rng.uniform(0, SLIDE_HEIGHT - height)),
+            "width": Mm(width),
+            "height": Mm(height),
+        })
+    return {
+        "presentation_info": {"slide_width": SLIDE_WIDTH, "slide_height": SLIDE_HEIGHT},
+        "shapes": shapes,
+        "selected_shape": {},
+    }
+
+
+def _actions(rng: random.Random, action_count: int) -> ActionsList:
+    actions = ActionsList.model_validate(stub_actions(action_count))
+    for action in actions.actions:
+        # Some proposals overshoot the slide, as models occasionally do
+        action.width, action.height = rng.uniform(10, 60), rng.uniform(5, 30)
+        action.left = rng.uniform(-10, SLIDE_WIDTH)
+        action.top = rng.uniform(-10, SLIDE_HEIGHT)
+    return actions
+
+
+def main() -> None:
+    rng = random.Random(11)
+    post_processor = LayoutPostProcessor(grid_mm=1, resolve_overlaps=True)
+    print(f"{'shapes':>6} {'actions':>7} {'ms':>7} {'corrected':>9} {'grid':>5} "
+          f"{'clamped':>7} {'overlaps':>8} {'unresolved':>10}")
+    for shape_count in SHAPE_COUNTS:
+        slide_context = _slide_context(rng, shape_count)
+        for action_count in ACTION_COUNTS:
+            actions = _actions(rng, action_count)
+            original = actions.model_dump()
+
+            started = time.perf_counter()
+            for _ in range(RUNS):
+                corrected, report = post_processor.process(actions, slide_context)
+            elapsed_ms = (time.perf_counter() - started) / RUNS * 1000
+            assert actions.model_dump() == original, "Input response was mutated"
+
+            # Replay the placements to count overlaps no free area could avoid
+            spatial_index = SpatialIndex.from_shapes(
+                SLIDE_WIDTH, SLIDE_HEIGHT, slide_context["shapes"])
+            unresolved = 0
+            for action in corrected.actions:
+                area = (action.top, action.left, action.width, action.height)
+                validation = spatial_index.validate(area)
+                assert validation["in_bounds"], "Corrected action leaves the slide"
+                if validation["overlaps"]:
+                    unresolved += 1
+                    assert not any(free[2] - free[0] >= action.width
+                                   and free[3] - free[1] >= action.height
+                                   for free in spatial_index.free_boxes()), \
+                        "Overlap left although a free area fits the shape"
+                spatial_index.insert(area)
+
+            print(f"{shape_count:>6} {action_count:>7} {elapsed_ms:>7.2f} "
+                  f"{report['corrected']:>9} {report['grid_aligned']:>5} "
+                  f"{report['clamped']:>7} {report['overlaps_resolved']:>8} "
+                  f"{unresolved:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Concurrent-request throughput of an endpoint that calls the LLM, comparing the
+blocking `OpenAIChatService` against `AsyncOpenAIChatService`, both talking to
+the local stub.
+
+Usage (from the backend directory):
+    python -m benchmarks.llm_concurrency
+"""
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.schemas.actions import ActionsList
+from app.utils.openai import AsyncOpenAIChatService, OpenAIChatService
+from benchmarks.stub_llm import StubLLMServer
+from benchmarks.utils import BackgroundServer
+
+API_VERSION = "2024-08-01-preview"
+STUB_LATENCY = 0.2
+CONCURRENCY = (1, 10, 50)
+
+
+def build_app(endpoint: str) -> FastAPI:
+    sync_service = OpenAIChatService(endpoint, "stub-key", API_VERSION, "stub")
+    sync_client = sync_service._get_azure_client()
+    async_service = AsyncOpenAIChatService(endpoint, "stub-key", API_VERSION, "stub")
+    async_client = async_service._get_azure_client()
+    app = FastAPI()
+
+    @app.post("/before")
+    async def before():
+        response = sync_service.run_chatGPT(sync_client, "system", "user", ActionsList)
+        return {"actions": len(response.actions)}
+
+    @app.post("/after")
+    async def after():
+        response = await async_service.run_chatGPT(
+            async_client, "system", "user", ActionsList)
+        return {"actions": len(response.actions)}
+
+    return app
+
+
+async def _load(url: str, concurrency: int) -> float:
+    async with httpx.AsyncClient(timeout=120) as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(
+            *(client.post(url) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    assert all(response.status_code == 200 for response in responses)
+    return elapsed
+
+
+def main() -> None:
+    print(f"stub latency {STUB_LATENCY * 1000:.0f} ms")
+    print(f"{'concurrent':>10} {'path':>6} {'wall s':>7} {'req/s':>7}")
+    with StubLLMServer(latency=STUB_LATENCY) as stub:
+        endpoint = f"{stub.url}/openai/deployments/stub/chat/completions" \
+                   f"?api-version={API_VERSION}"
+        with BackgroundServer(build_app(endpoint)) as server:
+            for concurrency in CONCURRENCY:
+                for path in ("before", "after"):
+                    elapsed = asyncio.run(_load(f"{server.url}/{path}", concurrency))
+                    print(f"{concurrency:>10} {path:>6} {elapsed:>7.2f} "
+                          f"{concurrency / elapsed:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Tail latency and failures of structured LLM calls against the local stub with
+injected slow responses and `500` errors, with the SDK's own retries vs.
+`ResilientCaller` deadlines and budgeted retries, without and with hedging;
+then calls, endpoint requests and time per call while every request fails.
+
+Fails with an AssertionError if hedging does not cut the p99 latency, if the
+resilient calls fail more often, or if the circuit breaker does not keep a
+failing endpoint from being called on every request:
+    python -m benchmarks.llm_resilience
+(from the backend directory).
+"""
+import asyncio
+import statistics
+import time
+from typing import Dict, Optional
+
+from app.schemas.actions import ActionsList
+from app.utils.openai import AsyncOpenAIChatService
+from app.utils.resilience import CircuitOpenError, ResilientCaller
+from benchmarks.stub_llm import StubLLMServer
+
+API_VERSION = "2024-08-01-preview"
+LATENCY = 0.05
+SLOW_RATE = 0.05
+SLOW_LATENCY = 1.0
+ERROR_RATE = 0.05
+ATTEMPT_TIMEOUT = 0.3
+CALLS = 400
+DEGRADED_CALLS = 100
+CONCURRENCY = 8
+SEED = 7
+
+
+def _resilience(hedge: bool) -> ResilientCaller:
+    return ResilientCaller("llm", ATTEMPT_TIMEOUT, backoff_seconds=0.05,
+                           hedge=hedge, breaker_reset_seconds=1.0)
+
+
+async def _calls(stub: StubLLMServer, resilience: Optional[ResilientCaller],
+                 calls: int) -> Dict[str, float]:
+    service = AsyncOpenAIChatService(
+        f"{stub.url}/openai/deployments/stub/chat/completions"
+        f"?api-version={API_VERSION}",
+        "stub-key", API_VERSION, "stub", max_connections=4 * CONCURRENCY,
+        resilience=resilience)
+    client = service._get_azure_client()
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    timings = []
+    outcomes = {"failed": 0, "rejected": 0}
+
+    async def call(index: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await service.run_chatGPT(
+                    client, "system", f"request {index}", ActionsList,
+                    use_cache=False)
+            except CircuitOpenError:
+                outcomes["rejected"] += 1
+            else:
+                outcomes["failed"] += response is None
+            timings.append(time.perf_counter() - started)
+
+    try:
+        await asyncio.gather(*(call(index) for index in range(calls)))
+    finally:
+        await service.close()
+    quantiles = statistics.quantiles(timings, n=100)
+    return {"p50": quantiles[49], "p95": quantiles[94], "p99": quantiles[98],
+            "mean": statistics.fmean(timings), **outcomes,
+            "requests": stub.requests_served}
+
+
+def _run(resilience: Optional[ResilientCaller], error_rate: float,
+         calls: int) -> Dict[str, float]:
+    with StubLLMServer(latency=LATENCY, slow_rate=SLOW_RATE,
+                       slow_latency=SLOW_LATENCY, error_rate=error_rate,
+                       seed=SEED) as stub:
+        return asyncio.run(_calls(stub, resilience, calls))
+
+
+def main() -> None:
+    print(f"stub {LATENCY * 1000:.0f} ms, {SLOW_RATE:.0%} at "
+          f"{SLOW_LATENCY * 1000:.0f} ms, {ERROR_RATE:.0%} errors; attempt deadline "
+          f"{ATTEMPT_TIMEOUT * 1000:.0f} ms, {CALLS} calls, concurrency {CONCURRENCY}")
+    print(f"{'client':>10} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} "
+          f"{'failed':>6} {'requests':>8}")
+    results = {}
+    for name, resilience in (("sdk", None),
+                             ("retries", _resilience(False)),
+                             ("hedged", _resilience(True))):
+        result = results[name] = _run(resilience, ERROR_RATE, CALLS)
+        print(f"{name:>10} {result['p50'] * 1000:>7.0f} {result['p95'] * 1000:>7.0f} "
+              f"{result['p99'] * 1000:>7.0f} {result['failed']:>6} "
+              f"{result['requests']:>8}")
+
+    assert results["hedged"]["p99"] < results["sdk"]["p99"] / 2, \
+        "Hedging did not cut the p99 latency"
+    assert results["hedged"]["failed"] <= results["sdk"]["failed"], \
+        "Resilient calls failed more often than the SDK retries"
+
+    print(f"\nEvery request failing, {DEGRADED_CALLS} calls")
+    print(f"{'client':>10} {'mean ms':>7} {'failed':>6} {'rejected':>8} "
+          f"{'requests':>8}")
+    degraded = {}
+    for name, resilience in (("sdk", None), ("breaker", _resilience(True))):
+        result = degraded[name] = _run(resilience, 1.0, DEGRADED_CALLS)
+        print(f"{name:>10} {result['mean'] * 1000:>7.0f} {result['failed']:>6} "
+              f"{result['rejected']:>8} {result['requests']:>8}")
+
+    assert degraded["breaker"]["rejected"] > 0, "The circuit breaker never opened"
+    assert degraded["breaker"]["requests"] < degraded["sdk"]["requests"] / 3, \
+        "The circuit breaker did not shed the load on the failing endpoint"
+
+
+if __name__ == "__main__":
+    main()
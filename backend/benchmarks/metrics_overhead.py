@@ -0,0 +1,103 @@
+"""
+Cost of the metrics layer: time per histogram observation and per timed stage,
+from 1 and 8 threads, and `/metrics` render time for 10, 100 and 1000 label
+sets, next to the roughly 20 observations one `/process` request makes.
+
+Fails with an AssertionError if observations are lost under concurrency or the
+rendered exposition is inconsistent (bucket counts not cumulative, `+Inf`
+bucket differing from `_count`), so it doubles as a regression check:
+    python -m benchmarks.metrics_overhead
+(from the backend directory).
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+
+from app.utils.metrics import MetricsRegistry
+
+OBSERVATIONS = 100_000
+THREADS = (1, 8)
+SERIES_COUNTS = (10, 100, 1000)
+OBSERVATIONS_PER_REQUEST = 20
+
+_SAMPLE = re.compile(r'^(\w+?)(_bucket|_sum|_count)?(\{.*\})? (\S+)$')
+_LE = re.compile(r',?le="([^"]+)"')
+
+
+def _check_exposition(text: str) -> int:
+    """
+    Validates every histogram series of a rendered exposition, returning the
+    number of series.
+    """
+    buckets, counts = defaultdict(list), {}
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        match = _SAMPLE.match(line)
+        assert match, f"Malformed sample: {line}"
+        name, suffix, labels, value = match.groups()
+        if suffix == "_bucket":
+            series = (name, _LE.sub("", labels))
+            buckets[series].append(float(value))
+        elif suffix == "_count":
+            counts[(name, labels or "{}")] = float(value)
+
+    for series, values in buckets.items():
+        assert values == sorted(values), f"Buckets not cumulative: {series}"
+        assert values[-1] == counts[series], f"+Inf differs from _count: {series}"
+    return len(buckets)
+
+
+def _time_threads(thread_count: int, work) -> float:
+    per_thread = OBSERVATIONS // thread_count
+    threads = [threading.Thread(target=work, args=(per_thread,))
+               for _ in range(thread_count)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (time.perf_counter() - started) / (per_thread * thread_count)
+
+
+def main() -> None:
+    print(f"{'threads':>7} {'observe us':>10} {'stage us':>8} "
+          f"{'per request us':>14}")
+    for thread_count in THREADS:
+        metrics = MetricsRegistry()
+
+        def observe(count: int) -> None:
+            for index in range(count):
+                metrics.stage_seconds.observe(index * 1e-6, stage="bench")
+
+        def stage(count: int) -> None:
+            for _ in range(count):
+                with metrics.stage("bench.stage"):
+                    pass
+
+        observe_s = _time_threads(thread_count, observe)
+        stage_s = _time_threads(thread_count, stage)
+        per_thread = OBSERVATIONS // thread_count
+        for name in ("bench", "bench.stage"):
+            snapshot = metrics.stage_seconds.snapshot(stage=name)
+            assert snapshot["count"] == per_thread * thread_count, \
+                f"Lost observations of {name} from {thread_count} threads"
+        _check_exposition(metrics.render())
+        print(f"{thread_count:>7} {observe_s * 1e6:>10.2f} {stage_s * 1e6:>8.2f} "
+              f"{stage_s * OBSERVATIONS_PER_REQUEST * 1e6:>14.1f}")
+
+    print(f"\n{'series':>6} {'render ms':>9} {'bytes':>8}")
+    for series_count in SERIES_COUNTS:
+        metrics = MetricsRegistry()
+        for index in range(series_count):
+            metrics.stage_seconds.observe(index * 1e-3, stage=f"stage {index}")
+        started = time.perf_counter()
+        text = metrics.render()
+        render_ms = (time.perf_counter() - started) * 1000
+        assert _check_exposition(text) == series_count
+        print(f"{series_count:>6} {render_ms:>9.2f} {len(text):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+`/process` latency and LLM calls per model tier for a mix of simple and complex
+instructions, with every request on the large deployment vs. simple ones routed
+to a fast deployment, against stub deployments: the large one slow, the fast one
+quick but answering every n-th request with output that fails validation.
+
+Fails with an AssertionError if a request fails, or if an escalated request was
+not answered by the large deployment:
+    python -m benchmarks.model_routing
+(from the backend directory, with the variables of `.env` set).
+"""
+import hashlib
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi.testclient import TestClient
+
+from app.config.settings import Settings
+from app.main import app
+from app.utils.model_router import FAST_TIER, LARGE_TIER, ModelRouter
+from app.utils.openai import AsyncOpenAIChatService
+from benchmarks.decks import generate_deck
+from benchmarks.stub_llm import StubDeployment, StubLLMServer
+
+API_VERSION = "2024-08-01-preview"
+LARGE_MODEL = "large"
+FAST_MODEL = "fast"
+DEPLOYMENTS = {LARGE_MODEL: StubDeployment(0.4),
+               FAST_MODEL: StubDeployment(0.1, invalid_every=4)}
+INSTRUCTIONS = (
+    "Add a short summary",
+    "Make the title bold",
+    "Add a caption under the picture",
+    "Add a thank you note",
+    "Redesign this slide as a timeline of the project milestones",
+    "Add a chart comparing the quarterly revenue of both regions",
+)
+ROUNDS = 4
+NO_CACHE = {"cache-control": "no-cache"}
+
+
+def _run(client: TestClient, stub: StubLLMServer, document_id: str,
+         fast_model: Optional[str]) -> Dict[str, float]:
+    service = AsyncOpenAIChatService(
+        f"{stub.url}/openai/deployments/{LARGE_MODEL}/chat/completions"
+        f"?api-version={API_VERSION}",
+        "stub-key", API_VERSION, LARGE_MODEL,
+        router=ModelRouter(fast_model))
+    Settings.GPT_ASYNC_SERVICE = service
+    Settings.GPT_ASYNC_CLIENT = service._get_azure_client()
+    calls_before = dict(stub.requests_by_model)
+
+    timings = []
+    escalated = 0
+    for round_index in range(ROUNDS):
+        for prompt in INSTRUCTIONS:
+            body = {"documentId": document_id, "prompt": prompt,
+                    "slidesInfo": [{"index": round_index}]}
+            started = time.perf_counter()
+            response = client.post("/process", json=body, headers=NO_CACHE)
+            timings.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+
+            route_report = response.json()["route_report"]
+            if route_report["escalated"]:
+                escalated += 1
+                assert route_report["model"] == LARGE_MODEL, route_report
+
+    tiers = service.router.stats()["tiers"]
+    calls = {model: stub.requests_by_model[model] - calls_before.get(model, 0)
+             for model in (FAST_MODEL, LARGE_MODEL)}
+    # Requests routed to the large tier, and escalated ones, reach the large model
+    assert calls[LARGE_MODEL] == tiers[LARGE_TIER]["requests"], (calls, tiers)
+    assert escalated == tiers[FAST_TIER]["escalated"], (escalated, tiers)
+    return {
+        "p50": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "total": sum(timings),
+        "fast": calls[FAST_MODEL],
+        "large": calls[LARGE_MODEL],
+        "escalation_rate": tiers[FAST_TIER]["escalation_rate"],
+    }
+
+
+def main() -> None:
+    print(f"large {DEPLOYMENTS[LARGE_MODEL].latency * 1000:.0f} ms, "
+          f"fast {DEPLOYMENTS[FAST_MODEL].latency * 1000:.0f} ms with every "
+          f"{DEPLOYMENTS[FAST_MODEL].invalid_every}th response invalid, "
+          f"{ROUNDS * len(INSTRUCTIONS)} requests")
+    print(f"{'routing':>7} {'p50 ms':>7} {'mean ms':>7} {'total s':>7} "
+          f"{'fast calls':>10} {'large calls':>11} {'escalated':>9}")
+    with StubLLMServer(deployments=DEPLOYMENTS) as stub, \
+            tempfile.TemporaryDirectory() as directory, TestClient(app) as client:
+        deck_path = generate_deck(str(Path(directory) / "deck.pptx"), ROUNDS)
+        blob = Path(deck_path).read_bytes()
+        document_id = client.post(
+            "/upload",
+            files={"presentation": ("deck.pptx", blob)},
+            data={"checksum": hashlib.sha256(blob).hexdigest()}
+        ).json()["document_id"]
+
+        for name, fast_model in (("off", None), ("on", FAST_MODEL)):
+            result = _run(client, stub, document_id, fast_model)
+            print(f"{name:>7} {result['p50'] * 1000:>7.0f} "
+                  f"{result['mean'] * 1000:>7.0f} "
+                  f"{result['total']:>7.2f} {result['fast']:>10} "
+                  f"{result['large']:>11} {result['escalation_rate']:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Bursts of 1, 5 and 20 identical concurrent `/process` requests, e.g. double
+clicks or client retries, with and without `PROCESS_COALESCING`: wall time,
+LLM calls, slide files saved and requests rejected by the worker pool. LLM
+calls are answered by the local stub.
+
+Fails with an AssertionError if a coalesced burst calls the LLM or saves a
+slide more than once, or its requests do not all share one slide file:
+    python -m benchmarks.process_coalescing
+(from the backend directory, with the variables of `.env` set).
+"""
+import hashlib
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from app.config.settings import Settings
+from app.main import app
+from app.utils.openai import AsyncOpenAIChatService
+from benchmarks.decks import generate_deck
+from benchmarks.stub_llm import StubLLMServer
+
+API_VERSION = "2024-08-01-preview"
+STUB_LATENCY = 0.2
+BURSTS = (1, 5, 20)
+NO_CACHE = {"cache-control": "no-cache"}
+
+
+def _saves() -> int:
+    stages = Settings.WORKER_POOL.stats()["stages"]
+    return stages.get("actions.save", {}).get("count", 0)
+
+
+def main() -> None:
+    print(f"stub latency {STUB_LATENCY * 1000:.0f} ms, "
+          f"{Settings.WORKER_POOL.max_workers} workers, "
+          f"queue {Settings.WORKER_POOL.max_queue}")
+    print(f"{'burst':>5} {'coalescing':>10} {'wall s':>7} {'LLM calls':>9} "
+          f"{'saves':>5} {'files':>5} {'rejected':>8}")
+    with StubLLMServer(latency=STUB_LATENCY) as stub, \
+            tempfile.TemporaryDirectory() as directory, TestClient(app) as client:
+        service = AsyncOpenAIChatService(
+            f"{stub.url}/openai/deployments/stub/chat/completions"
+            f"?api-version={API_VERSION}",
+            "stub-key", API_VERSION, "stub")
+        Settings.GPT_ASYNC_SERVICE = service
+        Settings.GPT_ASYNC_CLIENT = service._get_azure_client()
+
+        deck_path = generate_deck(str(Path(directory) / "deck.pptx"), 5)
+        blob = Path(deck_path).read_bytes()
+        document_id = client.post(
+            "/upload",
+            files={"presentation": ("deck.pptx", blob)},
+            data={"checksum": hashlib.sha256(blob).hexdigest()}
+        ).json()["document_id"]
+        body = {"documentId": document_id, "prompt": "Add a summary",
+                "slidesInfo": [{"index": 0}]}
+
+        def process(_: int):
+            return client.post("/process", json=body, headers=NO_CACHE)
+
+        for burst in BURSTS:
+            for coalescing in (False, True):
+                Settings.PROCESS_COALESCING = coalescing
+                served_before, saves_before = stub.requests_served, _saves()
+                started = time.perf_counter()
+                with ThreadPoolExecutor(burst) as executor:
+                    responses = list(executor.map(process, range(burst)))
+                elapsed = time.perf_counter() - started
+
+                statuses = Counter(response.status_code for response in responses)
+                files = {response.json()["file_id"] for response in responses
+                         if response.status_code == 200}
+                llm_calls = stub.requests_served - served_before
+                saves = _saves() - saves_before
+                print(f"{burst:>5} {'on' if coalescing else 'off':>10} "
+                      f"{elapsed:>7.2f} {llm_calls:>9} {saves:>5} {len(files):>5} "
+                      f"{statuses[429]:>8}")
+                if coalescing:
+                    assert statuses == {200: burst}, statuses
+                    assert llm_calls == 1 and saves == 1 and len(files) == 1, \
+                        f"Burst of {burst} was not coalesced"
+
+
+if __name__ == "__main__":
+    main()
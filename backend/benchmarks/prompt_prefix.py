@@ -0,0 +1,91 @@
+"""
+Prompt-prefix stability of the actions / actions_update templates across varied
+requests, and render time of the precompiled template against building a
+`PromptTemplate` per request:
+    python -m benchmarks.prompt_prefix
+(from the backend directory). That the system prompt is the same for every
+request is checked by `tests/test_prompt_prefix.py`.
+"""
+import itertools
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from app.config.settings import Settings
+from app.constants import ICONS, POSSIBLE_ACTIONS, PROMPTS_MAP
+from app.services.ppt.context import PresentationContext
+from app.utils.prompt import PromptTemplate
+from app.utils.prompt_serializer import estimate_tokens
+from benchmarks.decks import generate_deck
+
+SHAPES_PER_SLIDE = (2, 10, 40)
+INSTRUCTIONS = ("Add a title",
+                "Insert a gear icon on the right side of the slide",
+                "Summarise the body text in three bullet points {with braces}")
+RENDER_RUNS = 200
+
+
+def _requests(directory: str):
+    for shapes_per_slide in SHAPES_PER_SLIDE:
+        deck_path = generate_deck(
+            str(Path(directory) / f"deck_{shapes_per_slide}.pptx"),
+            2,
+            shapes_per_slide=shapes_per_slide)
+        for slide_index, instruction, shape_name in itertools.product(
+                (0, 1), INSTRUCTIONS, (None, "Title 1")):
+            context = PresentationContext(deck_path).get_slide_context(
+                slide_index, shape_name)
+            data = {"prompt": instruction}
+            if shape_name:
+                data["shapesInfo"] = [{"name": shape_name}]
+            yield ("actions_update" if shape_name else "actions",
+                   (shapes_per_slide, slide_index), data, context)
+
+
+def main() -> None:
+    template = Settings.PROMPT_TEMPLATE
+    with tempfile.TemporaryDirectory() as directory:
+        requests = list(_requests(directory))
+
+    print(f"{'template':>15} {'requests':>8} {'prefix ~tokens':>14} "
+          f"{'same-slide prefix':>17} {'avg ~tokens':>11}")
+    for prompt_key in PROMPTS_MAP:
+        rendered = []
+        for key, slide, data, context in requests:
+            if key != prompt_key:
+                continue
+            user_prompt, system_prompt = template.generate_prompts(
+                prompt_key, data, context, context["covered_areas"])
+            rendered.append((slide, system_prompt + user_prompt))
+
+        shared_prefix = os.path.commonprefix([prompt for _, prompt in rendered])
+        same_slide_prefixes = [
+            os.path.commonprefix([prompt for other, prompt in rendered
+                                  if other == slide])
+            for slide in {slide for slide, _ in rendered}
+        ]
+        average_tokens = sum(estimate_tokens(prompt)
+                             for _, prompt in rendered) // len(rendered)
+        same_slide_tokens = min(map(estimate_tokens, same_slide_prefixes))
+        print(f"{prompt_key:>15} {len(rendered):>8} "
+              f"{estimate_tokens(shared_prefix):>14} {same_slide_tokens:>17} "
+              f"{average_tokens:>11}")
+
+    def build_per_request() -> PromptTemplate:
+        return PromptTemplate(PROMPTS_MAP, ICONS, POSSIBLE_ACTIONS,
+                              Settings.PROMPT_TOKEN_BUDGET)
+
+    _, _, data, context = requests[-1]
+    for name, build in (("per request", build_per_request),
+                        ("precompiled", lambda: template)):
+        started = time.perf_counter()
+        for _ in range(RENDER_RUNS):
+            build().generate_prompts("actions_update", data, context,
+                                     context["covered_areas"])
+        elapsed_us = (time.perf_counter() - started) / RENDER_RUNS * 1e6
+        print(f"render {name:>11}: {elapsed_us:,.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Prompt size of the former `str()` interpolation of the slide context against the
+compact serialiser, with and without a token budget.
+
+Usage (from the backend directory):
+    python -m benchmarks.prompt_size
+"""
+import tempfile
+from pathlib import Path
+
+from app.constants import ICONS, POSSIBLE_ACTIONS, PROMPTS_MAP
+from app.services.ppt.context import PresentationContext
+from app.utils.prompt import PromptTemplate
+from app.utils.prompt_serializer import estimate_tokens
+from benchmarks.decks import generate_deck
+
+SHAPES_PER_SLIDE = (5, 20, 60)
+TOKEN_BUDGETS = (None, 1000)
+REQUEST_DATA = {"prompt": "Add a short summary below the title",
+                "shapesInfo": [{"name": "Title 1"}]}
+
+
+def _str_prompts(context):
+    """
+    Prompts as rendered before the compact serialiser, from `str()` of the dicts.
+    """
+    selected = context["selected_shape"]["info"]
+    placeholders = {
+        "user_instruction": REQUEST_DATA["prompt"],
+        "context_data": context,
+        "covered_areas": context["covered_areas"],
+        "free_areas": context["layout"]["free_areas"],
+        "icon_names": ICONS,
+        "possible_actions": POSSIBLE_ACTIONS,
+        "slide_width": context["presentation_info"]["slide_width"],
+        "slide_height": context["presentation_info"]["slide_height"],
+        "shape_data": {f"shape_{key}" if key != "shape_type" else key: value
+                       for key, value in selected.items() if key != "text"},
+    }
+    prompts = PROMPTS_MAP["actions_update"]
+    return (prompts["user"]["prompt"].format(**placeholders),
+            prompts["system"]["prompt"].format(**placeholders))
+
+
+def main() -> None:
+    print(f"{'shapes':>6} {'format':>14} {'chars':>7} {'~tokens':>8} {'truncated':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for shapes_per_slide in SHAPES_PER_SLIDE:
+            deck_path = generate_deck(
+                str(Path(directory) / f"deck_{shapes_per_slide}.pptx"),
+                3,
+                shapes_per_slide=shapes_per_slide)
+            context = PresentationContext(deck_path).get_slide_context(1, "Title 1")
+
+            user_prompt, system_prompt = _str_prompts(context)
+            chars = len(user_prompt) + len(system_prompt)
+            print(f"{shapes_per_slide:>6} {'str()':>14} {chars:>7,} "
+                  f"{estimate_tokens(user_prompt + system_prompt):>8,} {'-':>9}")
+
+            for token_budget in TOKEN_BUDGETS:
+                template = PromptTemplate(PROMPTS_MAP, ICONS, POSSIBLE_ACTIONS,
+                                          token_budget)
+                user_prompt, system_prompt, report = \
+                    template.generate_prompts_with_report(
+                        "actions_update", REQUEST_DATA, context,
+                        context["covered_areas"])
+                name = f"compact/{token_budget or 'none'}"
+                chars = report["user_prompt_chars"] + report["system_prompt_chars"]
+                print(f"{shapes_per_slide:>6} {name:>14} {chars:>7,} "
+                      f"{report['total_tokens']:>8,} {report['truncated_shapes']:>9}")
+
+
+if __name__ == "__main__":
+    main()
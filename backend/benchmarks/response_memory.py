@@ -0,0 +1,93 @@
+"""
+Per-request peak Python allocation of returning the updated slide, comparing the
+former base64-in-JSON `/process` response against a JSON handle plus the file
+served from disk by `GET /slides/{file_id}`.
+
+Usage (from the backend directory):
+    python -m benchmarks.response_memory
+"""
+import asyncio
+import base64
+import os
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+from fastapi.responses import JSONResponse
+
+from app.utils.responses import SlideFileResponse
+from benchmarks.decks import generate_deck
+
+MEDIA_SIZES = (256 * 1024, 2 * 1024 * 1024, 16 * 1024 * 1024)
+INPUT_DATA = {"prompt": "Add a summary", "slidesInfo": [{"index": 0}]}
+
+
+def _base64_response(file_path: str) -> int:
+    with open(file_path, "rb") as file:
+        content = file.read()
+    base64_encoded_ppt = base64.b64encode(content).decode("utf-8")
+    response = JSONResponse({
+        "file_path": file_path,
+        "base64_encoded_ppt": base64_encoded_ppt,
+        "input_data": INPUT_DATA,
+    })
+    return len(response.body)
+
+
+def _handle_response(file_path: str) -> int:
+    response = JSONResponse({
+        "file_path": file_path,
+        "file_id": Path(file_path).name,
+        "download_url": f"http://localhost:8000/slides/{Path(file_path).name}",
+        "input_data": INPUT_DATA,
+    })
+    return len(response.body) + asyncio.run(_serve_file(file_path))
+
+
+async def _serve_file(file_path: str) -> int:
+    sent = 0
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        nonlocal sent
+        sent += len(message.get("body", b""))
+
+    scope = {"type": "http", "method": "GET", "headers": []}
+    response = SlideFileResponse(file_path, stat_result=os.stat(file_path))
+    await response(scope, receive, send)
+    return sent
+
+
+def _peak_kib(respond, file_path: str) -> float:
+    tracemalloc.start()
+    try:
+        respond(file_path)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    print(f"{'slide KiB':>9} {'path':>7} {'peak KiB':>9} {'x file':>7}")
+    with tempfile.TemporaryDirectory() as directory:
+        for media_bytes in MEDIA_SIZES:
+            file_path = generate_deck(
+                str(Path(directory) / f"slide_{media_bytes}.pptx"),
+                1,
+                media_bytes=media_bytes)
+            file_kib = os.path.getsize(file_path) / 1024
+            # Warm-up so one-off imports and caches are not counted
+            _base64_response(file_path)
+            _handle_response(file_path)
+
+            for name, respond in (("before", _base64_response),
+                                  ("after", _handle_response)):
+                peak = _peak_kib(respond, file_path)
+                print(f"{file_kib:>9,.0f} {name:>7} {peak:>9,.0f} "
+                      f"{peak / file_kib:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Time to apply action lists of 10, 100 and 1000 new shapes (text boxes with
+several paragraphs, icons and an attached image) to a slide, one python-pptx
+shape at a time vs. `ShapeTreeWriter` (`BULK_SHAPE_WRITER`):
+    python -m benchmarks.shape_writer
+(from the backend directory, with the variables of `.env` set). That both
+paths write the same slide XML and relationships is checked by
+`tests/test_shape_writer.py`.
+"""
+import contextlib
+import io
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from lxml import etree
+from pptx import Presentation
+
+from app.config.settings import Settings
+from app.schemas.actions import ActionsList, IconType
+from app.services.ppt.actions import PPTActionHandler
+from benchmarks.decks import _noise_png, generate_deck
+
+SHAPES = (10, 100, 1000)
+RUNS = 3
+SEED = 7
+TEXTS = ("Quarterly revenue", "", "Growth & margin <10%>", "Line one\nline two",
+         "Next steps")
+
+
+def _font(rng: random.Random) -> Dict[str, Any]:
+    return {"name": "Arial",
+            # An unset size makes the action fail after its text box was added
+            "size": rng.choice((12, 18, 24, None)) if rng.random() < 0.05
+            else rng.choice((12, 18, 24)),
+            "color": rng.choice(("#1F4E79", "#FF0000", None)),
+            "bold": rng.choice((True, False, None)),
+            "italic": rng.choice((True, False, None)),
+            "underline": rng.choice((True, False, None))}
+
+
+def _actions(shapes: int) -> ActionsList:
+    rng = random.Random(SEED)
+    actions = []
+    for index in range(shapes):
+        position = {"left": rng.uniform(0, 250), "top": rng.uniform(0, 130),
+                    "width": rng.uniform(10, 80), "height": rng.uniform(5, 40),
+                    "shape_name": f"Shape {index}"}
+        if index % 10 == 3:
+            actions.append({"action_type": "create_icon", **position,
+                            "icon_name": rng.choice(list(IconType)).value,
+                            "word_wrap": None, "paragraphs": None})
+        elif index % 10 == 7:
+            actions.append({"action_type": "create_image", **position,
+                            "icon_name": None, "word_wrap": None, "paragraphs": None})
+        else:
+            actions.append({"action_type": "create_textbox", **position,
+                            "icon_name": None,
+                            "word_wrap": rng.choice((True, False, None)),
+                            "paragraphs": [{"text": rng.choice(TEXTS),
+                                            "font": _font(rng),
+                                            "bullet": False, "level": 0}
+                                           for _ in range(rng.randint(1, 5))]})
+    return ActionsList.model_validate({"actions": actions})
+
+
+def _apply(deck_path: str, actions: ActionsList, attached_path: str,
+           bulk: bool) -> Tuple[float, int]:
+    presentation = Presentation(deck_path)
+    slide = presentation.slides[0]
+    handler = PPTActionHandler(deck_path, presentation, slide, 0, actions, None,
+                               attached_path)
+    Settings.BULK_SHAPE_WRITER = bulk
+    # Failing actions are reported on stdout; the timing includes reporting them
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        handler.execute_actions()
+        elapsed = time.perf_counter() - started
+    return elapsed, len(etree.tostring(slide._element))
+
+
+def main() -> None:
+    bulk_setting = Settings.BULK_SHAPE_WRITER
+    print(f"{'shapes':>6} {'per shape ms':>12} {'bulk ms':>8} {'speedup':>7} "
+          f"{'slide KB':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        deck_path = generate_deck(str(Path(directory) / "deck.pptx"), 1)
+        attached_path = str(Path(directory) / "attached.png")
+        Path(attached_path).write_bytes(_noise_png(64 * 1024).getvalue())
+        try:
+            for shapes in SHAPES:
+                actions = _actions(shapes)
+                timings: Dict[bool, List[float]] = {False: [], True: []}
+                for _ in range(RUNS):
+                    for bulk in (False, True):
+                        elapsed, slide_bytes = _apply(
+                            deck_path, actions, attached_path, bulk)
+                        timings[bulk].append(elapsed)
+
+                per_shape, bulk = (statistics.median(timings[False]),
+                                   statistics.median(timings[True]))
+                print(f"{shapes:>6} {per_shape * 1000:>12.1f} {bulk * 1000:>8.1f} "
+                      f"{per_shape / bulk:>6.1f}x {slide_bytes / 1e3:>8.1f}")
+        finally:
+            Settings.BULK_SHAPE_WRITER = bulk_setting
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Single-slide export size and latency on media-heavy decks, comparing the former
+delete-other-slides-then-save path against `SlideExporter`.
+
+Usage (from the backend directory):
+    python -m benchmarks.slide_export
+"""
+import base64
+import copy
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from pptx import Presentation
+
+from app.services.ppt.export import SlideExporter
+from benchmarks.decks import generate_deck
+
+DECKS = ((20, 256 * 1024), (100, 256 * 1024), (50, 1024 * 1024))
+RUNS = 5
+
+
+def _save_whole_deck(presentation, slide_index: int, file_path: str) -> bytes:
+    slide_id_list = presentation.slides._sldIdLst
+    for index in reversed(range(len(presentation.slides))):
+        if index != slide_index:
+            del slide_id_list[index]
+    presentation.save(file_path)
+    with open(file_path, "rb") as file:
+        content = file.read()
+    base64.b64encode(content)
+    return content
+
+
+def _export_slide(presentation, slide_index: int, file_path: str) -> bytes:
+    slide_ppt = SlideExporter(presentation).export([slide_index])
+    with open(file_path, "wb") as file:
+        file.write(slide_ppt.getbuffer())
+    base64.b64encode(slide_ppt.getvalue())
+    return slide_ppt.getvalue()
+
+
+def _run(export, template, slide_index: int, file_path: str):
+    timings, size = [], 0
+    for _ in range(RUNS):
+        presentation = copy.deepcopy(template)
+        started = time.perf_counter()
+        size = len(export(presentation, slide_index, file_path))
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, size
+
+
+def main() -> None:
+    print(f"{'slides':>6} {'media/slide':>11} {'deck KiB':>9} {'path':>6} "
+          f"{'save ms':>8} {'output KiB':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for slide_count, media_bytes in DECKS:
+            deck_path = generate_deck(
+                str(Path(directory) / f"deck_{slide_count}.pptx"),
+                slide_count,
+                media_bytes=media_bytes)
+            deck_kib = Path(deck_path).stat().st_size / 1024
+            template = Presentation(deck_path)
+            output_path = str(Path(directory) / "slide.pptx")
+
+            for name, export in (("before", _save_whole_deck),
+                                 ("after", _export_slide)):
+                latency, size = _run(export, template, slide_count // 2, output_path)
+                print(f"{slide_count:>6} {media_bytes // 1024:>8}KiB {deck_kib:>9,.0f} "
+                      f"{name:>6} {latency:>8.1f} {size / 1024:>11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Overlap-count and nearest-gap time of `SpatialIndex` against the pairwise O(n^2)
+scan for slides with 10, 100 and 500 shapes, free-area computation time, and how
+many of 50 random new shapes overlap existing ones before and after snapping.
+
+Fails with an AssertionError if the index disagrees with the pairwise scan or a
+snapped shape still overlaps although a free rectangle could hold it, so it
+doubles as a regression check:
+    python -m benchmarks.spatial_index
+(from the backend directory).
+"""
+import random
+import time
+
+from app.services.ppt.spatial import SpatialIndex, box_from_area, gap, intersects
+
+SLIDE_WIDTH, SLIDE_HEIGHT = 254.0, 190.5
+SHAPE_COUNTS = (10, 100, 500)
+PLACEMENTS = 50
+
+
+def _random_area(rng: random.Random, max_size: float):
+    width = rng.uniform(5, max_size)
+    height = rng.uniform(5, max_size * 0.6)
+    return (rng.uniform(0, SLIDE_HEIGHT - height), rng.uniform(0, SLIDE_WIDTH - width),
+            width, height)
+
+
+def _pairwise(areas):
+    boxes = list(enumerate(box_from_area(area) for area in areas))
+    overlaps = [sum(1 for j, other in boxes if j != i and intersects(box, other))
+                for i, box in boxes]
+    gaps = [min((gap(box, other) for j, other in boxes if j != i), default=None)
+            for i, box in boxes]
+    return overlaps, gaps
+
+
+def main() -> None:
+    rng = random.Random(7)
+    print(f"{'shapes':>6} {'pairwise ms':>11} {'index ms':>8} {'free areas ms':>13} "
+          f"{'overlapping':>11} {'after snap':>10}")
+    for shape_count in SHAPE_COUNTS:
+        # Shapes shrink as the slide gets denser, like text boxes on a busy slide
+        max_size = max(SLIDE_WIDTH / shape_count ** 0.5, 8)
+        areas = [_random_area(rng, max_size) for _ in range(shape_count)]
+
+        started = time.perf_counter()
+        overlaps, gaps = _pairwise(areas)
+        pairwise_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        spatial_index = SpatialIndex(SLIDE_WIDTH, SLIDE_HEIGHT, areas)
+        index_overlaps = spatial_index.overlap_counts()
+        index_gaps = spatial_index.nearest_gaps()
+        index_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        spatial_index.free_areas()
+        free_areas_ms = (time.perf_counter() - started) * 1000
+
+        assert index_overlaps == overlaps, "Overlap counts differ"
+        assert all(abs(a - b) < 1e-9 for a, b in zip(index_gaps, gaps)), \
+            "Nearest-neighbour gaps differ"
+
+        overlapping = snapped_overlapping = 0
+        for _ in range(PLACEMENTS):
+            area = _random_area(rng, 40)
+            overlapping += bool(spatial_index.validate(area)["overlaps"])
+            snapped = spatial_index.snap(area)
+            if spatial_index.validate(snapped)["overlaps"]:
+                snapped_overlapping += 1
+                assert not any(free[2] - free[0] >= snapped[2]
+                               and free[3] - free[1] >= snapped[3]
+                               for free in spatial_index.free_boxes()), \
+                    "Snapped shape overlaps although a free rectangle fits it"
+            assert spatial_index.validate(snapped)["in_bounds"]
+            spatial_index.insert(snapped)
+
+        print(f"{shape_count:>6} {pairwise_ms:>11.1f} {index_ms:>8.1f} "
+              f"{free_areas_ms:>13.1f} {overlapping:>11} {snapped_overlapping:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Time to a saved slide through `/process`, and to the first applied action and
+the saved slide through `/process/stream`, when the actions are applied after the
+whole LLM response has been parsed vs. as each one is generated, for responses
+of 5, 20 and 50 actions. LLM calls are answered by the local stub generating its output
+`CHUNK_CHARS` characters per `CHUNK_DELAY`.
+
+Usage (from the backend directory, with the variables of `.env` set):
+    python -m benchmarks.streamed_actions
+"""
+import hashlib
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Tuple
+
+from fastapi.testclient import TestClient
+
+from app.config.settings import Settings
+from app.main import app
+from app.utils.openai import AsyncOpenAIChatService
+from benchmarks.decks import generate_deck
+from benchmarks.stub_llm import CHUNK_CHARS, StubLLMServer
+
+API_VERSION = "2024-08-01-preview"
+STUB_LATENCY = 0.2
+CHUNK_DELAY = 0.002
+ACTION_COUNTS = (5, 20, 50)
+RUNS = 3
+NO_CACHE = {"cache-control": "no-cache"}
+
+
+def main() -> None:
+    print(f"stub latency {STUB_LATENCY * 1000:.0f} ms, "
+          f"{CHUNK_CHARS} characters per {CHUNK_DELAY * 1000:.0f} ms")
+    print(f"{'actions':>7} {'path':>8} {'process s':>9} {'first action s':>14} "
+          f"{'file ready s':>12}")
+    with StubLLMServer(latency=STUB_LATENCY, chunk_delay=CHUNK_DELAY) as stub, \
+            tempfile.TemporaryDirectory() as directory, TestClient(app) as client:
+        service = AsyncOpenAIChatService(
+            f"{stub.url}/openai/deployments/stub/chat/completions"
+            f"?api-version={API_VERSION}",
+            "stub-key", API_VERSION, "stub")
+        Settings.GPT_ASYNC_SERVICE = service
+        Settings.GPT_ASYNC_CLIENT = service._get_azure_client()
+
+        deck_path = generate_deck(str(Path(directory) / "deck.pptx"), 1)
+        blob = Path(deck_path).read_bytes()
+        document_id = client.post(
+            "/upload",
+            files={"presentation": ("deck.pptx", blob)},
+            data={"checksum": hashlib.sha256(blob).hexdigest()}
+        ).json()["document_id"]
+        body = {"documentId": document_id, "prompt": "Add a summary",
+                "slidesInfo": [{"index": 0}]}
+
+        def saved() -> float:
+            started = time.perf_counter()
+            response = client.post("/process", json=body, headers=NO_CACHE)
+            assert response.status_code == 200, response.text
+            return time.perf_counter() - started
+
+        def streamed_events() -> Tuple[float, float]:
+            # The test client buffers the body, so use the server-side timestamps
+            first_action = file_ready = None
+            with client.stream("POST", "/process/stream", json=body,
+                               headers=NO_CACHE) as response:
+                for line in response.iter_lines():
+                    event = json.loads(line)
+                    assert event["event"] != "error", event
+                    if first_action is None and event["event"] in (
+                            "action_applied", "actions_applied"):
+                        first_action = event["elapsed_ms"] / 1000
+                    elif event["event"] == "file_ready":
+                        file_ready = event["elapsed_ms"] / 1000
+            assert first_action is not None and file_ready is not None
+            return first_action, file_ready
+
+        for actions_count in ACTION_COUNTS:
+            stub.actions_count = actions_count
+            for name, streamed in (("buffered", False), ("streamed", True)):
+                Settings.LLM_STREAM_ACTIONS = streamed
+                saved_s = min(saved() for _ in range(RUNS))
+                first_action_s, file_ready_s = min(
+                    streamed_events() for _ in range(RUNS))
+                print(f"{actions_count:>7} {name:>8} {saved_s:>9.2f} "
+                      f"{first_action_s:>14.2f} {file_ready_s:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
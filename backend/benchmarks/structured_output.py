@@ -0,0 +1,111 @@
+"""
+Decode time and allocations of a structured `ActionsList` completion through the
+openai SDK `beta.chat.completions.parse` path against the raw-body decode with a
+precompiled schema, and encode time of the stdlib `JSONResponse` against
+`FastJSONResponse`, for 1, 20 and 200 actions. Completions are served by an
+in-process mock transport, so no network is involved.
+
+Usage (from the backend directory):
+    python -m benchmarks.structured_output
+"""
+import asyncio
+import json
+import time
+import tracemalloc
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from openai import AsyncAzureOpenAI
+
+from app.schemas.actions import ActionsList
+from app.utils.responses import FastJSONResponse
+from app.utils.structured_output import compile_structured_output
+from benchmarks.stub_llm import StubLLMServer, stub_actions
+
+ACTION_COUNTS = (1, 20, 200)
+RUNS = 50
+MESSAGES = [{"role": "system", "content": "system"},
+            {"role": "user", "content": "user"}]
+
+
+def _client(body: bytes) -> AsyncAzureOpenAI:
+    def handler(_: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=body,
+                              headers={"content-type": "application/json"})
+
+    return AsyncAzureOpenAI(
+        azure_endpoint="http://stub",
+        api_key="stub",
+        api_version="2024-08-01-preview",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+async def _sdk_parse(client: AsyncAzureOpenAI) -> ActionsList:
+    response = await client.beta.chat.completions.parse(
+        model="gpt-4o", messages=MESSAGES, response_format=ActionsList)
+    return response.choices[0].message.parsed
+
+
+async def _raw_decode(client: AsyncAzureOpenAI) -> ActionsList:
+    structured_output = compile_structured_output(ActionsList)
+    raw_response = await client.chat.completions.with_raw_response.create(
+        model="gpt-4o", messages=MESSAGES,
+        response_format=structured_output.response_format)
+    return structured_output.decode_completion(raw_response.content)
+
+
+def _stdlib_encode(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def _fast_encode(content) -> bytes:
+    return FastJSONResponse(content).body
+
+
+def _measure(call):
+    """
+    Average time in microseconds over `RUNS` calls and the peak traced
+    allocation of one extra call in KiB.
+    """
+    call()
+    started = time.perf_counter()
+    for _ in range(RUNS):
+        call()
+    elapsed_us = (time.perf_counter() - started) / RUNS * 1e6
+
+    tracemalloc.start()
+    try:
+        call()
+        return elapsed_us, tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    loop = asyncio.new_event_loop()
+    print(f"{'actions':>7} {'stage':>7} {'path':>11} {'us/call':>9} {'peak KiB':>9}")
+    for actions_count in ACTION_COUNTS:
+        actions = stub_actions(actions_count)
+        body = json.dumps(
+            StubLLMServer.completion("gpt-4o", json.dumps(actions))).encode()
+        client = _client(body)
+        assert (loop.run_until_complete(_raw_decode(client))
+                == loop.run_until_complete(_sdk_parse(client))), \
+            "Raw decode differs from the SDK parse"
+        for name, decode in (("sdk parse", _sdk_parse), ("raw decode", _raw_decode)):
+            elapsed_us, peak = _measure(
+                lambda: loop.run_until_complete(decode(client)))
+            print(f"{actions_count:>7} {'decode':>7} {name:>11} "
+                  f"{elapsed_us:>9,.0f} {peak:>9,.0f}")
+
+        content = {"input_data": {"prompt": "x"}, **actions}
+        for name, encode in (("stdlib", _stdlib_encode), ("fast", _fast_encode)):
+            elapsed_us, peak = _measure(lambda: encode(content))
+            print(f"{actions_count:>7} {'encode':>7} {name:>11} "
+                  f"{elapsed_us:>9,.0f} {peak:>9,.0f}")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
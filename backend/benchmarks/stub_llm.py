@@ -0,0 +1,221 @@
+"""
+Local stand-in for the Azure OpenAI chat-completions endpoint returning
+structured `ActionsList` output after a configurable latency. With
+`chunk_delay`, the output is generated `CHUNK_CHARS` characters at a time, and
+requests with `"stream": true` receive it as server-sent events chunk by chunk.
+`deployments` gives models (Azure deployments) a latency of their own and makes
+every n-th of their responses fail schema validation, e.g. to stand in for a
+small, fast deployment next to the large one. `slow_rate` and `error_rate`
+inject responses delayed by `slow_latency` and `500` errors at random, from
+`seed`, into the requests of models without a deployment of their own.
+
+Usage (from the backend directory):
+    python -m benchmarks.stub_llm --port 8001 --latency 0.5
+    python -m benchmarks.stub_llm --deployment gpt-4o-mini=0.1:4
+    python -m benchmarks.stub_llm --slow-rate 0.05 --slow-latency 5 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmarks.utils import BackgroundServer
+
+# Characters of output generated per stub chunk, roughly four tokens
+CHUNK_CHARS = 16
+
+
+def stub_actions(actions_count: int) -> Dict[str, List[Dict[str, Any]]]:
+    return {"actions": [
+        {
+            "action_type": "create_textbox",
+            "left": 10.0 + 20 * (index % 10),
+            "top": 10.0 + 15 * (index // 10 % 10),
+            "width": 18.0,
+            "height": 12.0,
+            "icon_name": None,
+            "word_wrap": True,
+            "paragraphs": [{
+                "text": f"Generated text {index + 1}",
+                "font": {"name": "Arial", "size": 14, "color": "#1F1F1F",
+                         "bold": False, "italic": False, "underline": False},
+                "bullet": False,
+                "level": 0,
+            }],
+            "shape_name": f"Stub TextBox {index + 1}",
+        }
+        for index in range(actions_count)
+    ]}
+
+
+# Output missing the required shape fields, so it fails `ActionsList` validation
+INVALID_ACTIONS = {"actions": [{"action_type": "create_textbox", "left": 10.0}]}
+
+
+class StubDeployment(NamedTuple):
+    latency: float
+    # Every n-th response fails schema validation, 0 for none
+    invalid_every: int = 0
+    # Shares of requests answered after `slow_latency` instead, or with a 500
+    slow_rate: float = 0.0
+    slow_latency: float = 0.0
+    error_rate: float = 0.0
+
+
+class StubLLMServer(BackgroundServer):
+    """
+    Serves the stub endpoint in a background thread.
+    """
+
+    def __init__(self,
+                 latency: float = 0.2,
+                 actions_count: int = 3,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 chunk_delay: float = 0.0,
+                 deployments: Optional[Dict[str, StubDeployment]] = None,
+                 slow_rate: float = 0.0,
+                 slow_latency: float = 0.0,
+                 error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.actions_count = actions_count
+        self.chunk_delay = chunk_delay
+        self.deployments = deployments or {}
+        self.default_deployment = StubDeployment(latency, 0, slow_rate, slow_latency,
+                                                 error_rate)
+        self._random = random.Random(seed)
+        self.requests_served = 0
+        self.errors_served = 0
+        self.requests_by_model: Counter = Counter()
+        super().__init__(self._build_app(), host, port)
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/{path:path}")
+        async def chat_completions(request: Request, path: str):
+            body = await request.json()
+            model = body.get("model", "stub")
+            deployment = self.deployments.get(model, self.default_deployment)
+            fault = self._random.random()
+            await asyncio.sleep(deployment.slow_latency
+                                if fault < deployment.slow_rate else deployment.latency)
+            self.requests_served += 1
+            self.requests_by_model[model] += 1
+            if 1 - fault <= deployment.error_rate:
+                self.errors_served += 1
+                return JSONResponse({"error": {"code": "InternalServerError",
+                                               "message": "Injected failure"}},
+                                    status_code=500)
+            invalid = deployment.invalid_every \
+                and not self.requests_by_model[model] % deployment.invalid_every
+            content = json.dumps(INVALID_ACTIONS if invalid
+                                 else stub_actions(self.actions_count))
+            chunks = [content[start:start + CHUNK_CHARS]
+                      for start in range(0, len(content), CHUNK_CHARS)]
+            prompt_chars = sum(len(message.get("content") or "")
+                               for message in body.get("messages", []))
+            if body.get("stream"):
+                usage = self.usage(content, prompt_chars // 4) \
+                    if (body.get("stream_options") or {}).get("include_usage") else None
+                return StreamingResponse(self._stream(model, chunks, usage),
+                                         media_type="text/event-stream")
+
+            await asyncio.sleep(self.chunk_delay * len(chunks))
+            return self.completion(model, content, prompt_chars // 4)
+
+        return app
+
+    async def _stream(self, model: str, chunks: List[str],
+                      usage: Optional[Dict[str, int]] = None):
+        # Paced against the clock, so streaming takes as long as the buffered reply
+        started = time.perf_counter()
+        for index, chunk in enumerate(chunks, 1):
+            await asyncio.sleep(max(
+                started + index * self.chunk_delay - time.perf_counter(), 0.0))
+            yield f"data: {json.dumps(self.completion_chunk(model, chunk))}\n\n"
+        yield f"data: {json.dumps(self.completion_chunk(model, None, 'stop'))}\n\n"
+        if usage is not None:
+            # Requested with `stream_options`: a last chunk without choices
+            usage_chunk = {**self.completion_chunk(model, None),
+                           "choices": [], "usage": usage}
+            yield f"data: {json.dumps(usage_chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    @staticmethod
+    def completion_chunk(model: str,
+                         content: Optional[str],
+                         finish_reason: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": finish_reason,
+                "delta": {"content": content} if content is not None else {},
+            }],
+        }
+
+    @staticmethod
+    def completion(model: str, content: str, prompt_tokens: int = 0) -> Dict[str, Any]:
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": StubLLMServer.usage(content, prompt_tokens),
+        }
+
+    @staticmethod
+    def usage(content: str, prompt_tokens: int = 0) -> Dict[str, int]:
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--actions", type=int, default=3)
+    parser.add_argument("--chunk-delay", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--deployment", action="append", default=[],
+                        metavar="MODEL=LATENCY[:INVALID_EVERY]",
+                        help="latency of a model and its share of invalid responses")
+    args = parser.parse_args()
+
+    deployments = {}
+    for deployment in args.deployment:
+        model, _, settings = deployment.partition("=")
+        latency, _, invalid_every = settings.partition(":")
+        deployments[model] = StubDeployment(float(latency), int(invalid_every or 0))
+
+    server = StubLLMServer(args.latency, args.actions, args.host, args.port,
+                           args.chunk_delay, deployments, args.slow_rate,
+                           args.slow_latency, args.error_rate)
+    print(f"Stub chat-completions endpoint listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Offline benchmark suite of the full `/upload` and `/process` flow on synthetic
+decks of varying slide count, shapes per slide and embedded media size, with LLM
+calls answered by the local stub after a configurable latency. Reports p50, p95
+and p99 latency, throughput and peak RSS per scenario, and writes them to a JSON
+file for regression comparison.
+
+Each scenario runs in a fresh process serving the app with uvicorn, so caches
+start cold and peak RSS is the scenario's own; the stub runs in a process of
+its own. `/process` requests send `Cache-Control: no-cache`, so every request
+reaches the stub. `WORKER_QUEUE_SIZE` defaults to twice the concurrency so
+requests queue for a worker instead of being rejected; rejected requests are
+counted as errors.
+
+Usage (from the backend directory, with the variables of `.env` set):
+    python -m benchmarks.suite --output benchmark_results/baseline.json
+    python -m benchmarks.suite --baseline benchmark_results/baseline.json
+
+With `--baseline`, exits with status 1 if a latency percentile or the peak RSS
+grew, or the throughput dropped, by more than `--tolerance` (latencies also by
+at least `MIN_LATENCY_CHANGE_MS`).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import httpx
+
+from benchmarks.decks import generate_deck
+from benchmarks.stub_llm import StubLLMServer
+from benchmarks.utils import BackgroundServer, free_port, peak_rss_kib
+
+API_VERSION = "2024-08-01-preview"
+NO_CACHE = {"cache-control": "no-cache"}
+
+
+class Scenario(NamedTuple):
+    slides: int
+    shapes_per_slide: int
+    media_bytes: int
+
+
+SCENARIOS = {
+    "small": Scenario(10, 5, 0),
+    "large": Scenario(100, 5, 0),
+    "dense": Scenario(10, 40, 0),
+    "media": Scenario(20, 5, 256 * 1024),
+}
+
+# (section, metric, True if higher is worse) compared against a baseline
+COMPARED_METRICS = (
+    ("upload", "p50_ms", True),
+    ("process", "p50_ms", True),
+    ("process", "p95_ms", True),
+    ("process", "p99_ms", True),
+    ("process", "throughput_rps", False),
+    ("memory", "peak_rss_kib", True),
+)
+# Latency changes smaller than this are timer noise, whatever their ratio
+MIN_LATENCY_CHANGE_MS = 5.0
+
+
+def _latency_summary(latencies_ms: List[float]) -> Dict[str, Optional[float]]:
+    if not latencies_ms:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None,
+                "mean_ms": None, "max_ms": None}
+    if len(latencies_ms) > 1:
+        cuts = statistics.quantiles(latencies_ms, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies_ms[0]
+    return {
+        "count": len(latencies_ms),
+        "p50_ms": round(p50, 2),
+        "p95_ms": round(p95, 2),
+        "p99_ms": round(p99, 2),
+        "mean_ms": round(statistics.fmean(latencies_ms), 2),
+        "max_ms": round(max(latencies_ms), 2),
+    }
+
+
+async def _drive(url: str, deck_path: str, scenario: Scenario,
+                 options: argparse.Namespace) -> Dict[str, Any]:
+    blob = Path(deck_path).read_bytes()
+    checksum = hashlib.sha256(blob).hexdigest()
+    async with httpx.AsyncClient(base_url=url, timeout=300) as client:
+        # The first upload stores the deck, later ones are deduplicated
+        upload_ms = []
+        for _ in range(options.uploads):
+            started = time.perf_counter()
+            response = await client.post(
+                "/upload", files={"presentation": ("deck.pptx", blob)},
+                data={"checksum": checksum})
+            upload_ms.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.text
+        document_id = response.json()["document_id"]
+
+        semaphore = asyncio.Semaphore(options.concurrency)
+        process_ms, statuses = [], Counter()
+
+        async def process(request_number: int) -> None:
+            body = {"documentId": document_id,
+                    "prompt": "Add a summary of this slide",
+                    "slidesInfo": [{"index": request_number % scenario.slides}]}
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/process", json=body, headers=NO_CACHE)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+            statuses[response.status_code] += 1
+            if response.status_code == 200:
+                process_ms.append(elapsed_ms)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(process(number) for number in range(options.requests)))
+        wall_seconds = time.perf_counter() - started
+
+    return {
+        "upload": {**_latency_summary(upload_ms),
+                   "first_ms": round(upload_ms[0], 2),
+                   "deck_bytes": len(blob)},
+        "process": {**_latency_summary(process_ms),
+                    "throughput_rps": round(len(process_ms) / wall_seconds, 2),
+                    "wall_seconds": round(wall_seconds, 3),
+                    "statuses": {str(status): count
+                                 for status, count in sorted(statuses.items())}},
+    }
+
+
+def _run_scenario(scenario: Scenario, options: argparse.Namespace,
+                  stub_url: str, results) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        # Set before the app is imported: Settings reads them at import time
+        os.environ.update({
+            "AZURE_OPENAI_ENDPOINT": stub_url,
+            "AZURE_OPENAI_KEY": "stub-key",
+            "AZURE_API_VERSION": API_VERSION,
+            "GPT_MODEL": "stub",
+            "PPT_STORE_DIRECTORY": str(Path(directory) / "presentations"),
+            "PPT_OBJECT_STORE_DIRECTORY": str(Path(directory) / "object_store"),
+        })
+        # Measure latency rather than 429s, unless the admission limit is given
+        os.environ.setdefault("WORKER_QUEUE_SIZE", str(2 * options.concurrency))
+        from app.main import app
+
+        deck_path = generate_deck(str(Path(directory) / "deck.pptx"),
+                                  scenario.slides,
+                                  scenario.shapes_per_slide,
+                                  scenario.media_bytes)
+        with BackgroundServer(app) as server:
+            measurements = asyncio.run(_drive(server.url, deck_path, scenario, options))
+        measurements["memory"] = {"peak_rss_kib": peak_rss_kib()}
+        results.put(measurements)
+
+
+def _serve_stub(port: int, latency: float, actions: int) -> None:
+    StubLLMServer(latency, actions, port=port).serve_forever()
+
+
+def _wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.05)
+    raise TimeoutError(f"Stub did not listen on port {port}")
+
+
+def _compare(results: Dict[str, Any], baseline: Dict[str, Any],
+             tolerance: float) -> List[str]:
+    """
+    Prints the change of each compared metric and returns the regressions.
+    """
+    regressions = []
+    print(f"\n{'scenario':>8} {'metric':>22} {'baseline':>10} {'current':>10} "
+          f"{'change':>8}")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        for section, metric, higher_is_worse in COMPARED_METRICS:
+            before = previous.get(section, {}).get(metric)
+            after = current.get(section, {}).get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            regressed = change > tolerance if higher_is_worse else change < -tolerance
+            if metric.endswith("_ms") and abs(after - before) < MIN_LATENCY_CHANGE_MS:
+                regressed = False
+            label = f"{section}.{metric}"
+            print(f"{name:>8} {label:>22} {before:>10,.1f} {after:>10,.1f} "
+                  f"{change:>+7.0%}{' !' if regressed else ''}")
+            if regressed:
+                regressions.append(f"{name} {label}: {before:,.1f} -> {after:,.1f}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS),
+                        default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100,
+                        help="/process requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--uploads", type=int, default=5,
+                        help="/upload requests per scenario")
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="stub LLM latency in seconds")
+    parser.add_argument("--actions", type=int, default=3,
+                        help="actions per stub LLM response")
+    parser.add_argument("--output", default="benchmark_results/suite.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative change tolerated before a regression")
+    options = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    stub_port = free_port()
+    stub = context.Process(target=_serve_stub,
+                           args=(stub_port, options.latency, options.actions),
+                           daemon=True)
+    stub.start()
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "cpu_count": os.cpu_count()},
+        "config": {key: value for key, value in vars(options).items()
+                   if key not in ("output", "baseline")},
+        "scenarios": {},
+    }
+    try:
+        _wait_for_port(stub_port)
+        print(f"stub latency {options.latency * 1000:.0f} ms, "
+              f"{options.requests} requests at concurrency {options.concurrency}")
+        print(f"{'scenario':>8} {'slides':>6} {'shapes':>6} {'media KiB':>9} "
+              f"{'upload p50':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'req/s':>6} {'errors':>6} {'peak RSS MiB':>12}")
+        for name in options.scenarios:
+            scenario = SCENARIOS[name]
+            queue = context.Queue()
+            process = context.Process(
+                target=_run_scenario,
+                args=(scenario, options, f"http://127.0.0.1:{stub_port}", queue))
+            process.start()
+            measurements = queue.get()
+            process.join()
+            results["scenarios"][name] = {"scenario": scenario._asdict(),
+                                          **measurements}
+
+            process_stats = measurements["process"]
+            errors = options.requests - process_stats["count"]
+            print(f"{name:>8} {scenario.slides:>6} {scenario.shapes_per_slide:>6} "
+                  f"{scenario.media_bytes // 1024:>9} "
+                  f"{measurements['upload']['p50_ms']:>10.1f} "
+                  f"{process_stats['p50_ms'] or 0:>8.1f} "
+                  f"{process_stats['p95_ms'] or 0:>8.1f} "
+                  f"{process_stats['p99_ms'] or 0:>8.1f} "
+                  f"{process_stats['throughput_rps']:>6.1f} {errors:>6} "
+                  f"{measurements['memory']['peak_rss_kib'] / 1024:>12.1f}")
+    finally:
+        stub.terminate()
+        stub.join()
+
+    output = Path(options.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {output}")
+
+    if options.baseline:
+        regressions = _compare(results,
+                               json.loads(Path(options.baseline).read_text()),
+                               options.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond "
+                  f"{options.tolerance:.0%}:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regression beyond {options.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Per-upload peak Python allocation and latency of storing a deck, comparing the
+former read-hash-write path against the streaming `PresentationStorage`, and
+the cost of re-uploading an unchanged deck.
+
+Usage (from the backend directory):
+    python -m benchmarks.upload_memory
+"""
+import hashlib
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from app.services.ppt.storage import LocalDiskBackend, PresentationStorage
+
+UPLOAD_SIZES = (16 * 1024 * 1024, 64 * 1024 * 1024, 200 * 1024 * 1024)
+
+
+def _read_hash_write(source_path: str, storage: PresentationStorage,
+                     checksum: str) -> None:
+    with open(source_path, "rb") as source:
+        content = source.read()
+    if hashlib.sha256(content).hexdigest() != checksum:
+        raise ValueError("Checksum mismatch")
+    with open(storage.backend.directory / "current.pptx", "wb") as target:
+        target.write(content)
+
+
+def _stream(source_path: str, storage: PresentationStorage, checksum: str) -> None:
+    with open(source_path, "rb") as source:
+        storage.save(source, checksum)
+
+
+def _measure(upload, source_path: str, storage: PresentationStorage,
+             checksum: str):
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        upload(source_path, storage, checksum)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return tracemalloc.get_traced_memory()[1] / 1024, elapsed_ms
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    print(f"{'upload MiB':>10} {'path':>8} {'peak KiB':>9} {'ms':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in UPLOAD_SIZES:
+            source_path = str(Path(directory) / f"upload_{size}.pptx")
+            with open(source_path, "wb") as source:
+                source.write(os.urandom(size))
+            with open(source_path, "rb") as source:
+                checksum = hashlib.file_digest(source, "sha256").hexdigest()
+
+            storage = PresentationStorage(
+                LocalDiskBackend(str(Path(directory) / f"store_{size}")))
+            storage.backend.directory.mkdir()
+            for name, upload in (("before", _read_hash_write),
+                                 ("after", _stream),
+                                 ("re-send", _stream)):
+                peak, elapsed_ms = _measure(upload, source_path, storage, checksum)
+                print(f"{size // (1024 * 1024):>10} {name:>8} {peak:>9,.0f} "
+                      f"{elapsed_ms:>8.1f}")
+            os.remove(source_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import resource
+import socket
+import threading
+import time
+
+import uvicorn
+
+
+def peak_rss_kib() -> int:
+    """
+    Peak resident set size of the current process in KiB. `VmHWM` is used where
+    available because `ru_maxrss` is inherited from the parent across exec.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class BackgroundServer:
+    """
+    Serves an ASGI app with uvicorn in a daemon thread.
+    """
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port or free_port(host)
+        self._server = uvicorn.Server(uvicorn.Config(
+            app, host=self.host, port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join()
+
+    def serve_forever(self) -> None:
+        self._server.run()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+
+def free_port(host: str = "127.0.0.1") -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,153 @@
+"""
+Disk growth and time per edit over 100 successive edits of a media-heavy deck,
+saving a full copy of the deck per edit vs. `VersionStore` keeping only the
+changed slide XML and new media; then the time to restore versions 1, 50 and
+100, to undo and redo, and to compact the history.
+
+Fails with an AssertionError if a restored version differs from the full copy
+saved at that version, if the history grows by more than a twentieth of the
+full copies, or if compaction drops a version it should keep:
+    python -m benchmarks.version_history
+(from the backend directory).
+"""
+import hashlib
+import io
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from lxml import etree
+from pptx import Presentation
+from pptx.util import Mm
+
+from app.services.ppt.storage import LocalDiskBackend, PresentationStorage
+from app.services.ppt.versions import VersionStore
+from benchmarks.decks import _noise_png, generate_deck
+
+SLIDES = 20
+MEDIA_BYTES = 200 * 1024
+EDITS = 100
+# Every n-th edit adds a picture, the others a text box
+PICTURE_EVERY = 10
+RESTORED_VERSIONS = (1, 50, 100)
+UNDO_STEPS = 10
+COMPACTED_MAX_VERSIONS = 10
+
+
+def _signature(blob: bytes) -> List[Tuple[bytes, List[Tuple[str, str, str]]]]:
+    """
+    Slide XML and the digest of every part each slide refers to.
+    """
+    presentation = Presentation(io.BytesIO(blob))
+    return [(etree.tostring(slide._element), sorted(
+        (rel.rId, rel.reltype, hashlib.sha256(rel.target_part.blob).hexdigest())
+        for rel in slide.part.rels.values() if not rel.is_external))
+        for slide in presentation.slides]
+
+
+def _edit(presentation, edit: int) -> int:
+    slide_index = edit % SLIDES
+    shapes = presentation.slides[slide_index].shapes
+    if edit % PICTURE_EVERY == 0:
+        shapes.add_picture(_noise_png(MEDIA_BYTES // 4), Mm(20), Mm(20),
+                           Mm(40), Mm(30))
+    else:
+        textbox = shapes.add_textbox(Mm(20), Mm(100), Mm(60), Mm(10))
+        textbox.text_frame.text = f"Edit {edit}"
+    return slide_index
+
+
+def _directory_bytes(directory: Path) -> int:
+    return sum(path.stat().st_size for path in directory.rglob("*") if path.is_file())
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        deck_path = generate_deck(str(Path(directory) / "deck.pptx"), SLIDES,
+                                  media_bytes=MEDIA_BYTES)
+        storage = PresentationStorage(LocalDiskBackend(str(Path(directory) / "store")))
+        with open(deck_path, "rb") as deck:
+            document_id = storage.save(deck)["document_id"]
+        store = VersionStore(str(Path(directory) / "versions"), storage,
+                             max_versions=EDITS)
+        print(f"{SLIDES} slides, {Path(deck_path).stat().st_size / 1e6:.1f} MB deck, "
+              f"{EDITS} edits, a picture every {PICTURE_EVERY}th")
+
+        # The working copy stays parsed, as in the presentation cache
+        presentation = Presentation(storage.local_path(document_id))
+        full_bytes = 0
+        full_seconds, delta_seconds = [], []
+        full_copies = {}
+        for edit in range(1, EDITS + 1):
+            slide_index = _edit(presentation, edit)
+
+            started = time.perf_counter()
+            copy = io.BytesIO()
+            presentation.save(copy)
+            full_seconds.append(time.perf_counter() - started)
+            full_bytes += copy.getbuffer().nbytes
+            if edit in RESTORED_VERSIONS:
+                full_copies[edit] = copy.getvalue()
+
+            started = time.perf_counter()
+            key = store.key(document_id, store.head(document_id))
+            store.commit(store.stage(key, presentation, [slide_index]))
+            delta_seconds.append(time.perf_counter() - started)
+
+        delta_bytes = _directory_bytes(store.blobs_directory) + \
+            _directory_bytes(store.documents_directory)
+        print(f"{'history':>7} {'disk MB':>8} {'per edit KB':>11} {'edit ms':>7}")
+        for name, size, seconds in (("full", full_bytes, full_seconds),
+                                    ("delta", delta_bytes, delta_seconds)):
+            print(f"{name:>7} {size / 1e6:>8.2f} {size / EDITS / 1e3:>11.1f} "
+                  f"{statistics.median(seconds) * 1000:>7.1f}")
+        assert delta_bytes < full_bytes / 20, \
+            "The history grew by more than a twentieth of the full copies"
+
+        print(f"\n{'version':>7} {'restore ms':>10} {'MB':>6}")
+        for version in RESTORED_VERSIONS:
+            started = time.perf_counter()
+            restored_path = store.checkout(document_id, version)
+            elapsed = time.perf_counter() - started
+            restored = Path(restored_path).read_bytes()
+            print(f"{version:>7} {elapsed * 1000:>10.1f} {len(restored) / 1e6:>6.2f}")
+            assert _signature(restored) == _signature(full_copies[version]), \
+                f"Version {version} differs from its full copy"
+
+        undo_seconds, redo_seconds = [], []
+        for moves, move in ((undo_seconds, store.undo), (redo_seconds, store.redo)):
+            for _ in range(UNDO_STEPS):
+                started = time.perf_counter()
+                move(document_id)
+                # Includes rebuilding the new head for the next edit
+                store.resolve(document_id)
+                moves.append(time.perf_counter() - started)
+        print(f"\n{UNDO_STEPS} undos {statistics.fmean(undo_seconds) * 1000:.1f} ms, "
+              f"{UNDO_STEPS} redos {statistics.fmean(redo_seconds) * 1000:.1f} ms "
+              "each, head rebuilt when not checked out yet")
+        assert store.head(document_id) == EDITS
+
+        store.max_versions = COMPACTED_MAX_VERSIONS
+        started = time.perf_counter()
+        compacted = store.compact(grace_seconds=0)
+        elapsed = time.perf_counter() - started
+        compacted_bytes = _directory_bytes(store.blobs_directory) + \
+            _directory_bytes(store.documents_directory)
+        print(f"\ncompacted to {COMPACTED_MAX_VERSIONS} versions in "
+              f"{elapsed * 1000:.1f} ms: {compacted}, history "
+              f"{delta_bytes / 1e6:.2f} -> {compacted_bytes / 1e6:.2f} MB")
+        assert compacted["versions_removed"] == EDITS - COMPACTED_MAX_VERSIONS
+        assert _signature(Path(store.checkout(document_id, EDITS)).read_bytes()) == \
+            _signature(full_copies[EDITS]), "Compaction changed the head version"
+        try:
+            store.checkout(document_id, RESTORED_VERSIONS[1])
+        except LookupError:
+            pass
+        else:
+            raise AssertionError("A compacted version was restored")
+
+
+if __name__ == "__main__":
+    main()
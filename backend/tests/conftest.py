@@ -0,0 +1,10 @@
+import os
+
+# Settings are read when `app.config.settings` is imported; the LLM is never
+# called by the tests, so placeholders are enough for the variables without a
+# default
+os.environ.setdefault("LOCAL_PPT_FILENAME", ".current_ppt.pptx")
+os.environ.setdefault("AZURE_OPENAI_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1:9")
+os.environ.setdefault("AZURE_API_VERSION", "2024-08-01-preview")
+os.environ.setdefault("GPT_MODEL", "gpt-4o")
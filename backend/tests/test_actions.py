@@ -0,0 +1,61 @@
+"""
+`apply_batch_actions` reports targets whose actions fail in `errors` and saves
+only the slides on which an action was applied.
+"""
+import contextlib
+import io
+
+import pytest
+from pptx import Presentation
+
+from app.schemas.actions import ActionsList
+from app.services.ppt.actions import PPTActionsService
+from benchmarks.decks import generate_deck
+
+
+def _actions(*action_types):
+    return ActionsList.model_validate({"actions": [
+        {"action_type": action_type, "left": 10, "top": 10 + 20 * index,
+         "width": 40, "height": 15, "shape_name": f"Shape {index}",
+         "icon_name": "gear" if action_type == "create_icon" else None,
+         "word_wrap": None,
+         "paragraphs": [{"text": "Next steps", "bullet": False, "level": 0,
+                         "font": {"name": "Arial", "size": 18, "color": None,
+                                  "bold": None, "italic": None, "underline": None}}]
+         if action_type == "create_textbox" else None}
+        for index, action_type in enumerate(action_types)]})
+
+
+@pytest.fixture
+def deck_path(tmp_path, monkeypatch):
+    # Updated slides are saved under the working directory
+    monkeypatch.chdir(tmp_path)
+    return generate_deck(str(tmp_path / "deck.pptx"), 3)
+
+
+def _apply_batch(deck_path, targets):
+    # Failing actions are reported on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Without an attached file every `create_image` action fails
+        return PPTActionsService.apply_batch_actions(deck_path, None, targets, None)
+
+
+def test_failing_targets_are_reported_and_not_saved(deck_path):
+    saved = _apply_batch(deck_path, [
+        (0, _actions("create_textbox", "create_icon"), None),
+        (1, _actions("create_image", "create_image"), None),
+        (2, _actions("create_image", "create_textbox"), None),
+    ])
+
+    assert sorted(saved["errors"]) == [1, 2]
+    assert "action 1 (create_image)" in saved["errors"][1]
+    assert "action 1" not in saved["errors"][2]
+    assert saved["slide_indices"] == [0, 2]
+    assert len(Presentation(saved["file_path"]).slides) == 2
+
+
+def test_batch_without_applied_actions_saves_nothing(deck_path):
+    saved = _apply_batch(deck_path, [(1, _actions("create_image"), None)])
+
+    assert list(saved) == ["errors"]
+    assert "Attached file is required" in saved["errors"][0]
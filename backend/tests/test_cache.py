@@ -0,0 +1,40 @@
+"""
+Concurrent misses of `PresentationCache` on the same deck parse it once.
+"""
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.ppt import cache as cache_module
+from app.services.ppt.cache import PresentationCache
+from benchmarks.decks import generate_deck
+
+THREADS = 8
+
+
+def test_concurrent_misses_load_once(tmp_path, monkeypatch):
+    deck_path = generate_deck(str(tmp_path / "deck.pptx"), 20)
+    with open(deck_path, "rb") as deck:
+        checksum = hashlib.sha256(deck.read()).hexdigest()
+
+    loads = []
+    barrier = threading.Barrier(THREADS)
+    load_presentation = cache_module.Presentation
+
+    def counted_presentation(path):
+        loads.append(path)
+        return load_presentation(path)
+
+    monkeypatch.setattr(cache_module, "Presentation", counted_presentation)
+    cache = PresentationCache(max_entries=4, max_bytes=1 << 40)
+
+    def checkout(slide_index):
+        barrier.wait()
+        return cache.checkout(deck_path, checksum, [slide_index])
+
+    with ThreadPoolExecutor(THREADS) as executor:
+        presentations = list(executor.map(checkout, range(THREADS)))
+
+    assert len(loads) == 1
+    assert all(len(presentation.slides) == 20 for presentation in presentations)
+    assert cache.stats()["entries"] == 1
@@ -0,0 +1,103 @@
+"""
+Keys, expiry and the SQLite tier of `LLMResponseCache`, the `Cache-Control`
+bypass of `/process`, and cached responses served by the async LLM service.
+"""
+import asyncio
+import threading
+
+import pytest
+from starlette.requests import Request
+
+from app.routes.ppt import _use_llm_cache
+from app.schemas.actions import ActionsList
+from app.utils import llm_cache
+from app.utils.llm_cache import LLMResponseCache, normalise_prompt
+from app.utils.openai import AsyncOpenAIChatService
+
+RESPONSE = ActionsList.model_validate({"actions": [{
+    "action_type": "create_icon", "left": 10, "top": 10, "width": 20,
+    "height": 20, "icon_name": "gear", "word_wrap": None, "shape_name": "Icon",
+    "paragraphs": None}]})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_normalise_prompt_keeps_line_breaks():
+    assert normalise_prompt("  Add  a\t title \n\n to   slide 2 ") == \
+        "Add a title \n\n to slide 2"
+    assert normalise_prompt("a\nb") != normalise_prompt("a b")
+
+
+def test_key_depends_on_normalised_prompts_and_model():
+    cache = LLMResponseCache(8, 60)
+    key = cache.key("gpt-4o", "system", "Add  a title", ActionsList)
+    assert cache.key("gpt-4o", " system ", "Add a title", ActionsList) == key
+    assert cache.key("gpt-4o", "system", "Add a\ntitle", ActionsList) != key
+    assert cache.key("gpt-4o-mini", "system", "Add a title", ActionsList) != key
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LLMResponseCache(8, 60)
+    cache.put("key", RESPONSE)
+    clock[0] += 59
+    assert cache.get("key", ActionsList) is RESPONSE
+    clock[0] += 2
+    assert cache.get("key", ActionsList) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_sqlite_hits_are_promoted_to_memory(tmp_path, clock):
+    sqlite_path = str(tmp_path / "llm_cache.sqlite")
+    writer = LLMResponseCache(8, 60, sqlite_path)
+    writer.put("key", RESPONSE)
+    writer.close()
+
+    cache = LLMResponseCache(8, 60, sqlite_path)
+    assert cache.get_memory("key") is None
+    response = cache.get("key", ActionsList)
+    assert response == RESPONSE
+    assert cache.get_memory("key") is response
+    assert cache.stats()["disk_hits"] == 1
+
+    clock[0] += 61
+    assert LLMResponseCache(8, 60, sqlite_path).get("key", ActionsList) is None
+
+
+@pytest.mark.parametrize("cache_control, use_cache", [
+    (None, True), ("max-age=0", True), ("no-cache", False), ("No-Store", False)])
+def test_cache_control_bypasses_the_cache(cache_control, use_cache):
+    headers = [(b"cache-control", cache_control.encode())] if cache_control else []
+    assert _use_llm_cache(Request({"type": "http", "headers": headers})) is use_cache
+
+
+def test_sqlite_reads_run_off_the_event_loop(tmp_path):
+    cache = LLMResponseCache(8, 60, str(tmp_path / "llm_cache.sqlite"))
+    service = AsyncOpenAIChatService("http://127.0.0.1:9", "test",
+                                     "2024-08-01-preview", "gpt-4o", cache=cache)
+    key = cache.key("gpt-4o", "system", "user", ActionsList)
+    cache.put(key, RESPONSE)
+    cache._entries.clear()
+
+    threads = []
+    get = cache.get
+
+    def recording_get(*args):
+        threads.append(threading.current_thread())
+        return get(*args)
+
+    cache.get = recording_get
+
+    async def run():
+        try:
+            return await service.run_chatGPT(object(), "system", "user",
+                                             ActionsList)
+        finally:
+            await service.close()
+
+    assert asyncio.run(run()) == RESPONSE
+    assert threads and threads[0] is not threading.main_thread()
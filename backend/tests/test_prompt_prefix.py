@@ -0,0 +1,95 @@
+"""
+The system prompts of the actions / actions_update templates are the same for
+every request and hold no request data, so the rendered prompts of all requests
+share them as a cacheable prefix. The static icon and action lists are sent in
+the system prompt only, and the user prompt keeps its documented section order.
+"""
+import itertools
+import os
+
+import pytest
+
+from app.constants import ICONS, POSSIBLE_ACTIONS, PROMPTS_MAP
+from app.services.ppt.context import PresentationContext
+from app.utils.prompt import PromptTemplate
+from app.utils.prompt_serializer import to_compact_json
+from benchmarks.decks import generate_deck
+
+SHAPES_PER_SLIDE = (2, 10, 40)
+INSTRUCTIONS = ("Add a title",
+                "Insert a gear icon on the right side of the slide",
+                "Summarise the body text in three bullet points {with braces}")
+TOKEN_BUDGET = 2000
+USER_SECTIONS = {
+    "actions": ["SLIDE_SIZE", "CONTEXT_DATA", "COVERED_AREAS", "FREE_AREAS",
+                "USER_INSTRUCTION"],
+    "actions_update": ["SLIDE_SIZE", "CONTEXT_DATA", "COVERED_AREAS",
+                       "FREE_AREAS", "SHAPE_DATA", "USER_INSTRUCTION"],
+}
+STATIC_CONTENT = [to_compact_json(ICONS), to_compact_json(POSSIBLE_ACTIONS)] + [
+    icon["name"] for icon in ICONS] + [
+    action["model_name"] for action in POSSIBLE_ACTIONS]
+
+
+@pytest.fixture(scope="module")
+def template():
+    return PromptTemplate(PROMPTS_MAP, ICONS, POSSIBLE_ACTIONS, TOKEN_BUDGET)
+
+
+@pytest.fixture(scope="module")
+def requests(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("decks")
+    requests = []
+    for shapes_per_slide in SHAPES_PER_SLIDE:
+        deck_path = generate_deck(str(directory / f"deck_{shapes_per_slide}.pptx"),
+                                  2, shapes_per_slide=shapes_per_slide)
+        for slide_index, instruction, shape_name in itertools.product(
+                (0, 1), INSTRUCTIONS, (None, "Title 1")):
+            context = PresentationContext(deck_path).get_slide_context(
+                slide_index, shape_name)
+            data = {"prompt": instruction}
+            if shape_name:
+                data["shapesInfo"] = [{"name": shape_name}]
+            requests.append(
+                ("actions_update" if shape_name else "actions", data, context))
+    return requests
+
+
+@pytest.mark.parametrize("prompt_key", list(PROMPTS_MAP))
+def test_system_prompt_is_a_shared_prefix(template, requests, prompt_key):
+    rendered = []
+    for key, data, context in requests:
+        if key != prompt_key:
+            continue
+        user_prompt, system_prompt = template.generate_prompts(
+            prompt_key, data, context, context["covered_areas"])
+        assert system_prompt == template.system_prompts[prompt_key]
+        assert data["prompt"] not in system_prompt
+        rendered.append(system_prompt + user_prompt)
+
+    assert rendered
+    shared_prefix = os.path.commonprefix(rendered)
+    assert len(shared_prefix) >= len(template.system_prompts[prompt_key])
+
+
+@pytest.mark.parametrize("prompt_key", list(PROMPTS_MAP))
+def test_user_prompt_sections_and_static_content(template, requests, prompt_key):
+    headings = {"ICON_NAMES", "POSSIBLE_ACTIONS", *USER_SECTIONS["actions_update"]}
+    system_prompt = template.system_prompts[prompt_key]
+    for content in STATIC_CONTENT:
+        assert content in system_prompt
+
+    checked = 0
+    for key, data, context in requests:
+        if key != prompt_key:
+            continue
+        user_prompt, _ = template.generate_prompts(
+            prompt_key, data, context, context["covered_areas"])
+        sections = [line for line in user_prompt.splitlines() if line in headings]
+        assert sections == USER_SECTIONS[prompt_key]
+        assert user_prompt.rstrip().endswith(data["prompt"])
+        for content in STATIC_CONTENT:
+            assert content not in user_prompt
+        checked += 1
+
+    assert checked
@@ -0,0 +1,120 @@
+"""
+`ShapeTreeWriter` (`BULK_SHAPE_WRITER`) writes the same slide XML and
+relationships as adding one python-pptx shape at a time, including paragraphs
+with empty text, line breaks, unset font attributes, actions that fail
+halfway and lists of icons and images only. Shapes added to the slide before
+`flush` do not share ids with the pending ones.
+"""
+import contextlib
+import io
+import random
+
+import pytest
+from lxml import etree
+from PIL import Image
+from pptx import Presentation
+from pptx.util import Mm
+
+from app.config.settings import Settings
+from app.schemas.actions import ActionsList, IconType
+from app.services.ppt.actions import PPTActionHandler
+from app.services.ppt.shape_writer import ShapeTreeWriter
+from benchmarks.decks import generate_deck
+
+SEED = 7
+TEXTS = ("Quarterly revenue", "", "Growth & margin <10%>", "Line one\nline two",
+         "Next steps")
+
+
+def _font(rng):
+    return {"name": "Arial",
+            # An unset size makes the action fail after its text box was added
+            "size": rng.choice((12, 18, 24, None)) if rng.random() < 0.05
+            else rng.choice((12, 18, 24)),
+            "color": rng.choice(("#1F4E79", "#FF0000", None)),
+            "bold": rng.choice((True, False, None)),
+            "italic": rng.choice((True, False, None)),
+            "underline": rng.choice((True, False, None))}
+
+
+def _mostly_textboxes(index):
+    return {3: "create_icon", 7: "create_image"}.get(index % 10, "create_textbox")
+
+
+def _icons_and_images(index):
+    return ("create_icon", "create_image")[index % 2]
+
+
+def _actions(shapes, action_type=_mostly_textboxes):
+    rng = random.Random(SEED)
+    actions = []
+    for index in range(shapes):
+        position = {"left": rng.uniform(0, 250), "top": rng.uniform(0, 130),
+                    "width": rng.uniform(10, 80), "height": rng.uniform(5, 40),
+                    "shape_name": f"Shape {index}"}
+        if action_type(index) == "create_icon":
+            actions.append({"action_type": "create_icon", **position,
+                            "icon_name": rng.choice(list(IconType)).value,
+                            "word_wrap": None, "paragraphs": None})
+        elif action_type(index) == "create_image":
+            actions.append({"action_type": "create_image", **position,
+                            "icon_name": None, "word_wrap": None, "paragraphs": None})
+        else:
+            actions.append({"action_type": "create_textbox", **position,
+                            "icon_name": None,
+                            "word_wrap": rng.choice((True, False, None)),
+                            "paragraphs": [{"text": rng.choice(TEXTS),
+                                            "font": _font(rng),
+                                            "bullet": False, "level": 0}
+                                           for _ in range(rng.randint(1, 5))]})
+    return ActionsList.model_validate({"actions": actions})
+
+
+@pytest.fixture(scope="module")
+def files(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("shape_writer")
+    deck_path = generate_deck(str(directory / "deck.pptx"), 1)
+    attached_path = str(directory / "attached.png")
+    Image.new("RGB", (64, 48), "#1F4E79").save(attached_path)
+    return deck_path, attached_path
+
+
+def _apply(deck_path, attached_path, actions):
+    presentation = Presentation(deck_path)
+    slide = presentation.slides[0]
+    handler = PPTActionHandler(deck_path, presentation, slide, 0, actions, None,
+                               attached_path)
+    # Failing actions are reported on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        handler.execute_actions()
+    return etree.tostring(slide._element), slide.part.rels.xml
+
+
+@pytest.mark.parametrize("shapes, action_type", [
+    (10, _mostly_textboxes), (100, _mostly_textboxes),
+    (3, _icons_and_images), (20, _icons_and_images)])
+def test_bulk_writer_matches_per_shape_writes(files, monkeypatch, shapes,
+                                              action_type):
+    actions = _actions(shapes, action_type)
+    outputs = {}
+    for bulk in (False, True):
+        monkeypatch.setattr(Settings, "BULK_SHAPE_WRITER", bulk)
+        outputs[bulk] = _apply(*files, actions)
+
+    assert outputs[True] == outputs[False]
+
+
+def test_flush_renumbers_shapes_after_ones_added_meanwhile(files):
+    deck_path, attached_path = files
+    slide = Presentation(deck_path).slides[0]
+    writer = ShapeTreeWriter(slide)
+    writer.add_textbox(Mm(10), Mm(10), Mm(40), Mm(10), True, [])
+    writer.add_picture(Settings.IMAGE_ASSETS.image(attached_path),
+                       Mm(10), Mm(30), Mm(20), Mm(20))
+    added = slide.shapes.add_textbox(Mm(60), Mm(10), Mm(40), Mm(10))
+
+    assert writer.flush() == 2
+    shape_ids = [shape.shape_id for shape in slide.shapes]
+    assert len(shape_ids) == len(set(shape_ids))
+    assert [shape.name for shape in slide.shapes][-2:] == [
+        f"TextBox {added.shape_id}", f"Picture {added.shape_id + 1}"]
@@ -0,0 +1,95 @@
+"""
+Free areas, overlap counts, nearest gaps and snapping of `SpatialIndex` on small
+hand-built layouts of a 100 x 50 mm slide. Areas are `(top, left, width, height)`.
+"""
+import pytest
+
+from app.services.ppt.spatial import EPSILON, SpatialIndex
+
+SLIDE_WIDTH, SLIDE_HEIGHT = 100.0, 50.0
+BACKGROUND = (0.0, 0.0, SLIDE_WIDTH, SLIDE_HEIGHT)
+CENTRE_BLOCK = (10.0, 10.0, 20.0, 20.0)
+
+
+def index(*areas):
+    return SpatialIndex(SLIDE_WIDTH, SLIDE_HEIGHT, areas)
+
+
+def test_free_areas_around_a_block_largest_first():
+    assert index(CENTRE_BLOCK).free_areas() == [
+        (0.0, 30.0, 70.0, 50.0),
+        (30.0, 0.0, 100.0, 20.0),
+        (0.0, 0.0, 100.0, 10.0),
+        (0.0, 0.0, 10.0, 50.0),
+    ]
+    assert index(CENTRE_BLOCK).free_areas(2) == [(0.0, 30.0, 70.0, 50.0),
+                                                 (30.0, 0.0, 100.0, 20.0)]
+
+
+def test_free_areas_ignore_backgrounds_and_missing_shapes():
+    near_background = (1.0, 1.0, 96.0, 48.0)
+    assert index(BACKGROUND, near_background, None, CENTRE_BLOCK).free_areas() == \
+        index(CENTRE_BLOCK).free_areas()
+    assert index(BACKGROUND).free_areas() == [(0.0, 0.0, 100.0, 50.0)]
+
+
+def test_free_areas_next_to_touching_shapes():
+    # Two blocks meeting at x = 50 leave a single free band below them
+    assert index((0.0, 0.0, 50.0, 20.0), (0.0, 50.0, 50.0, 20.0)).free_areas() == [
+        (20.0, 0.0, 100.0, 30.0)]
+
+
+def test_overlap_counts():
+    assert index((0.0, 0.0, 30.0, 30.0), (10.0, 10.0, 30.0, 30.0),
+                 (20.0, 20.0, 30.0, 30.0), (0.0, 60.0, 10.0, 10.0),
+                 None).overlap_counts() == [2, 2, 2, 0, None]
+
+
+@pytest.mark.parametrize("overlap, count", [
+    (0.0, 0), (EPSILON / 10, 0), (1e-3, 1)])
+def test_overlaps_thinner_than_epsilon_are_ignored(overlap, count):
+    left_block = (0.0, 0.0, 50.0, 20.0)
+    right_block = (0.0, 50.0 - overlap, 50.0, 20.0)
+    assert index(left_block, right_block).overlap_counts() == [count, count]
+
+
+def test_nearest_gaps():
+    gaps = index((0.0, 0.0, 10.0, 10.0), (0.0, 30.0, 10.0, 10.0),
+                 (40.0, 0.0, 10.0, 10.0), None).nearest_gaps()
+    assert gaps == [20.0, 20.0, 30.0, None]
+    assert index((0.0, 0.0, 50.0, 20.0),
+                 (0.0, 50.0, 50.0, 20.0)).nearest_gaps() == [0.0, 0.0]
+    assert index(CENTRE_BLOCK).nearest_gaps() == [None]
+
+
+def test_snap_keeps_free_positions_and_moves_areas_inside_the_slide():
+    spatial = index(CENTRE_BLOCK)
+    assert spatial.snap((0.0, 50.0, 20.0, 10.0)) == (0.0, 50.0, 20.0, 10.0)
+    assert spatial.snap((-5.0, 95.0, 20.0, 10.0)) == (0.0, 80.0, 20.0, 10.0)
+    assert spatial.snap((0.0, 0.0, 150.0, 10.0))[2] == SLIDE_WIDTH
+
+
+def test_snap_moves_overlapping_areas_to_the_closest_free_area():
+    spatial = index(CENTRE_BLOCK)
+    snapped = spatial.snap((15.0, 27.0, 5.0, 5.0))
+    assert snapped == (15.0, 30.0, 5.0, 5.0)
+    assert spatial.validate(snapped) == {"in_bounds": True, "overlaps": 0}
+
+
+@pytest.mark.parametrize("area", [
+    (10.0, 30.0, 10.0, 10.0),
+    (10.0, 30.0 - EPSILON / 10, 10.0, 10.0),
+    (15.0, 15.0, 5.0, 5.0),
+])
+def test_snap_keeps_areas_touching_or_inside_a_shape(area):
+    assert index(CENTRE_BLOCK).snap(area) == area
+
+
+def test_snap_ignores_backgrounds():
+    assert index(BACKGROUND).snap((5.0, 5.0, 20.0, 20.0)) == (5.0, 5.0, 20.0, 20.0)
+
+
+def test_snap_leaves_areas_no_free_area_can_hold_inside_the_slide():
+    spatial = index((20.0, 40.0, 20.0, 10.0))
+    assert spatial.snap((-10.0, -10.0, 60.0, 40.0)) == (0.0, 0.0, 60.0, 40.0)
+    assert spatial.validate((0.0, 0.0, 60.0, 40.0))["overlaps"] == 1
@@ -0,0 +1,82 @@
+"""
+Commits of edits staged on a version that is no longer the head, and undo
+along the parent links of the history.
+"""
+import pytest
+from pptx import Presentation
+
+from app.services.ppt.storage import LocalDiskBackend, PresentationStorage
+from app.services.ppt.versions import (HistoryEndError, VersionConflictError,
+                                       VersionStore)
+from benchmarks.decks import generate_deck
+
+
+@pytest.fixture
+def store(tmp_path):
+    storage = PresentationStorage(LocalDiskBackend(str(tmp_path / "store")))
+    deck_path = generate_deck(str(tmp_path / "deck.pptx"), 3)
+    with open(deck_path, "rb") as deck:
+        document_id = storage.save(deck)["document_id"]
+    return VersionStore(str(tmp_path / "versions"), storage, max_versions=2), \
+        document_id
+
+
+def _stage(versions, document_id, version, slide_index, text):
+    key = versions.key(document_id, version)
+    presentation = Presentation(versions.checkout(document_id, version))
+    presentation.slides[slide_index].shapes.title.text = text
+    return versions.stage(key, presentation, [slide_index])
+
+
+def _titles(versions, document_id, version):
+    presentation = Presentation(versions.checkout(document_id, version))
+    return [slide.shapes.title.text for slide in presentation.slides]
+
+
+def test_commit_rebases_edits_of_other_slides(store):
+    versions, document_id = store
+    first = _stage(versions, document_id, 0, 0, "First")
+    second = _stage(versions, document_id, 0, 1, "Second")
+    versions.commit(first)
+
+    report = versions.commit(second)
+
+    assert report["parent"] == 1 and report["rebased"]
+    assert _titles(versions, document_id, report["version"])[:2] == [
+        "First", "Second"]
+
+
+def test_commit_rejects_edits_of_the_same_slide(store):
+    versions, document_id = store
+    first = _stage(versions, document_id, 0, 0, "First")
+    second = _stage(versions, document_id, 0, 0, "Second")
+    versions.commit(first)
+
+    with pytest.raises(VersionConflictError):
+        versions.commit(second)
+    assert versions.head(document_id) == 1
+
+
+def test_undo_follows_parents_of_kept_versions(store):
+    versions, document_id = store
+    for version in range(4):
+        versions.commit(_stage(versions, document_id, version, 0, f"Edit {version}"))
+
+    assert versions.undo(document_id)["head"] == 3
+    # Version 2 was dropped beyond `max_versions`; version 0 is not its parent
+    with pytest.raises(HistoryEndError):
+        versions.undo(document_id)
+    assert versions.redo(document_id)["head"] == 4
+
+
+def test_commit_after_undo_drops_the_undone_versions(store):
+    versions, document_id = store
+    versions.commit(_stage(versions, document_id, 0, 0, "First"))
+    versions.commit(_stage(versions, document_id, 1, 0, "Second"))
+    versions.undo(document_id)
+
+    report = versions.commit(_stage(versions, document_id, 1, 1, "Third"))
+
+    history = versions.history(document_id)
+    assert report["parent"] == 1 and not history["can_redo"]
+    assert [entry["version"] for entry in history["versions"]] == [0, 1, 3]
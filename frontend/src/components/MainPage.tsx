@@ -109,6 +109,9 @@ const MainPage: React.FC = () => {
   );
 };
 
+// Document id (checksum) of the presentation last stored by the backend
+let currentDocumentId = null;
+
 async function processUserInstructions(userPrompt) {
   try {
     let shapesInfo = [];
@@ -180,18 +183,23 @@ async function processUserInstructions(userPrompt) {
     // const userPrompt = textareaValue;
     console.log(`User prompt is ${userPrompt}`);
     let responseData = {};
-    fetch("http://localhost:8000/process", {
+    fetch("http://localhost:8000/process/stream", {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
       },
       body: JSON.stringify({
         prompt: userPrompt,
+        documentId: currentDocumentId,
         slidesInfo: slidesInfo,
         shapesInfo: shapesInfo,
       }),
     })
-      .then((response) => response.json())
+      .then((response) =>
+        readProcessEvents(response, (event) => {
+          console.log(`[${event.elapsed_ms} ms] ${event.event}`, event);
+        })
+      )
       .then((data) => {
         console.log("Success:", data);
         if (data["base64_encoded_ppt"]) {
@@ -226,6 +234,69 @@ async function processUserInstructions(userPrompt) {
   }
 }
 
+async function readProcessEvents(response, onProgress) {
+  if (!response.ok) {
+    const errorData = await response.text();
+    throw new Error(`Server error: ${response.status} - ${errorData}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let result = {};
+  let buffered = "";
+
+  const handleLine = (line) => {
+    if (!line.trim()) {
+      return;
+    }
+    const event = JSON.parse(line);
+    if (event.event === "error") {
+      throw new Error(`Server error: ${event.status_code} - ${event.detail}`);
+    }
+    if (event.event === "file_ready") {
+      result["file_path"] = event.file_path;
+      result["download_url"] = event.download_url;
+    }
+    if (event.event === "done") {
+      result["input_data"] = event.input_data;
+    }
+    onProgress(event);
+  };
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split("\n");
+    buffered = lines.pop();
+    lines.forEach(handleLine);
+  }
+  handleLine(buffered);
+
+  // The updated slide is downloaded as a file; insertSlidesFromBase64 needs base64
+  if (result["download_url"]) {
+    const fileResponse = await fetch(result["download_url"]);
+    if (!fileResponse.ok) {
+      const errorData = await fileResponse.text();
+      throw new Error(`Server error: ${fileResponse.status} - ${errorData}`);
+    }
+    result["base64_encoded_ppt"] = arrayBufferToBase64(await fileResponse.arrayBuffer());
+  }
+  return result;
+}
+
+function arrayBufferToBase64(arrayBuffer) {
+  const bytes = new Uint8Array(arrayBuffer);
+  let binary = "";
+  // Converted in slices, since one call with every byte overflows the call stack
+  for (let i = 0; i < bytes.length; i += 32768) {
+    binary += String.fromCharCode.apply(null, Array.from(bytes.subarray(i, i + 32768)));
+  }
+  return btoa(binary);
+}
+
 async function computeSHA256(arrayBuffer) {
   const hashBuffer = await crypto.subtle.digest("SHA-256", arrayBuffer);
   const hashArray = Array.from(new Uint8Array(hashBuffer));
@@ -276,6 +347,17 @@ async function sendPresentation() {
             const checksum = await computeSHA256(combined.buffer);
             console.log("SHA256 Checksum: ", checksum);
 
+            // Skip the upload when the backend already stores this exact deck
+            const reuseResponse = await fetch(`http://localhost:8000/upload/${checksum}`, {
+              method: "POST",
+            });
+            if (reuseResponse.ok) {
+              const reuseData = await reuseResponse.json();
+              currentDocumentId = reuseData.document_id;
+              console.log("Backend Response: ", reuseData);
+              return;
+            }
+
             const blob = new Blob([combined], {
               type: "application/vnd.openxmlformats-officedocument.presentationml.presentation",
             });
@@ -295,6 +377,7 @@ async function sendPresentation() {
             }
 
             const responseData = await response.json();
+            currentDocumentId = responseData.document_id;
             console.log("Backend Response: ", responseData);
           } else {
             console.error("Error in getting presentation file: ", fileResult.error.message);